@@ -0,0 +1,3 @@
+"""Pieces shared by the lesson agents."""
+
+__version__ = "0.1.0"
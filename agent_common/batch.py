@@ -0,0 +1,167 @@
+"""
+Run a file of queries through a lesson graph in one process.
+
+    python -m agent_common.batch queries.jsonl --output results.jsonl \
+        --graph agent_lesson3.parser --concurrency 8
+
+Each input line is a JSON object with a `user_input` and an optional `id`
+(default: the line number); a line that is not JSON is taken as the
+user input itself. Use `-` to read from stdin. Queries go through the
+module's `langgraph_app` with `ainvoke`, at most `--concurrency` at a time.
+
+Every finished query is appended to the output as one JSON line, in
+completion order, with its status, the graph state (or the error) and the time
+it took. Ids already in the output are skipped, so an interrupted run picks up
+where it stopped when started again with the same output file;
+`--retry-errors` also runs failed ids again (their newest record wins).
+"""
+
+import asyncio
+import importlib
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Annotated, IO, Iterator
+
+import typer
+from loguru import logger
+from pydantic import BaseModel
+
+from agent_common import tracing
+
+
+cli_app = typer.Typer()
+
+
+def _json_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+def read_queries(lines: IO[str]) -> Iterator[dict]:
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            query = json.loads(line)
+        except json.JSONDecodeError:
+            query = line
+        if not isinstance(query, dict):
+            query = {"user_input": str(query)}
+        query.setdefault("id", line_number)
+        query["id"] = str(query["id"])
+        yield query
+
+
+def finished_ids(output: Path, include_errors: bool = True) -> set[str]:
+    """Ids recorded in `output`; a line cut short by an interruption is dropped."""
+    if not output.exists():
+        return set()
+    with output.open("rb+") as f:
+        content = f.read()
+        # appending after a partial line would glue two records together
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            logger.warning(f"dropping a partial last line of {output}")
+            f.truncate(complete)
+
+    status = dict()
+    for line in content[:complete].splitlines():
+        try:
+            record = json.loads(line)
+            status[str(record["id"])] = record.get("status")
+        except (json.JSONDecodeError, KeyError, TypeError):
+            continue
+    return {id_ for id_, state in status.items() if include_errors or state == "ok"}
+
+
+async def run_queries(
+    graph, queries: Iterator[dict], out: IO[str], concurrency: int, skip: set[str]
+) -> list[dict]:
+    """Records (without the graph state) of the queries run, in completion order."""
+    slots = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def run_one(query: dict):
+        started = time.perf_counter()
+        record = {"id": query["id"], "user_input": query["user_input"]}
+        try:
+            with tracing.span("agent", query_id=query["id"]):
+                state = await graph.ainvoke({"user_input": query["user_input"]})
+            record.update(status="ok", state=state)
+        except Exception as e:
+            logger.error(f"query {query['id']} failed: {e!r}")
+            record.update(status="error", error=repr(e))
+        finally:
+            slots.release()
+        record["elapsed_ms"] = round((time.perf_counter() - started) * 1e3, 3)
+        out.write(json.dumps(record, default=_json_default) + "\n")
+        out.flush()
+        record.pop("state", None)
+        records.append(record)
+
+    tasks = set()
+    for query in queries:
+        if query["id"] in skip:
+            continue
+        if "user_input" not in query:
+            logger.warning(f"query {query['id']} has no user_input, skipped")
+            continue
+        skip.add(query["id"])
+        await slots.acquire()
+        task = asyncio.create_task(run_one(query))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return records
+
+
+def summarize(records: list[dict], seconds: float) -> dict:
+    elapsed = sorted(record["elapsed_ms"] for record in records)
+    summary = {
+        "queries": len(records),
+        "errors": sum(record["status"] != "ok" for record in records),
+        "seconds": round(seconds, 3),
+        "queries_per_sec": round(len(records) / seconds, 2) if seconds else 0.0,
+    }
+    if elapsed:
+        cuts = statistics.quantiles(elapsed, n=100) if len(elapsed) > 1 else elapsed * 99
+        summary.update(p50_ms=cuts[49], p95_ms=cuts[94], max_ms=elapsed[-1])
+    return summary
+
+
+@cli_app.command()
+def run(
+    queries: Annotated[str, typer.Argument(help="JSONL file of queries, or - for stdin")],
+    output: Annotated[Path, typer.Option("--output", "-o", help="JSONL file of results")],
+    graph: Annotated[str, typer.Option(help="Module defining `langgraph_app`")] = "agent_lesson3.parser",
+    concurrency: Annotated[int, typer.Option(min=1)] = 8,
+    retry_errors: Annotated[bool, typer.Option(help="Run ids that failed before again")] = False,
+):
+    """Run every query through the graph, appending results to OUTPUT"""
+    module = importlib.import_module(graph)
+    skip = finished_ids(output, include_errors=not retry_errors)
+    if skip:
+        logger.info(f"resuming: {len(skip)} queries already in {output}")
+
+    source = sys.stdin if queries == "-" else open(queries)
+    started = time.perf_counter()
+    with source, output.open("a") as out:
+        records = asyncio.run(
+            run_queries(module.langgraph_app, read_queries(source), out, concurrency, skip)
+        )
+    seconds = time.perf_counter() - started
+
+    logger.info(f"Batch summary: {summarize(records, seconds)}")
+    query_parser = getattr(module, "query_parser", None)
+    if query_parser is not None:
+        logger.info(f"Parse stats: {query_parser.stats()}")
+
+
+if __name__ == "__main__":
+    cli_app()
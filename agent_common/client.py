@@ -0,0 +1,280 @@
+"""
+Client for the trip webservice, shared by the agent graph nodes.
+
+`TripServiceClient` (blocking) and `AsyncTripServiceClient` (for async graph
+nodes) keep a pool of persistent connections for the life of the process, so
+repeated calls skip the TCP handshake. Both build requests and parse responses
+the same way; they only differ in how they wait. `competitive_book` retries
+NOT_AVAILABLE answers a bounded number of times with jittered exponential
+backoff. `subscribe` keeps a Server-Sent Events stream open and yields new
+openings matching a search as the service pushes them, instead of polling.
+
+The base URL comes from `VACATION_API_BASE_URL` unless given explicitly. Use
+`get_client()` / `get_async_client()` for the process-wide instances.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
+
+import httpx
+from loguru import logger
+
+from agent_common import tracing
+from webservice.schemas import (
+    ResponseStatus,
+    TripBookingRequest,
+    TripBookingResponse,
+    TripOpening,
+    TripSearchRequest,
+    TripSearchResultsResponse,
+)
+
+
+BASE_URL_ENV = "VACATION_API_BASE_URL"
+DEFAULT_BASE_URL = "http://localhost:9009"
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    base_url: str = field(default_factory=lambda: os.getenv(BASE_URL_ENV, DEFAULT_BASE_URL))
+    timeout_seconds: float = 10.0
+    connect_timeout_seconds: float = 2.0
+    max_connections: int = 20
+    # extra attempts after a NOT_AVAILABLE from competitive_book
+    booking_retries: int = 3
+    backoff_seconds: float = 0.1
+    max_backoff_seconds: float = 2.0
+    # retries of failed connection attempts, done by the transport
+    connect_retries: int = 1
+
+    def client_kwargs(self) -> dict:
+        return dict(
+            base_url=self.base_url.rstrip("/") + "/api/trip",
+            timeout=httpx.Timeout(self.timeout_seconds, connect=self.connect_timeout_seconds),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt` (from 0), with full jitter."""
+        ceiling = min(self.max_backoff_seconds, self.backoff_seconds * 2**attempt)
+        return random.uniform(0, ceiling)
+
+
+def _search_params(query: TripSearchRequest) -> dict:
+    params = query.model_dump(mode="json", exclude_none=True)
+    # the endpoint calls the rate bounds `min_room_rate` and `room_rate`
+    if "rate" in params:
+        params["room_rate"] = params.pop("rate")
+    if "min_rate" in params:
+        params["min_room_rate"] = params.pop("min_rate")
+    return params
+
+
+def _booking_json(request: TripBookingRequest) -> dict:
+    return request.model_dump(mode="json")
+
+
+class _EventReader:
+    """Turns Server-Sent Events lines into lists of pushed openings."""
+
+    def __init__(self):
+        self.event = None
+        self.data = []
+
+    def feed(self, line: str) -> list[TripOpening] | None:
+        if line.startswith(":"):
+            return None
+        if line:
+            name, _, value = line.partition(":")
+            if name == "event":
+                self.event = value.strip()
+            elif name == "data":
+                self.data.append(value.removeprefix(" "))
+            return None
+
+        event, data = self.event, "\n".join(self.data)
+        self.event, self.data = None, []
+        if event == "openings":
+            return [TripOpening.model_validate(opening) for opening in json.loads(data)]
+        if event == "lagged":
+            logger.warning(f"Subscription fell behind, {json.loads(data)['dropped']} openings missed")
+        return None
+
+
+def _subscription_timeout(config: ClientConfig) -> httpx.Timeout:
+    # the stream stays quiet until something matches
+    return httpx.Timeout(config.timeout_seconds, connect=config.connect_timeout_seconds, read=None)
+
+
+class TripServiceClient:
+    def __init__(self, config: ClientConfig | None = None):
+        self.config = config or ClientConfig()
+        transport = httpx.HTTPTransport(
+            limits=self.config.limits(), retries=self.config.connect_retries
+        )
+        self._http = httpx.Client(transport=transport, **self.config.client_kwargs())
+
+    def __enter__(self) -> "TripServiceClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def _send(self, method: str, path: str, **kwargs) -> dict:
+        with tracing.span("http", method=method, path=path) as span:
+            response = self._http.request(method, path, **kwargs)
+            span.set(status_code=response.status_code)
+            response.raise_for_status()
+            return response.json()
+
+    def search(self, query: TripSearchRequest) -> TripSearchResultsResponse:
+        body = self._send("GET", "/openings/search", params=_search_params(query))
+        return TripSearchResultsResponse.model_validate(body)
+
+    def search_batch(self, queries: list[TripSearchRequest]) -> list[TripSearchResultsResponse]:
+        payload = [query.model_dump(mode="json") for query in queries]
+        body = self._send("POST", "/openings/search/batch", json=payload)
+        return [TripSearchResultsResponse.model_validate(result) for result in body["results"]]
+
+    def subscribe(self, query: TripSearchRequest) -> Iterator[list[TripOpening]]:
+        """Openings added from now on that match `query`, in batches as they are pushed."""
+        reader = _EventReader()
+        with self._http.stream(
+            "POST",
+            "/openings/subscribe",
+            json=query.model_dump(mode="json"),
+            timeout=_subscription_timeout(self.config),
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                openings = reader.feed(line)
+                if openings:
+                    yield openings
+
+    def book(self, request: TripBookingRequest) -> TripBookingResponse:
+        body = self._send("POST", "/reservations/book", json=_booking_json(request))
+        return TripBookingResponse.model_validate(body)
+
+    def competitive_book(self, request: TripBookingRequest) -> TripBookingResponse:
+        for attempt in range(self.config.booking_retries + 1):
+            body = self._send(
+                "POST", "/reservations/competitive_book", json=_booking_json(request)
+            )
+            booking = TripBookingResponse.model_validate(body)
+            if booking.status != ResponseStatus.NOT_AVAILABLE:
+                break
+            if attempt < self.config.booking_retries:
+                delay = self.config.backoff(attempt)
+                logger.debug(f"{request.opening_id} not available, retrying in {delay:.2f}s")
+                time.sleep(delay)
+        return booking
+
+
+class AsyncTripServiceClient:
+    def __init__(self, config: ClientConfig | None = None):
+        self.config = config or ClientConfig()
+        transport = httpx.AsyncHTTPTransport(
+            limits=self.config.limits(), retries=self.config.connect_retries
+        )
+        self._http = httpx.AsyncClient(transport=transport, **self.config.client_kwargs())
+
+    async def __aenter__(self) -> "AsyncTripServiceClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _send(self, method: str, path: str, **kwargs) -> dict:
+        with tracing.span("http", method=method, path=path) as span:
+            response = await self._http.request(method, path, **kwargs)
+            span.set(status_code=response.status_code)
+            response.raise_for_status()
+            return response.json()
+
+    async def search(self, query: TripSearchRequest) -> TripSearchResultsResponse:
+        body = await self._send("GET", "/openings/search", params=_search_params(query))
+        return TripSearchResultsResponse.model_validate(body)
+
+    async def search_batch(
+        self, queries: list[TripSearchRequest]
+    ) -> list[TripSearchResultsResponse]:
+        payload = [query.model_dump(mode="json") for query in queries]
+        body = await self._send("POST", "/openings/search/batch", json=payload)
+        return [TripSearchResultsResponse.model_validate(result) for result in body["results"]]
+
+    async def subscribe(self, query: TripSearchRequest) -> AsyncIterator[list[TripOpening]]:
+        """Openings added from now on that match `query`, in batches as they are pushed."""
+        reader = _EventReader()
+        async with self._http.stream(
+            "POST",
+            "/openings/subscribe",
+            json=query.model_dump(mode="json"),
+            timeout=_subscription_timeout(self.config),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                openings = reader.feed(line)
+                if openings:
+                    yield openings
+
+    async def book(self, request: TripBookingRequest) -> TripBookingResponse:
+        body = await self._send("POST", "/reservations/book", json=_booking_json(request))
+        return TripBookingResponse.model_validate(body)
+
+    async def competitive_book(self, request: TripBookingRequest) -> TripBookingResponse:
+        for attempt in range(self.config.booking_retries + 1):
+            body = await self._send(
+                "POST", "/reservations/competitive_book", json=_booking_json(request)
+            )
+            booking = TripBookingResponse.model_validate(body)
+            if booking.status != ResponseStatus.NOT_AVAILABLE:
+                break
+            if attempt < self.config.booking_retries:
+                delay = self.config.backoff(attempt)
+                logger.debug(f"{request.opening_id} not available, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        return booking
+
+
+_client: TripServiceClient | None = None
+_client_lock = threading.Lock()
+# async connections belong to the event loop that opened them
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncTripServiceClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_client() -> TripServiceClient:
+    """The process-wide blocking client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = TripServiceClient()
+        return _client
+
+
+def get_async_client() -> AsyncTripServiceClient:
+    """The async client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncTripServiceClient()
+    return client
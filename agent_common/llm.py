@@ -0,0 +1,98 @@
+"""
+Chat model used by the lesson agents.
+
+`build_chat_model()` returns `ChatOpenAI(model="gpt-4")` unless
+TRIP_AGENT_LLM=fake, in which case it returns `FakeTripChatModel`: a local
+stand-in that needs no network or credentials. It answers the parse prompt
+with `TripSearchRequest`-shaped JSON after an artificial delay, so the rest of
+a graph (output parsing, validation, the webservice call) can be measured or
+exercised offline.
+
+The fake answers, in order of preference, with the next of its canned
+`responses` (cycling), with the fields the deterministic rule parser reads
+from the message, or with `default_response`. TRIP_FAKE_LLM_LATENCY_MS sets
+its delay.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field, PrivateAttr
+
+from agent_common.rule_parser import parse_trip_query
+
+
+LLM_ENV = "TRIP_AGENT_LLM"
+FAKE_LATENCY_ENV = "TRIP_FAKE_LLM_LATENCY_MS"
+
+DEFAULT_RESPONSE = {
+    "country": "Japan",
+    "start_date": "2024-06-01",
+    "end_date": "2024-06-15",
+    "rate": 300.0,
+    "limit": 10,
+}
+# the parse prompts end with the user's message
+_MESSAGE_MARKER = "Message:"
+
+
+class FakeTripChatModel(BaseChatModel):
+    latency_seconds: float = 0.0
+    responses: list[dict] = Field(default_factory=list)
+    default_response: dict = Field(default_factory=lambda: dict(DEFAULT_RESPONSE))
+    _cycle: Any = PrivateAttr(default=None)
+    _cycle_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-trip"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"latency_seconds": self.latency_seconds, "responses": len(self.responses)}
+
+    @classmethod
+    def from_env(cls) -> "FakeTripChatModel":
+        return cls(latency_seconds=float(os.getenv(FAKE_LATENCY_ENV, "0")) / 1e3)
+
+    def respond(self, messages: list[BaseMessage]) -> str:
+        """JSON answer to the prompt in `messages`."""
+        if self.responses:
+            with self._cycle_lock:
+                if self._cycle is None:
+                    self._cycle = itertools.cycle(self.responses)
+                return json.dumps(next(self._cycle))
+
+        prompt = str(messages[-1].content) if messages else ""
+        _, _, user_message = prompt.rpartition(_MESSAGE_MARKER)
+        return json.dumps(parse_trip_query(user_message) or self.default_response)
+
+    def _result(self, messages: list[BaseMessage]) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.respond(messages)))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._result(messages)
+
+
+def build_chat_model() -> BaseChatModel:
+    if os.getenv(LLM_ENV, "openai") == "fake":
+        return FakeTripChatModel.from_env()
+
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model="gpt-4")
@@ -0,0 +1,253 @@
+"""
+Fast path in front of the LLM that parses trip queries.
+
+`TripQueryParser.parse(message)` answers, in order, from:
+
+1. the deterministic rules of `agent_common.rule_parser`, when they are
+   confident about the whole message;
+2. `ParseCache`, a persistent sqlite store of earlier LLM answers keyed on the
+   normalized message and a fingerprint of the prompt;
+3. the LLM chain, whose answer is then stored.
+
+The fingerprint covers the prompt text and the current month (the prompt tells
+the model to fill in the current month), so editing the prompt or crossing
+into a new month never serves stale answers. The store keeps at most
+`max_entries` rows, evicting the least recently used.
+
+Settings come from the environment: TRIP_PARSE_CACHE_PATH (the sqlite file,
+":memory:" for a per-process cache), TRIP_PARSE_CACHE_SIZE (0 disables the
+cache) and TRIP_PARSE_RULES (0 disables the rules).
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from agent_common import tracing
+from agent_common.rule_parser import parse_trip_query
+
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "trip-agents" / "parse_cache.sqlite3"
+DEFAULT_CACHE_SIZE = 10_000
+# share of max_entries kept after an eviction pass, so passes are rare
+EVICT_TO = 0.9
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?]+$")
+
+
+def normalize_message(message: str) -> str:
+    """Same key for messages differing only in case, spacing or final punctuation."""
+    text = " ".join(message.replace("’", "'").casefold().split())
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def prompt_fingerprint(prompt, today: datetime.date | None = None) -> str:
+    """Version of a prompt: its template text plus the month it is used in."""
+    template = getattr(prompt, "template", None) or str(prompt)
+    month = (today or datetime.date.today()).strftime("%Y-%m")
+    return hashlib.sha256(f"{month}\n{template}".encode()).hexdigest()[:16]
+
+
+class ParseCache:
+    def __init__(self, path: str | Path = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # opened on first use, so importing a graph touches no files
+        self._db = None
+        self._size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # graph nodes may run on worker threads; access is serialized by _lock
+        self._db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS parses_last_used ON parses (last_used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COUNT(*) FROM parses").fetchone()[0]
+        return self._db
+
+    @staticmethod
+    def key(fingerprint: str, message: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\n{normalize_message(message)}".encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT value FROM parses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("UPDATE parses SET last_used = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            inserted = db.execute(
+                "INSERT OR IGNORE INTO parses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            ).rowcount
+            db.commit()
+            self.stores += 1
+            self._size += inserted
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # other processes may share the file, so recount before trimming
+        size = self._db.execute("SELECT COUNT(*) FROM parses").fetchone()[0]
+        excess = size - int(self.max_entries * EVICT_TO)
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM parses WHERE key IN "
+                "(SELECT key FROM parses ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._db.commit()
+            self.evictions += excess
+            size -= excess
+        self._size = size
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM parses")
+            db.commit()
+            self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ParseCache":
+        return cls(
+            path=os.getenv("TRIP_PARSE_CACHE_PATH", str(DEFAULT_CACHE_PATH)),
+            max_entries=int(os.getenv("TRIP_PARSE_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+        )
+
+
+class TripQueryParser:
+    """
+    Rules, then cache, then the chain returned by `load_chain`, which is only
+    called once a message needs the LLM. `prompt` is the prompt template (text
+    or object) the cache keys on; `schema` validates LLM answers before they
+    are stored.
+    """
+
+    def __init__(
+        self,
+        load_chain: Callable[[], Any],
+        prompt,
+        schema: type[BaseModel] | None = None,
+        cache: ParseCache | None = None,
+        use_rules: bool | None = None,
+    ):
+        self.load_chain = load_chain
+        self.prompt = prompt
+        self.schema = schema
+        self.cache = cache if cache is not None else ParseCache.from_env()
+        if use_rules is None:
+            use_rules = os.getenv("TRIP_PARSE_RULES", "1") != "0"
+        self.use_rules = use_rules
+        self.lookups = 0
+        self.rule_hits = 0
+        self.cache_hits = 0
+        self.llm_calls = 0
+        self._counter_lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def parse(self, message: str) -> dict:
+        with tracing.span("parse_trip_query") as span:
+            parsed, source = self._parse(message)
+            span.set(source=source)
+        return parsed
+
+    def _parse(self, message: str) -> tuple[dict, str]:
+        self._count("lookups")
+        if self.use_rules:
+            parsed = parse_trip_query(message)
+            if parsed is not None:
+                self._count("rule_hits")
+                logger.debug(f"rules parsed {message!r}")
+                return parsed, "rules"
+
+        key = ParseCache.key(prompt_fingerprint(self.prompt), message)
+        parsed = self.cache.get(key)
+        if parsed is not None:
+            self._count("cache_hits")
+            logger.debug(f"parse cache hit for {message!r}")
+            return parsed, "cache"
+
+        self._count("llm_calls")
+        parsed = self.load_chain().invoke({"input": message}, config=tracing.langchain_config())
+        if self.schema is not None:
+            with tracing.span("validate"):
+                self.schema.model_validate(parsed)
+        self.cache.put(key, parsed)
+        return parsed, "llm"
+
+    def stats(self) -> dict:
+        skipped = self.rule_hits + self.cache_hits
+        return {
+            "lookups": self.lookups,
+            "rule_hits": self.rule_hits,
+            "cache_hits": self.cache_hits,
+            "llm_calls": self.llm_calls,
+            "skipped_llm": skipped,
+            "skipped_llm_rate": round(skipped / self.lookups, 4) if self.lookups else 0.0,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,242 @@
+"""
+Deterministic extraction of simple trip queries, to skip the LLM.
+
+`parse_trip_query` recognizes a destination from the `Country` enum, dates
+(ISO dates, "March 5", "5th of March", whole months and ranges of those), a
+maximum daily rate ("under $500", "budget is 200 per day") and a result count
+("show me 5 options"). It only answers when it is confident: every word of the
+message must be accounted for by a recognized phrase or a known filler word,
+and the phrases must combine unambiguously. Anything else ("next month", "near
+Tokyo", two countries) returns None and goes to the LLM.
+
+The answer has the fields and conventions of the parse prompt: dates as
+YYYY-MM-DD with 2024 as the default year, `limit` defaulting to 10.
+"""
+
+import calendar
+import datetime
+import re
+
+from webservice.data_generator.enums import Country
+
+
+DEFAULT_YEAR = 2024
+DEFAULT_LIMIT = 10
+
+_MONTHS = {
+    name: number
+    for number in range(1, 13)
+    for name in (calendar.month_name[number].lower(), calendar.month_abbr[number].lower())
+}
+_MONTHS["sept"] = 9
+_MONTH = r"(?P<{}>" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?"
+
+_NUMBER_WORDS = {
+    word: number
+    for number, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve "
+        "thirteen fourteen fifteen sixteen seventeen eighteen nineteen twenty".split()
+    )
+}
+_COUNT = r"(?P<count>\d+|" + "|".join(_NUMBER_WORDS) + ")"
+
+_COUNTRY_NAMES = {country.value.lower(): country for country in Country}
+_COUNTRY_NAMES.update(
+    {
+        "usa": Country.UNITED_STATES,
+        "u.s.a.": Country.UNITED_STATES,
+        "u.s.": Country.UNITED_STATES,
+        "america": Country.UNITED_STATES,
+        "united states of america": Country.UNITED_STATES,
+        "the states": Country.UNITED_STATES,
+        "uk": Country.UNITED_KINGDOM,
+        "u.k.": Country.UNITED_KINGDOM,
+        "great britain": Country.UNITED_KINGDOM,
+        "england": Country.UNITED_KINGDOM,
+        "drc": Country.CONGO,
+        "dr congo": Country.CONGO,
+        "congo": Country.CONGO,
+        "viet nam": Country.VIETNAM,
+        "burma": Country.MYANMAR,
+        "türkiye": Country.TURKEY,
+        "turkiye": Country.TURKEY,
+    }
+)
+_COUNTRY = (
+    r"(?<![\w.])(?P<country>"
+    + "|".join(re.escape(name) for name in sorted(_COUNTRY_NAMES, key=len, reverse=True))
+    + r")(?![\w])"
+)
+
+_YEAR = r"(?:,?\s*(?P<year>20\d\d))?"
+_ORDINAL = r"(?:st|nd|rd|th)?"
+_DAY_FIRST = r"\b(?P<day>\d{1,2})" + _ORDINAL + r"\s+(?:of\s+)?" + _MONTH.format("month") + _YEAR + r"\b"
+_MONTH_FIRST = r"\b" + _MONTH.format("month") + r"\s+(?P<day>\d{1,2})" + _ORDINAL + _YEAR + r"\b"
+_ISO_DATE = r"\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b"
+_SLASH_DATE = r"\b(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})\b"
+_WHOLE_MONTH = r"\b" + _MONTH.format("month") + r"(?:\s+(?P<year>20\d\d))?\b"
+
+_AMOUNT = r"\$?\s*(?P<amount>\d+(?:,\d{3})*(?:\.\d+)?)\s*(?P<thousands>k\b)?\s*(?:usd|dollars|bucks|\$)?"
+_PER_DAY = r"(?:\s*(?:a|per|/|each|every)\s*(?:day|night))"
+_RATE = (
+    r"(?:(?:under|below|less\s+than|at\s+most|no\s+more\s+than|up\s+to|max(?:imum)?"
+    r"|budget(?:\s+is|\s+of)?|<=?|cheaper\s+than)\s*"
+    + _AMOUNT
+    + _PER_DAY
+    + r"?|\$\s*(?P<bare>\d+(?:\.\d+)?)"
+    + _PER_DAY
+    + r")"
+)
+
+_LIMIT = (
+    r"\b(?:top\s+" + _COUNT + r"|" + _COUNT.replace("count", "count2")
+    + r"\s+(?:options?|results?|openings?|choices?|trips?|places?|deals?|hotels?|suggestions?))\b"
+)
+
+# "for two weeks" or "in 10 days" lead the LLM to derive dates from the stay
+# length or from today, which rules cannot reproduce ("a night" is a rate unit)
+_DURATION = (
+    r"\b(?:(?:\d+|" + "|".join(_NUMBER_WORDS) + r")\s*(?:-\s*)?(?:days?|nights?|weeks?|months?)"
+    r"|(?:a|an)\s+(?:week|month|fortnight))\b"
+)
+
+# words that carry none of the search fields; apostrophes are split off first
+_FILLER = set(
+    """
+    i we d m s re ll ve want wanna would like love to go going get travel traveling
+    travelling visit visiting fly flying head trip trips a an the in on at for during
+    from until till thru through between and also with please me us my our budget is
+    of around about vacation vacations holiday holidays somewhere show find give list
+    looking look search book stay stays staying hotel hotels lodging day days per night
+    nights options option results result openings opening can you some any that this
+    be there it what are available starting start leaving leave returning return back
+    ending end by so need plan planning max maximum rate rates price prices dollars usd
+    """.split()
+)
+# "may" the month only after a word that introduces a date, not "I may go to Japan"
+_MAY_INTRODUCERS = {"in", "of", "from", "to", "until", "till", "through", "thru", "during", "and", "between", "by", "before"}
+_PUNCTUATION = re.compile(r"[,.!?;:()\[\]\"'`~\-–—/]+")
+
+
+def _count_value(text: str) -> int:
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text]
+
+
+def _month_number(text: str) -> int:
+    return _MONTHS[text.rstrip(".")]
+
+
+def _date(year: str | None, month: int, day: int) -> datetime.date | None:
+    try:
+        return datetime.date(int(year) if year else DEFAULT_YEAR, month, day)
+    except ValueError:
+        return None
+
+
+class _Extraction:
+    def __init__(self, text: str):
+        self.text = text
+        self.mask = list(text)
+
+    def take(self, pattern: str, flags=re.IGNORECASE):
+        """Matches of `pattern` in the not yet consumed text, consuming them."""
+        consumed = "".join(self.mask)
+        matches = list(re.finditer(pattern, consumed, flags))
+        for match in matches:
+            for i in range(match.start(), match.end()):
+                self.mask[i] = " "
+        return matches
+
+    def leftover_words(self) -> list[str]:
+        remaining = _PUNCTUATION.sub(" ", "".join(self.mask))
+        return [word for word in remaining.split() if word not in _FILLER]
+
+
+def parse_trip_query(message: str) -> dict | None:
+    """The search fields of `message`, or None when the rules are not confident."""
+    text = " ".join(message.lower().replace("’", "'").split())
+    if not text:
+        return None
+    extraction = _Extraction(text)
+
+    if re.search(_DURATION, text):
+        return None
+
+    countries = {_COUNTRY_NAMES[m["country"]] for m in extraction.take(_COUNTRY)}
+    if len(countries) > 1:
+        return None
+
+    # before rates, so "5 options" is never read as a rate of 5
+    limits = {
+        _count_value((m["count"] or m["count2"]).lower()) for m in extraction.take(_LIMIT)
+    }
+    if len(limits) > 1:
+        return None
+
+    rates = set()
+    for match in extraction.take(_RATE):
+        amount = match["amount"] or match["bare"]
+        rate = float(amount.replace(",", ""))
+        if match["thousands"]:
+            rate *= 1000
+        rates.add(rate)
+    if len(rates) > 1:
+        return None
+
+    dates = _take_dates(extraction)
+    if dates is None or extraction.leftover_words():
+        return None
+    start_date, end_date = dates
+
+    return {
+        "country": countries.pop().value if countries else None,
+        "start_date": start_date and start_date.isoformat(),
+        "end_date": end_date and end_date.isoformat(),
+        "rate": rates.pop() if rates else None,
+        "limit": limits.pop() if limits else DEFAULT_LIMIT,
+    }
+
+
+def _take_dates(extraction: _Extraction) -> tuple[datetime.date | None, datetime.date | None] | None:
+    """(start, end) from the date phrases in the message; None when ambiguous."""
+    # (position, first day, last day, preceding word)
+    mentions = []
+    for pattern in (_ISO_DATE, _SLASH_DATE, _DAY_FIRST, _MONTH_FIRST):
+        for match in extraction.take(pattern):
+            month = match["month"]
+            month = int(month) if month.isdigit() else _month_number(month)
+            day = _date(match["year"], month, int(match["day"]))
+            if day is None:
+                return None
+            mentions.append((match.start(), day, day))
+
+    for match in extraction.take(_WHOLE_MONTH):
+        before = extraction.text[: match.start()].split()
+        if match["month"] == "may" and (not before or before[-1] not in _MAY_INTRODUCERS):
+            return None
+        year = int(match["year"]) if match["year"] else DEFAULT_YEAR
+        month = _month_number(match["month"])
+        last = calendar.monthrange(year, month)[1]
+        mentions.append(
+            (match.start(), datetime.date(year, month, 1), datetime.date(year, month, last))
+        )
+
+    mentions.sort(key=lambda mention: mention[0])
+    if not mentions:
+        return None, None
+
+    if len(mentions) == 1:
+        position, first, last = mentions[0]
+        if first != last:
+            return first, last
+        before = extraction.text[:position].split()
+        if before and before[-1] in ("until", "till", "by", "before", "through", "thru"):
+            return None, first
+        return first, None
+
+    if len(mentions) == 2:
+        start, end = mentions[0][1], mentions[1][2]
+        if end < start:
+            return None
+        return start, end
+    return None
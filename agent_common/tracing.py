@@ -0,0 +1,353 @@
+"""
+Lightweight tracing of the agent pipelines.
+
+Spans are timed blocks with a trace id, their own id and their parent's id,
+nested through a context variable so they follow threads started by
+LangChain and asyncio tasks. The lesson graphs open a span per node,
+`TripQueryParser` one per parse (with LLM and JSON output parsing spans from
+LangChain callbacks below it) and the webservice clients one per HTTP call.
+
+    with span("call_api", country="Japan"):
+        ...
+
+    @traced("parse_query")
+    def parse_trip_query_node(state): ...
+
+Tracing is off unless TRIP_TRACE is set to a JSONL file path (finished spans
+are appended to it) or to `memory` (kept in `InMemoryExporter.spans`), or
+`configure()` is given an exporter. When off, `span()` hands back a shared
+no-op and `traced` calls straight through.
+
+    python -m agent_common.tracing trace.jsonl --top 10
+
+summarizes a trace file: time per span name and the slowest spans.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import statistics
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Annotated, Any
+
+import typer
+
+
+TRACE_ENV = "TRIP_TRACE"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start: float
+    duration_ms: float = 0.0
+    status: str = "ok"
+    error: str | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+
+class InMemoryExporter:
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+class JsonlExporter:
+    """Appends each finished span to `path` as one JSON line."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(asdict(span), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_exporter: InMemoryExporter | JsonlExporter | None = None
+_current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("trip_span", default=None)
+
+
+def configure(exporter) -> None:
+    """Send finished spans to `exporter`; None turns tracing off."""
+    global _exporter
+    _exporter = exporter
+
+
+def configure_from_env() -> None:
+    target = os.getenv(TRACE_ENV, "")
+    if target in ("", "0"):
+        configure(None)
+    elif target == "memory":
+        configure(InMemoryExporter())
+    else:
+        configure(JsonlExporter(target))
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def get_exporter():
+    return _exporter
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+class _ActiveSpan:
+    __slots__ = ("span", "_token", "_started")
+
+    def __init__(self, name: str, attributes: dict):
+        parent = _current.get()
+        self.span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _new_id(),
+            span_id=_new_id(),
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attributes=attributes,
+        )
+
+    def set(self, **attributes):
+        self.span.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current.set(self.span)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration_ms = (time.perf_counter() - self._started) * 1e3
+        _current.reset(self._token)
+        if exc is not None:
+            self.span.status = "error"
+            self.span.error = repr(exc)
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(self.span)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes):
+    """Context manager timing its block as a child of the current span."""
+    if _exporter is None:
+        return _NOOP
+    return _ActiveSpan(name, attributes)
+
+
+def record_span(name: str, started: float, ended: float, parent: Span | None, **attributes):
+    """Export a span timed elsewhere (perf_counter `started` / `ended`)."""
+    exporter = _exporter
+    if exporter is None:
+        return
+    exporter.export(
+        Span(
+            name=name,
+            trace_id=parent.trace_id if parent else _new_id(),
+            span_id=_new_id(),
+            parent_id=parent.span_id if parent else None,
+            start=time.time() - (time.perf_counter() - started),
+            duration_ms=(ended - started) * 1e3,
+            attributes=attributes,
+        )
+    )
+
+
+def traced(name: str | None = None):
+    """Decorator running the function (sync or async) inside a span."""
+
+    def decorate(func):
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _exporter is None:
+                    return await func(*args, **kwargs)
+                with _ActiveSpan(span_name, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return func(*args, **kwargs)
+            with _ActiveSpan(span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def langchain_config() -> dict:
+    """Runnable config adding LLM and output parser spans; empty when tracing is off."""
+    if _exporter is None:
+        return {}
+    return {"callbacks": [_langchain_handler()]}
+
+
+@functools.lru_cache(maxsize=None)
+def _langchain_handler():
+    # langchain is only imported once tracing is on and a chain runs
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class SpanCallbackHandler(BaseCallbackHandler):
+        """Chat model calls and output parser runs as spans under the current span."""
+
+        run_inline = True
+
+        def __init__(self):
+            self._open: dict = dict()
+            self._lock = threading.Lock()
+
+        def _start(self, run_id, name: str, **attributes):
+            with self._lock:
+                self._open[run_id] = (name, time.perf_counter(), _current.get(), attributes)
+
+        def _end(self, run_id, **attributes):
+            ended = time.perf_counter()
+            with self._lock:
+                opened = self._open.pop(run_id, None)
+            if opened is not None:
+                name, started, parent, start_attributes = opened
+                record_span(name, started, ended, parent, **start_attributes, **attributes)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id, "llm", model=(serialized or {}).get("name"))
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=repr(error))
+
+        def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+            name = kwargs.get("name") or ""
+            if name.endswith("OutputParser"):
+                self._start(run_id, "output_parser", parser=name)
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=repr(error))
+
+    return SpanCallbackHandler()
+
+
+def load_spans(path: str | Path) -> list[Span]:
+    spans = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                spans.append(Span(**json.loads(line)))
+    return spans
+
+
+def summarize(spans: list[Span]) -> list[dict]:
+    """Per span name: count, total, p50, p95 and max milliseconds; most total time first."""
+    by_name: dict[str, list[float]] = dict()
+    for s in spans:
+        by_name.setdefault(s.name, []).append(s.duration_ms)
+
+    rows = []
+    for name, durations in by_name.items():
+        durations.sort()
+        cuts = statistics.quantiles(durations, n=100) if len(durations) > 1 else durations * 99
+        rows.append(
+            {
+                "name": name,
+                "count": len(durations),
+                "total_ms": sum(durations),
+                "p50_ms": cuts[49],
+                "p95_ms": cuts[94],
+                "max_ms": durations[-1],
+                "errors": sum(s.status != "ok" for s in spans if s.name == name),
+            }
+        )
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def format_report(spans: list[Span], top: int = 10) -> str:
+    lines = [f"{len(spans)} spans, {len({s.trace_id for s in spans})} traces"]
+    lines.append(
+        f"{'span':<22}{'count':>7}{'total ms':>11}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'errors':>8}"
+    )
+    for row in summarize(spans):
+        lines.append(
+            f"{row['name']:<22}{row['count']:>7}{row['total_ms']:>11.1f}{row['p50_ms']:>9.2f}"
+            f"{row['p95_ms']:>9.2f}{row['max_ms']:>9.2f}{row['errors']:>8}"
+        )
+
+    lines.append(f"\nslowest {top} spans")
+    for s in sorted(spans, key=lambda s: s.duration_ms, reverse=True)[:top]:
+        attributes = " ".join(f"{key}={value}" for key, value in s.attributes.items())
+        lines.append(f"  {s.duration_ms:>9.2f} ms  {s.name:<18} trace={s.trace_id} {attributes}")
+    return "\n".join(lines)
+
+
+configure_from_env()
+
+
+cli_app = typer.Typer()
+
+
+@cli_app.command()
+def report(
+    trace_file: Path,
+    top: Annotated[int, typer.Option(help="How many of the slowest spans to list")] = 10,
+):
+    """Summarize the spans in TRACE_FILE"""
+    print(format_report(load_spans(trace_file), top))
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -1,25 +1,47 @@
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph
+from functools import lru_cache
 from typing import TypedDict, Annotated
 import typer
+from loguru import logger
 
+from agent_common import tracing
+from agent_common.parse_cache import TripQueryParser
 from agent_lesson1.schemas import TripQuery
-from agent_lesson1.prompt import parse_prompt
+from agent_lesson1.prompt import PARSE_TEMPLATE, get_parse_prompt
 
 
 cli_app = typer.Typer()
 
-    
-llm = ChatOpenAI(model="gpt-4")
 
-parser = JsonOutputParser(pydantic_object=TripQuery)
-chain = parse_prompt | llm | parser
+# langchain, langgraph and the OpenAI client are slow to import and the client
+# wants credentials, so each is built on first use and kept
 
 
+@lru_cache(maxsize=None)
+def get_llm():
+    # TRIP_AGENT_LLM=fake swaps in a local stand-in for offline runs
+    from agent_common.llm import build_chat_model
+
+    return build_chat_model()
+
+
+@lru_cache(maxsize=None)
+def get_chain():
+    from langchain_core.output_parsers import JsonOutputParser
+
+    parser = JsonOutputParser(pydantic_object=TripQuery)
+    return get_parse_prompt() | get_llm() | parser
+
+
+@lru_cache(maxsize=None)
+def get_query_parser() -> TripQueryParser:
+    # rules and cached answers before the LLM
+    return TripQueryParser(get_chain, PARSE_TEMPLATE, schema=TripQuery)
+
+
+@tracing.traced("parse_query")
 def parse_trip_query_node(state):
     user_message = state["user_input"]
-    trip_query = chain.invoke({"input": user_message})
+    trip_query = get_query_parser().parse(user_message)
     return {"parsed_query": trip_query}
 
 
@@ -28,21 +50,40 @@ class ChatState(TypedDict):
     parsed_query: TripQuery
 
 
-graph = StateGraph(ChatState)
-graph.add_node("parse_query", parse_trip_query_node)
-graph.set_entry_point("parse_query")
-graph.set_finish_point("parse_query")
+@lru_cache(maxsize=None)
+def build_graph():
+    from langgraph.graph import StateGraph
+
+    graph = StateGraph(ChatState)
+    graph.add_node("parse_query", parse_trip_query_node)
+    graph.set_entry_point("parse_query")
+    graph.set_finish_point("parse_query")
+    return graph.compile()
+
+
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "chain": get_chain,
+    "query_parser": get_query_parser,
+    "langgraph_app": build_graph,
+}
+
 
-langgraph_app = graph.compile()
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @cli_app.command()
 def parse_query(user_input: Annotated[str, typer.Option("--user-input", "-s", help="The user input to parse")]):
     """Parse a user query into a TripQuery object"""
 
-    result = langgraph_app.invoke({"user_input": user_input})
+    with tracing.span("agent"):
+        result = build_graph().invoke({"user_input": user_input})
     print(result["parsed_query"])
+    logger.info(f"Parse stats: {get_query_parser().stats()}")
 
 
 if __name__ == "__main__":
-    cli_app()
\ No newline at end of file
+    cli_app()
@@ -1,58 +1,104 @@
 import json
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph
-from typing import TypedDict, Annotated
+from functools import lru_cache
+from typing import TYPE_CHECKING, TypedDict, Annotated
 import typer
-import requests
 from loguru import logger
 
 
-from agent_lesson2.prompt import parse_prompt
+from agent_lesson2.prompt import PARSE_TEMPLATE, get_parse_prompt
+from agent_common import tracing
+from agent_common.parse_cache import TripQueryParser
 from webservice.schemas import TripSearchRequest, TripSearchResultsResponse
 
+if TYPE_CHECKING:
+    import httpx
+
 
 cli_app = typer.Typer()
 
 
-llm = ChatOpenAI(model="gpt-4")
+# langchain, langgraph, httpx and the OpenAI client are slow to import and the
+# client wants credentials, so each is built on first use and kept
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    # TRIP_AGENT_LLM=fake swaps in a local stand-in for offline runs
+    from agent_common.llm import build_chat_model
+
+    return build_chat_model()
+
+
+@lru_cache(maxsize=None)
+def get_chain():
+    from langchain_core.output_parsers import JsonOutputParser
 
-parser = JsonOutputParser(pydantic_object=TripSearchRequest)
-chain = parse_prompt | llm | parser
+    parser = JsonOutputParser(pydantic_object=TripSearchRequest)
+    return get_parse_prompt() | get_llm() | parser
 
 
+@lru_cache(maxsize=None)
+def get_query_parser() -> TripQueryParser:
+    # rules and cached answers before the LLM
+    return TripQueryParser(get_chain, PARSE_TEMPLATE, schema=TripSearchRequest)
+
+
+@tracing.traced("parse_query")
 def parse_trip_query_node(state):
     user_message = state["user_input"]
-    trip_query = chain.invoke({"input": user_message})
+    trip_query = get_query_parser().parse(user_message)
     logger.info(f"Parsed Query: {trip_query}")
     return {"parsed_query": TripSearchRequest.model_validate(trip_query)}
 
 
+@tracing.traced("call_api")
 def call_search_api_node(state):
     """Call REST API to perform actual search"""
+    import httpx
+    from agent_common.client import get_client
+
     trip_query: TripSearchRequest = state["parsed_query"]
     logger.info(f"Sending Query to API: {trip_query}")
 
-    # Example API call - replace with your actual endpoint
-    api_url = "http://localhost:9009/api/trip/openings/search"
+    try:
+        search_results = get_client().search(trip_query)
+    except httpx.HTTPError as e:
+        return _search_failed(trip_query, e)
+    return _search_succeeded(trip_query, search_results)
+
+
+@tracing.traced("call_api")
+async def acall_search_api_node(state):
+    """Same as `call_search_api_node`, without blocking the event loop"""
+    import httpx
+    from agent_common.client import get_async_client
+
+    trip_query: TripSearchRequest = state["parsed_query"]
+    logger.info(f"Sending Query to API: {trip_query}")
 
     try:
-        response = requests.get(api_url, params=trip_query.model_dump(), timeout=10)
-        response.raise_for_status()
-        search_results: TripSearchResultsResponse = response.json()
-        logger.info(f"Search Results: {search_results}")
-        return {
-            "search_results": TripSearchResultsResponse.model_validate(search_results),
-            "api_status": "success",
-            "parsed_query": trip_query,
-        }
-    except requests.RequestException as e:
-        logger.error(f"Error calling API: {str(e)}")
-        return {
-            "search_results": None,
-            "api_status": f"error: {str(e)}",
-            "parsed_query": trip_query,
-        }
+        search_results = await get_async_client().search(trip_query)
+    except httpx.HTTPError as e:
+        return _search_failed(trip_query, e)
+    return _search_succeeded(trip_query, search_results)
+
+
+def _search_succeeded(trip_query, search_results: TripSearchResultsResponse):
+    logger.info(f"Search Results: {search_results}")
+    return {
+        "search_results": search_results,
+        "api_status": "success",
+        "parsed_query": trip_query,
+    }
+
+
+def _search_failed(trip_query, e: "httpx.HTTPError"):
+    logger.error(f"Error calling API: {str(e)}")
+    return {
+        "search_results": None,
+        "api_status": f"error: {str(e)}",
+        "parsed_query": trip_query,
+    }
 
 
 class ChatState(TypedDict):
@@ -62,14 +108,35 @@ class ChatState(TypedDict):
     api_status: str
 
 
-graph = StateGraph(ChatState)
-graph.add_node("parse_query", parse_trip_query_node)
-graph.add_node("call_api", call_search_api_node)
-graph.set_entry_point("parse_query")
-graph.add_edge("parse_query", "call_api")
-graph.set_finish_point("call_api")
+@lru_cache(maxsize=None)
+def build_graph():
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import StateGraph
+
+    graph = StateGraph(ChatState)
+    graph.add_node("parse_query", parse_trip_query_node)
+    # `invoke` runs the blocking node, `ainvoke` the async one
+    graph.add_node(
+        "call_api", RunnableLambda(call_search_api_node, afunc=acall_search_api_node)
+    )
+    graph.set_entry_point("parse_query")
+    graph.add_edge("parse_query", "call_api")
+    graph.set_finish_point("call_api")
+    return graph.compile()
+
+
+_LAZY_ATTRIBUTES = {
+    "llm": get_llm,
+    "chain": get_chain,
+    "query_parser": get_query_parser,
+    "langgraph_app": build_graph,
+}
+
 
-langgraph_app = graph.compile()
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @cli_app.command()
@@ -80,7 +147,8 @@ def parse_query(
 ):
     """Parse a user query into a TripQuery object and call search API"""
     logger.warning("User Input: {}".format(user_input))
-    result = langgraph_app.invoke({"user_input": user_input})
+    with tracing.span("agent"):
+        result = build_graph().invoke({"user_input": user_input})
     logger.info(
         "Parsed Query: {}".format(result["parsed_query"].model_dump_json(indent=2))
     )
@@ -88,6 +156,7 @@ def parse_query(
         logger.info("Search Results Below:")
         for row in result["search_results"].results:
             logger.info(row.model_dump_json(indent=2))
+    logger.info(f"Parse stats: {get_query_parser().stats()}")
 
 
 if __name__ == "__main__":
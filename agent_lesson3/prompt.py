@@ -1,6 +1,7 @@
-from langchain_core.prompts import PromptTemplate
+from functools import lru_cache
 
-parse_prompt = PromptTemplate.from_template("""
+
+PARSE_TEMPLATE = """
 Extract the following fields from the user message below. 
 If a field is not specified, leave it null. Output in JSON format only.
 
@@ -15,4 +16,18 @@ Expected output Fields:
 - limit: Maximum number of results (default to 10)
 
 Message: {input}
-""")
+"""
+
+
+@lru_cache(maxsize=None)
+def get_parse_prompt():
+    from langchain_core.prompts import PromptTemplate
+
+    return PromptTemplate.from_template(PARSE_TEMPLATE)
+
+
+def __getattr__(name):
+    # built on first access, so importing this module skips langchain
+    if name == "parse_prompt":
+        return get_parse_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
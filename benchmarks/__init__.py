@@ -0,0 +1 @@
+"""Benchmarks for the trip webservice and agents, run with `python -m benchmarks.<name>`."""
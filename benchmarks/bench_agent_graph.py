@@ -0,0 +1,156 @@
+"""
+End-to-end latency of an agent graph, offline: the fake chat model stands in
+for OpenAI and the webservice runs in a thread of the same process.
+
+    python -m benchmarks.bench_agent_graph --queries 300 --concurrency 1 --concurrency 8 \
+        --llm-latency-ms 0
+
+Queries go through `langgraph_app.ainvoke` with the given number in flight.
+Per-node latency (parse_query, call_api) and the fake model's share of it are
+read from LangChain callbacks; with --llm-latency-ms 0 what is left is the
+graph's own overhead: graph execution, JSON output parsing, pydantic
+validation and the HTTP round trip. The parse fast path is off by default so
+every query reaches the model; --rules turns it on. Client and server share
+one interpreter, so absolute numbers include their contention for the GIL.
+"""
+
+import asyncio
+import os
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Annotated
+
+import typer
+
+from benchmarks.server import webservice_in_thread
+
+
+cli_app = typer.Typer()
+
+USER_INPUTS = [
+    "Japan under 500 in March",
+    "I want to go to India in August, for about 2 weeks. My budget is $200 per day.",
+    "France from June 5 to June 20, show me 5 options",
+    "somewhere warm and cheap next month",
+    "Brazil until July 4th, max 300 per night",
+    "top 3 hotels in Kenya",
+]
+
+
+def _timer_class():
+    # imported late: the environment must be set before langchain is loaded
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class StageTimer(BaseCallbackHandler):
+        """Wall time of graph nodes and chat model calls, by name."""
+
+        run_inline = True
+
+        def __init__(self, nodes: set[str]):
+            self.nodes = nodes
+            self.samples = defaultdict(list)
+            self._started = dict()
+            self._lock = threading.Lock()
+
+        def _start(self, run_id, stage: str):
+            with self._lock:
+                self._started[run_id] = (stage, time.perf_counter())
+
+        def _end(self, run_id):
+            ended = time.perf_counter()
+            with self._lock:
+                stage, started = self._started.pop(run_id, (None, None))
+                if stage is not None:
+                    self.samples[stage].append((ended - started) * 1e3)
+
+        def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+            if kwargs.get("name") in self.nodes:
+                self._start(run_id, kwargs["name"])
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._end(run_id)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id, "llm")
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._end(run_id)
+
+    return StageTimer
+
+
+async def _run_all(app, inputs: list[str], concurrency: int, timer) -> list[float]:
+    slots = asyncio.Semaphore(concurrency)
+    totals = []
+
+    async def run_one(user_input: str):
+        async with slots:
+            started = time.perf_counter()
+            result = await app.ainvoke({"user_input": user_input}, config={"callbacks": [timer]})
+            totals.append((time.perf_counter() - started) * 1e3)
+            assert result.get("api_status", "success") == "success", result["api_status"]
+
+    await asyncio.gather(*(run_one(user_input) for user_input in inputs))
+    return totals
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float, float]:
+    if len(samples) < 2:
+        return (samples[0],) * 3 if samples else (0.0,) * 3
+    cuts = statistics.quantiles(samples, n=100)
+    return cuts[49], cuts[94], cuts[98]
+
+
+@cli_app.command()
+def run(
+    graph: Annotated[str, typer.Option(help="Module defining `langgraph_app`")] = "agent_lesson3.parser",
+    queries: int = 300,
+    concurrency: Annotated[list[int], typer.Option(help="Queries in flight")] = [1, 8],
+    llm_latency_ms: float = 0.0,
+    rules: Annotated[bool, typer.Option(help="Let the rule parser answer before the model")] = False,
+    warmup: int = 20,
+):
+    os.environ.update(
+        TRIP_AGENT_LLM="fake",
+        TRIP_FAKE_LLM_LATENCY_MS=str(llm_latency_ms),
+        TRIP_PARSE_RULES="1" if rules else "0",
+        TRIP_PARSE_CACHE_SIZE="0",
+        OPENINGS_SNAPSHOT_PATH="",
+    )
+    import importlib
+
+    from loguru import logger
+
+    logger.remove()
+    with webservice_in_thread() as base_url:
+        os.environ["VACATION_API_BASE_URL"] = base_url
+        module = importlib.import_module(graph)
+        app = module.langgraph_app
+        StageTimer = _timer_class()
+        stages = ("parse_query", "call_api", "llm")
+
+        inputs = [USER_INPUTS[i % len(USER_INPUTS)] for i in range(queries)]
+        asyncio.run(_run_all(app, inputs[:warmup], 1, StageTimer(set(stages))))
+
+        print(f"{graph}, {queries} queries, fake model latency {llm_latency_ms} ms")
+        for in_flight in concurrency:
+            timer = StageTimer(set(stages))
+            started = time.perf_counter()
+            totals = asyncio.run(_run_all(app, inputs, in_flight, timer))
+            seconds = time.perf_counter() - started
+
+            print(f"\nconcurrency {in_flight}: {queries / seconds:,.1f} queries/sec")
+            print(f"{'stage':<14}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+            for stage, samples in [*((s, timer.samples[s]) for s in stages), ("graph", totals)]:
+                if samples:
+                    p50, p95, p99 = _percentiles(samples)
+                    print(f"{stage:<14}{len(samples):>7}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    cli_app()
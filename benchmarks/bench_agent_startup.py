@@ -0,0 +1,93 @@
+"""
+Cold-start latency of the agent CLIs.
+
+    python -m benchmarks.bench_agent_startup --modules agent_lesson3.parser --top 10
+
+For each module, in fresh interpreters without OpenAI credentials: the time
+to import it, the wall time of `python -m <module> --help`, and the slowest
+imports it pulls in according to `python -X importtime`. langchain, langgraph
+and the OpenAI client should not show up, since they are loaded on first use.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Annotated
+
+import typer
+
+
+cli_app = typer.Typer()
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def _env() -> dict:
+    env = {**os.environ, "LOGURU_LEVEL": "WARNING"}
+    env.pop("OPENAI_API_KEY", None)
+    return env
+
+
+def _wall_seconds(command: list[str], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run(command, env=_env(), capture_output=True, check=True)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _slowest_imports(module: str, top: int) -> list[tuple[str, float]]:
+    """(name, cumulative ms) of the imports done directly by `module`, slowest first."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=_env(), capture_output=True, text=True, check=True,
+    )
+    # children are listed before their parent, two more spaces of indent per level
+    children = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        depth = (len(match[3]) - 1) // 2
+        if depth == 1:
+            children.append((match[4], int(match[2]) / 1e3))
+        elif depth == 0:
+            if match[4] == module:
+                return sorted(children, key=lambda item: item[1], reverse=True)[:top]
+            children = []
+    return []
+
+
+@cli_app.command()
+def run(
+    modules: Annotated[list[str], typer.Option(help="Agent CLI modules")] = [
+        "agent_lesson1.parser",
+        "agent_lesson2.parser",
+        "agent_lesson3.parser",
+    ],
+    repeats: int = 5,
+    top: int = 5,
+):
+    print(f"{'module':<24}{'import (ms)':>12}{'--help (ms)':>12}")
+    slowest = dict()
+    for module in modules:
+        import_seconds = _wall_seconds([sys.executable, "-c", f"import {module}"], repeats)
+        help_seconds = _wall_seconds([sys.executable, "-m", module, "--help"], repeats)
+        print(f"{module:<24}{import_seconds * 1e3:>12.0f}{help_seconds * 1e3:>12.0f}")
+        slowest[module] = _slowest_imports(module, top)
+
+    # wall times include interpreter startup; this is the baseline
+    bare = _wall_seconds([sys.executable, "-c", "pass"], repeats)
+    print(f"{'(bare interpreter)':<24}{bare * 1e3:>12.0f}")
+
+    for module, imports in slowest.items():
+        print(f"\nslowest imports of {module}")
+        for name, ms in imports:
+            print(f"  {name:<32}{ms:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    cli_app()
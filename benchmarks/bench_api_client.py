@@ -0,0 +1,98 @@
+"""
+Per-call latency of the agents' search call against a local webservice.
+
+    python -m benchmarks.bench_api_client --calls 500
+
+Compares the old node code (a fresh `requests.get`, so a new TCP connection
+per call) with the pooled `TripServiceClient`, and the async client issuing
+the same calls sequentially and `concurrency` at a time.
+"""
+
+import asyncio
+import statistics
+import time
+
+import requests
+import typer
+
+from agent_common.client import AsyncTripServiceClient, ClientConfig, TripServiceClient
+from benchmarks.server import running_webservice
+from webservice.schemas import TripSearchRequest
+
+
+cli_app = typer.Typer()
+
+QUERY = TripSearchRequest(country="India", start_date="2024-08-01", limit=5, days_count=14)
+
+
+def _latencies_ms(call, calls: int) -> list[float]:
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1e3)
+    return timings
+
+
+async def _async_sequential_ms(client: AsyncTripServiceClient, calls: int) -> list[float]:
+    timings = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await client.search(QUERY)
+        timings.append((time.perf_counter() - started) * 1e3)
+    return timings
+
+
+async def _async_concurrent_ms(client: AsyncTripServiceClient, calls: int, concurrency: int) -> float:
+    """Wall time per call with `concurrency` calls in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await client.search(QUERY)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return (time.perf_counter() - started) * 1e3 / calls
+
+
+async def _async_runs(config: ClientConfig, calls: int, concurrency: int):
+    async with AsyncTripServiceClient(config) as client:
+        await client.search(QUERY)
+        sequential = await _async_sequential_ms(client, calls)
+        concurrent = await _async_concurrent_ms(client, calls, concurrency)
+    return sequential, concurrent
+
+
+def _row(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:>26}{statistics.median(timings):>10.2f}{p95:>10.2f}{statistics.mean(timings):>10.2f}")
+
+
+@cli_app.command()
+def run(calls: int = 500, concurrency: int = 8, seed_size: int = 3_000):
+    with running_webservice(OPENINGS_SEED_SIZE=str(seed_size)) as base_url:
+        config = ClientConfig(base_url=base_url)
+        url = f"{base_url}/api/trip/openings/search"
+        params = {
+            key if key != "rate" else "room_rate": value
+            for key, value in QUERY.model_dump(mode="json", exclude_none=True).items()
+        }
+
+        fresh = _latencies_ms(lambda: requests.get(url, params=params, timeout=10), calls)
+        with TripServiceClient(config) as client:
+            client.search(QUERY)
+            pooled = _latencies_ms(lambda: client.search(QUERY), calls)
+        sequential, concurrent = asyncio.run(_async_runs(config, calls, concurrency))
+
+    print(f"{calls} calls each, latency in ms")
+    print(f"{'client':>26}{'p50':>10}{'p95':>10}{'mean':>10}")
+    _row("requests.get per call", fresh)
+    _row("TripServiceClient", pooled)
+    _row("AsyncTripServiceClient", sequential)
+    print(f"{f'async, {concurrency} in flight':>26}{'':>20}{concurrent:>10.2f}  (wall ms per call)")
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,78 @@
+"""
+N single search requests vs one batch request with the same N searches.
+
+    python -m benchmarks.bench_batch_search --batch-sizes 10 --batch-sizes 100
+
+Requests go through the ASGI app in-process (no network), so the numbers show
+per-request framework overhead plus search work, not socket latency. The result
+cache is disabled so both sides do the full search. Searches are a random mix of
+broad and selective filters, like a planner fanning out over candidate trips.
+"""
+
+import random
+import time
+from typing import Annotated
+
+import typer
+from fastapi.testclient import TestClient
+
+from webservice import app as service
+from webservice.cache import SearchResultCache
+from webservice.data_generator.enums import Country
+
+
+cli_app = typer.Typer()
+
+
+def _random_search(rng: random.Random) -> dict:
+    search = {"limit": rng.choice([5, 10, 20])}
+    if rng.random() < 0.7:
+        search["country"] = rng.choice(list(Country)).value
+    if rng.random() < 0.5:
+        search["start_date"] = f"2024-{rng.randint(1, 12):02d}-01"
+    if rng.random() < 0.3:
+        search["rate"] = rng.choice([150, 300, 600])
+    return search
+
+
+@cli_app.command()
+def run(
+    batch_sizes: Annotated[list[int], typer.Option(help="Searches per batch")] = [10, 50, 200],
+    repeats: int = 3,
+    seed: int = 11,
+):
+    service.SEARCH_CACHE = SearchResultCache(max_entries=0)
+    client = TestClient(service.app)
+    rng = random.Random(seed)
+
+    print(f"{len(service.OPENINGS_DB):,} openings")
+    print(f"{'searches':>10}{'singles (ms)':>14}{'batch (ms)':>12}{'speedup':>10}")
+    for size in batch_sizes:
+        searches = [_random_search(rng) for _ in range(size)]
+        singles = [
+            {("room_rate" if key == "rate" else key): value for key, value in search.items()}
+            for search in searches
+        ]
+
+        single_ms, batch_ms = [], []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            single_results = [
+                client.get("/api/trip/openings/search", params=params).json()
+                for params in singles
+            ]
+            single_ms.append((time.perf_counter() - started) * 1e3)
+
+            started = time.perf_counter()
+            batch = client.post("/api/trip/openings/search/batch", json=searches).json()
+            batch_ms.append((time.perf_counter() - started) * 1e3)
+
+        assert batch["results"] == single_results
+        print(
+            f"{size:>10,}{min(single_ms):>14.1f}{min(batch_ms):>12.1f}"
+            f"{min(single_ms) / min(batch_ms):>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,86 @@
+"""
+Cold-start time of the webservice: generating the seed inventory vs restoring
+it from a snapshot.
+
+    python -m benchmarks.bench_cold_start --sizes 3000 --sizes 1000000
+
+Each measurement imports `webservice.app` in a fresh interpreter, which is
+what every `uvicorn --reload` restart pays.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+
+cli_app = typer.Typer()
+
+IMPORT_APP = """
+import json, time
+started = time.perf_counter()
+import webservice.app as service
+print(json.dumps({
+    "import_seconds": time.perf_counter() - started,
+    "openings": len(service.OPENINGS_DB),
+}))
+"""
+
+SAVE_SNAPSHOT = """
+import webservice.app as service
+from webservice.snapshot import save_snapshot
+save_snapshot(service.OPENINGS_DB, service.RESERVATIONS_DB, service.SNAPSHOT_PATH)
+"""
+
+
+def _run(code: str, **env) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env={**os.environ, "LOGURU_LEVEL": "WARNING", **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout
+
+
+def _measure(repeats: int, **env) -> dict:
+    runs = [json.loads(_run(IMPORT_APP, **env)) for _ in range(repeats)]
+    return {
+        "openings": runs[0]["openings"],
+        "best_import_seconds": min(r["import_seconds"] for r in runs),
+    }
+
+
+@cli_app.command()
+def run(
+    sizes: Annotated[list[int], typer.Option(help="Seed inventory sizes")] = [
+        3_000,
+        100_000,
+        1_000_000,
+    ],
+    repeats: int = 3,
+):
+    print(f"{'openings':>12}{'generate (s)':>16}{'snapshot (s)':>16}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = str(Path(tmp) / "inventory")
+            generated = _measure(repeats, OPENINGS_SEED_SIZE=str(n))
+
+            _run(SAVE_SNAPSHOT, OPENINGS_SEED_SIZE=str(n), OPENINGS_SNAPSHOT_PATH=snapshot_path)
+            restored = _measure(repeats, OPENINGS_SNAPSHOT_PATH=snapshot_path)
+
+        assert generated["openings"] == restored["openings"] == n
+        print(
+            f"{n:>12,}{generated['best_import_seconds']:>16.3f}"
+            f"{restored['best_import_seconds']:>16.3f}"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,82 @@
+"""
+Multi-valued country / lodging class / hotel company filters: bitmaps vs scan.
+
+    python -m benchmarks.bench_facet_search --sizes 100000 --sizes 1000000 --queries 200
+
+For each inventory size, random queries pick one to several values for one to
+three of the enum facets. Each is answered through `match_bitmaps` (OR within
+a facet, AND across facets, chunk by chunk) and through the full-table
+`isin` masks a scan would evaluate; both must return the same rows. Part of
+the inventory is booked first, so the bitmaps have had rows cleared.
+"""
+
+import random
+import statistics
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from webservice.data_generator.generator_funcs import generate_vacation_openings
+from webservice.indexes import match_bitmaps
+from webservice.search import QueryPlanner, SearchQuery
+from webservice.store import COUNTRIES, HOTEL_COMPANIES, LODGING_CLASSES, OpeningsStore
+
+
+cli_app = typer.Typer()
+
+FACETS = {"country": COUNTRIES, "lodging_class": LODGING_CLASSES, "hotel_company": HOTEL_COMPANIES}
+
+
+def _random_query(rng: random.Random) -> SearchQuery:
+    chosen = rng.sample(sorted(FACETS), rng.randint(1, 3))
+    params = {
+        name: [member.value for member in rng.sample(FACETS[name], rng.randint(1, 4))]
+        for name in chosen
+    }
+    return SearchQuery.from_params(**params)
+
+
+@cli_app.command()
+def run(
+    sizes: Annotated[list[int], typer.Option(help="Inventory sizes")] = [10_000, 100_000, 1_000_000],
+    queries: int = 200,
+    booked_fraction: float = 0.1,
+    seed: int = 5,
+):
+    rng = random.Random(seed)
+    print(f"{'openings':>10}{'matches':>10}{'bitmap us':>12}{'scan us':>11}{'speedup':>9}")
+    for size in sizes:
+        store = OpeningsStore()
+        store.add_openings(generate_vacation_openings(size))
+        indexes = QueryPlanner(store).indexes
+        for opening_id in rng.sample(store.opening_ids, int(size * booked_fraction)):
+            store.pop(opening_id)
+
+        bitmap_times, scan_times, matches = [], [], []
+        for _ in range(queries):
+            query = _random_query(rng)
+            facets = [(getattr(indexes, column), codes) for column, codes in query.code_filters()]
+
+            started = time.perf_counter()
+            rows = match_bitmaps(facets)
+            bitmap_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            scanned = np.flatnonzero(query.mask(store))
+            scan_times.append(time.perf_counter() - started)
+
+            assert np.array_equal(rows, scanned), query
+            matches.append(len(rows))
+
+        bitmap_us = statistics.median(bitmap_times) * 1e6
+        scan_us = statistics.median(scan_times) * 1e6
+        print(
+            f"{size:>10,}{statistics.median(matches):>10,.0f}{bitmap_us:>12,.1f}"
+            f"{scan_us:>11,.1f}{scan_us / bitmap_us:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
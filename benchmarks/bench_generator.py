@@ -0,0 +1,60 @@
+"""
+Rows/sec of the vacation opening generators.
+
+    python -m benchmarks.bench_generator
+    python -m benchmarks.bench_generator --sizes 10000 --sizes 1000000
+
+`columns` is the vectorized column path used by the webservice; the two
+object modes build one `TripOpening` per row, with and without validation.
+Object modes are skipped above `--max-object-rows`.
+"""
+
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from webservice.data_generator.generator_funcs import (
+    generate_vacation_columns,
+    generate_vacation_openings,
+)
+
+
+cli_app = typer.Typer()
+
+MODES = {
+    "columns": lambda n, rs: generate_vacation_columns(n, random_state=rs),
+    "objects_unvalidated": lambda n, rs: generate_vacation_openings(
+        n, validate=False, random_state=rs
+    ),
+    "objects_validated": lambda n, rs: generate_vacation_openings(n, random_state=rs),
+}
+
+
+@cli_app.command()
+def run(
+    sizes: Annotated[list[int], typer.Option(help="Row counts to generate")] = [
+        10_000,
+        1_000_000,
+        10_000_000,
+    ],
+    max_object_rows: Annotated[
+        int, typer.Option(help="Largest size to run the per-object modes at")
+    ] = 1_000_000,
+    seed: int = 42,
+):
+    print(f"{'mode':<22}{'rows':>12}{'seconds':>10}{'rows/sec':>14}")
+    for n in sizes:
+        for mode, generate in MODES.items():
+            if mode != "columns" and n > max_object_rows:
+                continue
+
+            started = time.perf_counter()
+            generate(n, np.random.RandomState(seed))
+            elapsed = time.perf_counter() - started
+            print(f"{mode:<22}{n:>12,}{elapsed:>10.2f}{n / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,70 @@
+"""
+Group bookings: one request per opening vs one batch request per group.
+
+    python -m benchmarks.bench_group_booking --group-size 4 --groups 200
+
+Requests go through the ASGI app in-process, so the timings show per-request
+overhead rather than network latency; over a real network every saved round
+trip also saves a full RTT.
+"""
+
+import time
+
+import typer
+from fastapi.testclient import TestClient
+
+from webservice import app as service
+
+
+cli_app = typer.Typer()
+
+USER = {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"}
+
+
+def _booking(opening_id: str) -> dict:
+    return {
+        "opening_id": opening_id,
+        "user": USER,
+        "start_date": "2024-06-01",
+        "end_date": "2024-06-08",
+        "days_count": 7,
+        "people_count": 2,
+    }
+
+
+@cli_app.command()
+def run(group_size: int = 4, groups: int = 200):
+    client = TestClient(service.app)
+    needed = 3 * group_size * groups
+    service.generate_openings(n=needed)
+    fresh = iter(service.OPENINGS_DB.opening_ids[-needed:])
+
+    def next_group() -> list[dict]:
+        return [_booking(next(fresh)) for _ in range(group_size)]
+
+    started = time.perf_counter()
+    for _ in range(groups):
+        for booking in next_group():
+            client.post("/api/trip/reservations/book", json=booking)
+    singles = time.perf_counter() - started
+
+    timings = dict()
+    for mode in ("best_effort", "atomic"):
+        started = time.perf_counter()
+        for _ in range(groups):
+            response = client.post(
+                "/api/trip/reservations/book/batch",
+                json={"bookings": next_group(), "mode": mode},
+            ).json()
+            assert response["status"] == "confirmed", response
+        timings[mode] = time.perf_counter() - started
+
+    print(f"{groups} groups of {group_size} openings")
+    print(f"{'path':>22}{'requests':>10}{'ms/group':>10}")
+    print(f"{'single bookings':>22}{groups * group_size:>10,}{singles / groups * 1e3:>10.2f}")
+    for mode, seconds in timings.items():
+        print(f"{'batch, ' + mode:>22}{groups:>10,}{seconds / groups * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    cli_app()
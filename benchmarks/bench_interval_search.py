@@ -0,0 +1,108 @@
+"""
+Covering and overlapping date window searches: interval index vs full scan.
+
+    python -m benchmarks.bench_interval_search --sizes 100000 --sizes 1000000 --queries 200
+
+For each inventory size, random stay windows of 1 to 14 days are matched in
+`covers` and `overlaps` mode, once through `IntervalIndex.dominated` (dropping
+booked rows with the `alive` column, as the planner does) and once with the
+vectorized full-table mask. Both must return the same rows. Part of the
+inventory is booked first so the index carries dead entries, as it would
+between vacuums. The cost of keeping the index current is shown as the time
+to insert a batch of new openings with and without it.
+"""
+
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from webservice.data_generator.generator_funcs import generate_vacation_openings
+from webservice.indexes import IntervalIndex
+from webservice.schemas import DateMatch
+from webservice.search import QueryPlanner, SearchQuery
+from webservice.store import OpeningsStore
+
+
+cli_app = typer.Typer()
+
+
+def _windows(rng: random.Random, n: int) -> list[tuple[datetime, datetime]]:
+    windows = []
+    for _ in range(n):
+        first = datetime(2024, 1, 1) + timedelta(days=rng.randrange(366))
+        windows.append((first, first + timedelta(days=rng.randint(1, 14))))
+    return windows
+
+
+def _median_us(timings: list[float]) -> float:
+    return statistics.median(timings) * 1e6
+
+
+@cli_app.command()
+def run(
+    sizes: Annotated[list[int], typer.Option(help="Inventory sizes")] = [10_000, 100_000, 1_000_000],
+    queries: int = 200,
+    booked_fraction: float = 0.1,
+    insert_batch: int = 1_000,
+    seed: int = 3,
+):
+    rng = random.Random(seed)
+    print(
+        f"{'openings':>10} {'mode':<9}{'matches':>9}{'index us':>11}{'scan us':>11}"
+        f"{'speedup':>9}"
+    )
+    for size in sizes:
+        store = OpeningsStore()
+        store.add_openings(generate_vacation_openings(size))
+        planner = QueryPlanner(store)
+        interval = planner.indexes.interval
+        for opening_id in rng.sample(store.opening_ids, int(size * booked_fraction)):
+            store.pop(opening_id)
+
+        windows = _windows(rng, queries)
+        for mode in (DateMatch.COVERS, DateMatch.OVERLAPS):
+            index_times, scan_times, matches = [], [], []
+            for first, last in windows:
+                query = SearchQuery.from_params(start_date=first, end_date=last, date_match=mode)
+
+                started = time.perf_counter()
+                rows = np.sort(interval.dominated(query.max_start_ord, query.min_end_ord))
+                rows = rows[store.alive[rows]]
+                index_times.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                scanned = np.flatnonzero(query.mask(store))
+                scan_times.append(time.perf_counter() - started)
+
+                assert np.array_equal(rows, scanned), (mode, first, last)
+                matches.append(len(rows))
+
+            index_us, scan_us = _median_us(index_times), _median_us(scan_times)
+            print(
+                f"{size:>10,} {mode.value:<9}{statistics.median(matches):>9,.0f}"
+                f"{index_us:>11,.1f}{scan_us:>11,.1f}{scan_us / index_us:>8.1f}x"
+            )
+
+        batch = generate_vacation_openings(insert_batch)
+        bare = IntervalIndex()
+        bare.insert(store.start_ord[: store.size], store.end_ord[: store.size], np.arange(store.size))
+        started = time.perf_counter()
+        store.add_openings(batch)
+        with_index = time.perf_counter() - started
+        new_rows = np.arange(store.size - insert_batch, store.size)
+        started = time.perf_counter()
+        bare.insert(store.start_ord[new_rows], store.end_ord[new_rows], new_rows)
+        interval_only = time.perf_counter() - started
+        print(
+            f"{'':>10} insert {insert_batch:,}: {with_index * 1e3:.1f} ms with all indexes, "
+            f"{interval_only * 1e3:.1f} ms of it the interval index"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,103 @@
+"""
+Search latency with and without the result cache.
+
+    python -m benchmarks.bench_search_cache --limits 10 --limits 1000
+
+Calls the search endpoint function directly (no HTTP) for the same query over
+and over: "uncached" recomputes every time, "cached" is a repeat served from
+the cache. A booking between searches bumps the inventory generation, so the
+next search recomputes; the mixed run books one opening every `book_every`
+searches over a skewed set of repeated queries, to show a realistic hit rate.
+"""
+
+import random
+import time
+from typing import Annotated
+
+import typer
+
+from webservice import app as service
+from webservice.cache import SearchResultCache
+from webservice.data_generator.enums import Country
+from webservice.ranking import DEFAULT_RANKING
+from webservice.schemas import TripBookingRequest
+
+
+cli_app = typer.Typer()
+
+
+def _search(country=None, limit=10, days_count=2):
+    return service.search_openings(
+        country=country,
+        start_date=None,
+        end_date=None,
+        room_rate=None,
+        limit=limit,
+        days_count=days_count,
+        rank_by=DEFAULT_RANKING,
+        cursor=None,
+    )
+
+
+def _per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def _book(opening_id: str):
+    service.book_reservation(
+        TripBookingRequest(
+            opening_id=opening_id,
+            user=service.USERS_DB["otani"],
+            start_date="2024-06-01",
+            end_date="2024-06-08",
+            days_count=7,
+            people_count=2,
+        )
+    )
+
+
+@cli_app.command()
+def run(
+    limits: Annotated[list[int], typer.Option(help="Page sizes to search for")] = [10, 100, 1_000],
+    calls: int = 200,
+    mixed_searches: int = 5_000,
+    book_every: int = 50,
+):
+    print(f"{len(service.OPENINGS_DB):,} openings")
+    print(f"{'limit':>8}{'uncached (us)':>16}{'cached (us)':>14}{'speedup':>10}")
+    for limit in limits:
+        service.SEARCH_CACHE = SearchResultCache(max_entries=0)
+        uncached = _per_call_us(lambda: _search("Japan", limit), calls)
+
+        service.SEARCH_CACHE = SearchResultCache()
+        _search("Japan", limit)
+        cached = _per_call_us(lambda: _search("Japan", limit), calls)
+        print(f"{limit:>8,}{uncached:>16,.1f}{cached:>14,.1f}{uncached / cached:>9.0f}x")
+
+    # agents repeat a few popular searches far more often than the rest
+    countries = list(Country)
+    weights = [1 / (rank + 1) for rank in range(len(countries))]
+    pick = random.Random(7)
+
+    service.SEARCH_CACHE = SearchResultCache()
+    started = time.perf_counter()
+    for i in range(mixed_searches):
+        country = pick.choices(countries, weights)[0]
+        response = _search(country.value, pick.choice([5, 10, 20]))
+        if i % book_every == 0:
+            _book(service.OPENINGS_DB.opening_ids[int(service.OPENINGS_DB.live_rows()[0])])
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"mixed: {mixed_searches:,} searches, a booking every {book_every}: "
+        f"{elapsed / mixed_searches * 1e6:,.1f}us per search"
+    )
+    print(service.SEARCH_CACHE.stats())
+    assert response.status_code == 200
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,79 @@
+"""
+Search response encoding: serializing `TripOpening` models through the response
+model vs assembling the body from cached per-opening JSON fragments.
+
+    python -m benchmarks.bench_search_encoding --limits 10 --limits 1000
+
+Both paths encode the same page and must produce identical bytes. "cold" is the
+first request for a page (fragments still to be encoded), "warm" a repeat.
+"""
+
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from webservice import app as service
+from webservice.encoding import OpeningFragments, encode_search_response
+from webservice.schemas import TripSearchResultsResponse
+from webservice.search import SearchQuery
+
+
+cli_app = typer.Typer()
+
+
+def _best_of(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+@cli_app.command()
+def run(
+    limits: Annotated[list[int], typer.Option(help="Page sizes to encode")] = [
+        10,
+        100,
+        1_000,
+        10_000,
+    ],
+    repeats: int = 5,
+):
+    store = service.OPENINGS_DB
+    rows = service.SEARCH_PLANNER.matching_rows(SearchQuery())
+    scores = np.linspace(1, 0, len(rows))
+    search_params = {"days_count": 2}
+
+    def via_model(page_rows, page_scores):
+        return TripSearchResultsResponse(
+            results_count=len(page_rows),
+            search_params=search_params,
+            results=store.build_openings(page_rows, page_scores),
+        ).model_dump_json().encode()
+
+    print(f"{len(store):,} openings")
+    print(f"{'limit':>8}{'model (ms)':>12}{'cold (ms)':>12}{'warm (ms)':>12}{'speedup':>10}")
+    for limit in limits:
+        page_rows, page_scores = rows[:limit], scores[:limit]
+        fragments = OpeningFragments(store)
+
+        def via_fragments():
+            openings = fragments.encode_openings(page_rows, page_scores)
+            return encode_search_response(search_params, openings)
+
+        model_seconds = _best_of(lambda: via_model(page_rows, page_scores), repeats)
+        cold_seconds = _best_of(via_fragments, 1)
+        warm_seconds = _best_of(via_fragments, repeats)
+        assert via_fragments() == via_model(page_rows, page_scores)
+
+        print(
+            f"{limit:>8,}{model_seconds * 1e3:>12.2f}{cold_seconds * 1e3:>12.2f}"
+            f"{warm_seconds * 1e3:>12.2f}{model_seconds / warm_seconds:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,157 @@
+"""
+Pushed subscriptions vs polling for new openings.
+
+    python -m benchmarks.bench_subscriptions matching --subscriptions 100 --subscriptions 10000
+    python -m benchmarks.bench_subscriptions latency --inserts 200
+
+`matching` times `SubscriptionRegistry.on_insert` (the work added to every
+insert) for a batch of new openings against many standing queries, next to
+what one round of polling costs the service: one search per subscriber over
+the whole inventory.
+
+`latency` serves the webservice from a thread, keeps a subscription open
+through `AsyncTripServiceClient.subscribe` and adds openings one at a time;
+it reports the time from `/openings/add` being sent to the matching opening
+arriving at the client. A poller sees a new opening half its polling interval
+later on average, plus the search itself.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import time
+from typing import Annotated
+
+import typer
+
+
+cli_app = typer.Typer()
+
+
+def _random_params(rng: random.Random) -> dict:
+    from webservice.store import COUNTRIES, LODGING_CLASSES
+
+    params = {"country": [c.value for c in rng.sample(COUNTRIES, rng.randint(1, 3))]}
+    if rng.random() < 0.5:
+        params["rate"] = float(rng.choice([300, 600, 1200]))
+    if rng.random() < 0.3:
+        params["lodging_class"] = [rng.choice(LODGING_CLASSES).value]
+    return params
+
+
+@cli_app.command()
+def matching(
+    subscriptions: Annotated[list[int], typer.Option(help="Standing queries")] = [10, 1_000, 10_000],
+    distinct: Annotated[float, typer.Option(help="Fraction of subscriptions with their own query")] = 0.2,
+    inventory: int = 100_000,
+    batch: int = 100,
+    repeats: int = 20,
+    seed: int = 9,
+):
+    from loguru import logger
+
+    from webservice.data_generator.generator_funcs import generate_vacation_columns
+    from webservice.search import QueryPlanner, SearchQuery
+    from webservice.store import OpeningsStore
+    from webservice.subscriptions import SubscriptionRegistry
+
+    logger.remove()
+    rng = random.Random(seed)
+    print(
+        f"{'subscriptions':>14}{'queries':>9}{'push ms/insert':>16}{'poll round ms':>15}"
+    )
+
+    async def measure(n: int):
+        store = OpeningsStore()
+        store.add_columns(generate_vacation_columns(n=inventory))
+        planner = QueryPlanner(store)
+        registry = SubscriptionRegistry(store)
+        queries = [SearchQuery.from_params(**_random_params(rng)) for _ in range(max(1, int(n * distinct)))]
+        for i in range(n):
+            registry.subscribe(queries[i % len(queries)])
+
+        insert_times = []
+        for _ in range(repeats):
+            rows = store.add_columns(generate_vacation_columns(n=batch))
+            started = time.perf_counter()
+            registry.on_insert(store, rows)
+            insert_times.append(time.perf_counter() - started)
+            # drop what was queued; nobody reads in this benchmark
+            await asyncio.sleep(0)
+            for subscriptions in registry._subscribers.values():
+                for subscription in subscriptions:
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+
+        # a poller runs one search per subscriber; time a sample and scale up
+        sample = [queries[i % len(queries)] for i in range(min(n, 200))]
+        started = time.perf_counter()
+        for query in sample:
+            planner.matching_rows(query)
+        poll_round = (time.perf_counter() - started) / len(sample) * n
+
+        print(
+            f"{n:>14,}{len(queries):>9,}{statistics.median(insert_times) * 1e3:>16.2f}"
+            f"{poll_round * 1e3:>15.1f}"
+        )
+
+    for n in subscriptions:
+        asyncio.run(measure(n))
+
+
+@cli_app.command()
+def latency(inserts: int = 200, interval_ms: float = 20.0):
+    os.environ.setdefault("OPENINGS_SNAPSHOT_PATH", "")
+    import httpx
+    from loguru import logger
+
+    from agent_common.client import AsyncTripServiceClient, ClientConfig
+    from benchmarks.server import webservice_in_thread
+    from webservice.schemas import TripSearchRequest
+
+    logger.remove()
+    with webservice_in_thread() as base_url:
+
+        async def run() -> tuple[list[float], list[float]]:
+            # openings are added one at a time, so each pushed one is the last added
+            last_sent = 0.0
+            latencies = []
+            done = asyncio.Event()
+
+            async def listen(client: AsyncTripServiceClient):
+                async for openings in client.subscribe(TripSearchRequest(days_count=None)):
+                    latencies.extend([time.perf_counter() - last_sent] * len(openings))
+                    if len(latencies) >= inserts:
+                        done.set()
+                        return
+
+            async with AsyncTripServiceClient(ClientConfig(base_url=base_url)) as client, httpx.AsyncClient(
+                base_url=base_url + "/api/trip"
+            ) as http:
+                listener = asyncio.create_task(listen(client))
+                await asyncio.sleep(0.5)
+                search_times = []
+                for _ in range(inserts):
+                    last_sent = time.perf_counter()
+                    await http.get("/openings/add", params={"n": 1})
+                    started = time.perf_counter()
+                    await http.get("/openings/search", params={"limit": 10})
+                    search_times.append(time.perf_counter() - started)
+                    await asyncio.sleep(interval_ms / 1e3)
+                await asyncio.wait_for(done.wait(), 10)
+                listener.cancel()
+            return latencies, search_times
+
+        latencies, search_times = asyncio.run(run())
+
+    def ms(samples: list[float], q: int) -> float:
+        return statistics.quantiles(samples, n=100)[q - 1] * 1e3
+
+    print(f"{inserts} openings added one at a time")
+    print(f"push: add sent -> opening received p50 {ms(latencies, 50):.2f} ms, p95 {ms(latencies, 95):.2f} ms")
+    print(f"one poll (search request) p50 {ms(search_times, 50):.2f} ms, p95 {ms(search_times, 95):.2f} ms")
+
+
+if __name__ == "__main__":
+    cli_app()
@@ -0,0 +1,171 @@
+"""
+Booking throughput with the write-ahead log at each fsync policy, and replay speed.
+
+    python -m benchmarks.bench_wal booking --clients 1 --clients 16
+    python -m benchmarks.bench_wal replay --openings 1000000 --bookings 200000
+
+`booking` starts the webservice once per policy with TRIP_WAL_PATH on a fresh
+directory (and once without the log) and has client processes book distinct
+openings as fast as they can. Every confirmed booking has been made as
+durable as the policy promises before the response is sent, so `always` and
+`group` pay for fsyncs on the request path; the fsync count from
+`/admin/wal` shows how many bookings group commit folds into one.
+
+`replay` logs a seeded inventory, openings added in batches and single
+bookings with their reservations straight through `WriteAheadLog`, then times
+recovering a fresh store from the log alone and from a checkpoint plus the
+log written after it.
+"""
+
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Annotated
+
+import requests
+import typer
+
+from benchmarks.server import running_webservice
+
+
+cli_app = typer.Typer()
+
+POLICIES = ("off", "none", "interval", "group", "always")
+
+
+def _book(base_url: str, opening_ids: list[str]) -> list[float]:
+    session = requests.Session()
+    latencies = []
+    for opening_id in opening_ids:
+        body = {
+            "opening_id": opening_id,
+            "user": {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"},
+            "start_date": "2024-06-01",
+            "end_date": "2024-06-08",
+            "days_count": 7,
+            "people_count": 2,
+        }
+        started = time.perf_counter()
+        response = session.post(f"{base_url}/reservations/book", json=body).json()
+        latencies.append(time.perf_counter() - started)
+        assert response["status"] == "confirmed", response
+    return latencies
+
+
+@cli_app.command()
+def booking(
+    policies: Annotated[list[str], typer.Option(help="fsync policies; 'off' runs without the log")] = list(
+        POLICIES
+    ),
+    clients: Annotated[list[int], typer.Option(help="Concurrent booking client processes")] = [1, 16],
+    bookings: int = 2_000,
+    group_commit_ms: float = 0.0,
+    seed_size: int = 10_000,
+):
+    print(f"{os.cpu_count()} cpus, {bookings:,} bookings per run")
+    print(f"{'policy':<10}{'clients':>8}{'bookings/s':>12}{'p50 ms':>9}{'p99 ms':>9}{'fsyncs':>9}")
+    for client_ct in clients:
+        for policy in policies:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = {"OPENINGS_SEED_SIZE": str(seed_size)}
+                if policy != "off":
+                    env.update(
+                        TRIP_WAL_PATH=str(Path(tmp) / "wal"),
+                        TRIP_WAL_FSYNC=policy,
+                        TRIP_WAL_GROUP_COMMIT_MS=str(group_commit_ms),
+                    )
+                with running_webservice(1, **env) as server_url:
+                    base_url = f"{server_url}/api/trip"
+                    opening_ids = requests.get(f"{base_url}/openings/add", params={"n": bookings}).json()[
+                        "record_ids"
+                    ]
+                    shares = [opening_ids[i::client_ct] for i in range(client_ct)]
+                    with ProcessPoolExecutor(max_workers=client_ct) as pool:
+                        started = time.perf_counter()
+                        latencies = [t for result in pool.map(_book, [base_url] * client_ct, shares) for t in result]
+                        elapsed = time.perf_counter() - started
+                    stats = requests.get(f"{base_url}/admin/wal").json()
+
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(
+                f"{policy:<10}{client_ct:>8}{len(latencies) / elapsed:>12,.0f}"
+                f"{quantiles[49] * 1e3:>9.2f}{quantiles[98] * 1e3:>9.2f}{stats.get('fsyncs', '-'):>9}"
+            )
+
+
+@cli_app.command()
+def replay(
+    openings: int = 1_000_000,
+    added: int = 100_000,
+    bookings: int = 100_000,
+    seed: int = 11,
+):
+    from loguru import logger
+
+    from webservice.data_generator.generator_funcs import generate_vacation_columns
+    from webservice.schemas import TripReservation
+    from webservice.store import OpeningsStore
+    from webservice.wal import WriteAheadLog
+
+    logger.remove()
+    rng = random.Random(seed)
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        store, reservations = OpeningsStore(), dict()
+        wal = WriteAheadLog(tmp, fsync="none", compact_bytes=2**62)
+        wal.attach(store, reservations)
+
+        started = time.perf_counter()
+        store.add_columns(generate_vacation_columns(n=openings))
+        for _ in range(added // 100):
+            store.add_columns(generate_vacation_columns(n=100))
+        for opening_id in rng.sample(store.opening_ids, bookings):
+            with wal.booking():
+                opening = store.pop(opening_id)
+                reservation = TripReservation(
+                    trip_opening=opening,
+                    user="otani",
+                    home_country="Japan",
+                    phone_number="555",
+                    start_date=opening.start_date,
+                    end_date=opening.end_date,
+                    reservation_people_count=2,
+                )
+                reservations[reservation.reservation_id] = reservation
+                wal.log_reservation(reservation)
+        wal.close()
+        log_bytes = sum(file.stat().st_size for file in tmp.glob("segment-*.log"))
+        print(
+            f"logged {openings + added:,} openings and {bookings:,} bookings "
+            f"({log_bytes / 2**20:,.1f} MiB) in {time.perf_counter() - started:.2f}s"
+        )
+
+        def recover(label: str):
+            fresh, fresh_reservations = OpeningsStore(), dict()
+            started = time.perf_counter()
+            WriteAheadLog(tmp).recover(fresh, fresh_reservations)
+            elapsed = time.perf_counter() - started
+            assert len(fresh) == len(store) and len(fresh_reservations) == len(reservations)
+            print(f"{label:<28}{elapsed:>8.2f}s  {len(fresh):,} openings, {len(fresh_reservations):,} reservations")
+
+        recover("replay of the whole log")
+
+        wal = WriteAheadLog(tmp, fsync="none", compact_bytes=2**62)
+        wal.recover(OpeningsStore(), dict())
+        wal.attach(store, reservations)
+        wal.checkpoint()
+        for opening_id in rng.sample(store.opening_ids, bookings // 10):
+            store.pop(opening_id)
+        wal.close()
+        recover("checkpoint + 10% of log")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    cli_app()
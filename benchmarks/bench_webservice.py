@@ -0,0 +1,298 @@
+"""
+Load test of the trip webservice at several inventory sizes.
+
+    python -m benchmarks.bench_webservice run --sizes 3000 --sizes 100000 --sizes 1000000 \
+        --concurrency 1 --concurrency 16 --requests 2000
+    python -m benchmarks.bench_webservice compare old.json new.json
+
+Each inventory size is measured in a fresh interpreter seeded with
+OPENINGS_SEED_SIZE openings. Requests go through an in-process ASGI client
+(httpx over `ASGITransport`, no sockets) with the given number in flight, for
+each scenario:
+
+- search: `/openings/search` with a mix of filter shapes
+- countries: `/openings/countries`
+- book: `/reservations/book` of fresh openings
+- competitive_book: `/reservations/competitive_book` of fresh openings
+
+Throughput, latency percentiles, non-2xx answers and the process's peak RSS
+are printed and saved as JSON (by default under .benchmarks/, named after the
+commit) so `compare` can show the change between two commits. The search
+result cache is off unless --search-cache is given.
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+
+cli_app = typer.Typer()
+
+SCENARIOS = ("search", "countries", "book", "competitive_book")
+RESULTS_DIR = Path(".benchmarks")
+
+USER = {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"}
+
+
+def _peak_rss_mb() -> float:
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _random_search(rng: random.Random, countries: list[str]) -> dict:
+    """One of the filter shapes the agents send."""
+    shape = rng.randrange(6)
+    month = rng.randint(1, 12)
+    if shape == 0:
+        return {"country": rng.choice(countries)}
+    if shape == 1:
+        return {"country": rng.choice(countries), "start_date": f"2024-{month:02d}-01", "limit": 5}
+    if shape == 2:
+        return {"room_rate": rng.choice([150, 300, 600]), "days_count": rng.choice([3, 7, 14])}
+    if shape == 3:
+        return {
+            "start_date": f"2024-{month:02d}-01",
+            "end_date": f"2024-{month:02d}-28",
+            "limit": 50,
+        }
+    if shape == 4:
+        return {"country": rng.choice(countries), "room_rate": rng.choice([200, 400]), "limit": 20}
+    return {"limit": 10}
+
+
+def _booking(opening_id: str) -> dict:
+    return {
+        "opening_id": opening_id,
+        "user": USER,
+        "start_date": "2024-06-01",
+        "end_date": "2024-06-08",
+        "days_count": 7,
+        "people_count": 2,
+    }
+
+
+def _summarize(latencies: list[float], seconds: float, failures: int) -> dict:
+    latencies = sorted(latencies)
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "non_2xx": failures,
+        "seconds": round(seconds, 4),
+        "requests_per_sec": round(len(latencies) / seconds, 1),
+        "p50_ms": round(cuts[49], 3),
+        "p95_ms": round(cuts[94], 3),
+        "p99_ms": round(cuts[98], 3),
+        "max_ms": round(latencies[-1], 3),
+    }
+
+
+async def _drive(client, requests: list[tuple[str, str, dict]], concurrency: int) -> dict:
+    """Send (method, path, kwargs) requests with `concurrency` in flight."""
+    pending = iter(requests)
+    latencies = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        for method, path, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1e3)
+            failures += not response.is_success
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summarize(latencies, time.perf_counter() - started, failures)
+
+
+async def _measure_size(service, requests: int, concurrencies: list[int], seed: int) -> list[dict]:
+    import httpx
+
+    from webservice.data_generator.enums import Country
+
+    rng = random.Random(seed)
+    countries = [country.value for country in Country]
+    transport = httpx.ASGITransport(app=service.app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench/api/trip") as client:
+        for concurrency in concurrencies:
+            # bookings take openings out of the inventory, so book fresh ones
+            service.generate_openings(n=2 * requests)
+            fresh = iter(service.OPENINGS_DB.opening_ids[-2 * requests:])
+            plans = {
+                "search": [
+                    ("GET", "/openings/search", {"params": _random_search(rng, countries)})
+                    for _ in range(requests)
+                ],
+                "countries": [("GET", "/openings/countries", {})] * requests,
+                "book": [
+                    ("POST", "/reservations/book", {"json": _booking(next(fresh))})
+                    for _ in range(requests)
+                ],
+                "competitive_book": [
+                    ("POST", "/reservations/competitive_book", {"json": _booking(next(fresh))})
+                    for _ in range(requests)
+                ],
+            }
+            for scenario in SCENARIOS:
+                summary = await _drive(client, plans[scenario], concurrency)
+                results.append({"scenario": scenario, "concurrency": concurrency, **summary})
+    return results
+
+
+@cli_app.command(hidden=True)
+def measure(
+    size: int,
+    requests: int,
+    concurrency: Annotated[list[int], typer.Option()],
+    seed: int = 7,
+):
+    """Run every scenario against one inventory size; prints JSON (used by `run`)."""
+    from loguru import logger
+
+    logger.remove()
+    started = time.perf_counter()
+    import webservice.app as service
+
+    seed_seconds = time.perf_counter() - started
+    rss_after_seed = _peak_rss_mb()
+    results = asyncio.run(_measure_size(service, requests, concurrency, seed))
+    print(
+        json.dumps(
+            {
+                "size": size,
+                "seed_seconds": round(seed_seconds, 3),
+                "peak_rss_mb_after_seed": round(rss_after_seed, 1),
+                "peak_rss_mb": round(_peak_rss_mb(), 1),
+                "scenarios": results,
+            }
+        )
+    )
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_size(result: dict):
+    print(
+        f"\n{result['size']:,} openings: seeded in {result['seed_seconds']:.2f}s, "
+        f"peak RSS {result['peak_rss_mb_after_seed']:.0f} MB after seed, "
+        f"{result['peak_rss_mb']:.0f} MB at the end"
+    )
+    print(
+        f"{'scenario':<18}{'conc':>5}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'max ms':>9}{'non-2xx':>9}"
+    )
+    for row in result["scenarios"]:
+        print(
+            f"{row['scenario']:<18}{row['concurrency']:>5}{row['requests_per_sec']:>10,.0f}"
+            f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+            f"{row['max_ms']:>9.2f}{row['non_2xx']:>9}"
+        )
+
+
+@cli_app.command()
+def run(
+    sizes: Annotated[list[int], typer.Option(help="Inventory sizes")] = [3_000, 100_000, 1_000_000],
+    concurrency: Annotated[list[int], typer.Option(help="Requests in flight")] = [1, 16],
+    requests: Annotated[int, typer.Option(help="Requests per scenario and concurrency")] = 2_000,
+    search_cache: Annotated[bool, typer.Option(help="Keep the search result cache on")] = False,
+    output: Annotated[Path | None, typer.Option(help="JSON results file")] = None,
+    seed: int = 7,
+):
+    commit = _git_commit()
+    env = {
+        **os.environ,
+        "OPENINGS_SNAPSHOT_PATH": "",
+        "OPENINGS_SEED": str(seed),
+        "TRIP_STORAGE_BACKEND": "memory",
+    }
+    if not search_cache:
+        env["SEARCH_CACHE_SIZE"] = "0"
+
+    results = []
+    for size in sizes:
+        command = [
+            sys.executable, "-m", "benchmarks.bench_webservice", "measure",
+            str(size), str(requests), "--seed", str(seed),
+            *(arg for c in concurrency for arg in ("--concurrency", str(c))),
+        ]
+        child = subprocess.run(
+            command, env={**env, "OPENINGS_SEED_SIZE": str(size)},
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(child.stdout.splitlines()[-1]))
+        _print_size(results[-1])
+
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "requests": requests,
+            "concurrency": concurrency,
+            "search_cache": search_cache,
+            "seed": seed,
+        },
+        "results": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"webservice-{commit}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nresults saved to {output}")
+
+
+@cli_app.command()
+def compare(baseline: Path, candidate: Path):
+    """Throughput and p95 of CANDIDATE relative to BASELINE."""
+    before, after = (json.loads(path.read_text()) for path in (baseline, candidate))
+
+    def rows(report: dict) -> dict:
+        return {
+            (result["size"], row["scenario"], row["concurrency"]): row
+            for result in report["results"]
+            for row in result["scenarios"]
+        }
+
+    old, new = rows(before), rows(after)
+    print(f"{before['commit']} -> {after['commit']}")
+    print(f"{'size':>10} {'scenario':<18}{'conc':>5}{'req/s':>16}{'p95 ms':>18}")
+    for key in sorted(old.keys() & new.keys()):
+        size, scenario, concurrency = key
+        a, b = old[key], new[key]
+        throughput = b["requests_per_sec"] / a["requests_per_sec"] - 1
+        p95 = b["p95_ms"] / a["p95_ms"] - 1 if a["p95_ms"] else 0.0
+        print(
+            f"{size:>10,} {scenario:<18}{concurrency:>5}"
+            f"{b['requests_per_sec']:>9,.0f} {throughput:>+6.1%}"
+            f"{b['p95_ms']:>10.2f} {p95:>+6.1%}"
+        )
+    sizes = sorted({result["size"] for result in before["results"]} & {result["size"] for result in after["results"]})
+    peak = {report["commit"]: {r["size"]: r["peak_rss_mb"] for r in report["results"]} for report in (before, after)}
+    for size in sizes:
+        print(f"peak RSS at {size:,}: {peak[before['commit']][size]:.0f} -> {peak[after['commit']][size]:.0f} MB")
+
+
+if __name__ == "__main__":
+    cli_app()
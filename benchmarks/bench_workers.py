@@ -0,0 +1,104 @@
+"""
+Throughput of the webservice run with several worker processes over the shared
+inventory (TRIP_STORAGE_BACKEND=shared).
+
+    python -m benchmarks.bench_workers --workers 1 --workers 4 --clients 8
+
+For each worker count a fresh `uvicorn --workers N` is started on an empty
+shared directory. Client processes then hammer the search endpoint for a fixed
+time, and finally race to book the same openings, which must each be confirmed
+exactly once no matter which worker served the request. Throughput only scales
+with workers as far as the machine has cores.
+"""
+
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Annotated
+
+import requests
+import typer
+
+from benchmarks.server import running_webservice
+
+
+cli_app = typer.Typer()
+
+SEARCHES = [
+    {"country": "Japan", "limit": 10},
+    {"country": "India", "start_date": "2024-08-01", "limit": 5},
+    {"room_rate": 300, "days_count": 14, "limit": 20},
+    {"start_date": "2024-03-05", "end_date": "2024-04-01", "limit": 50},
+]
+
+
+def _search_load(base_url: str, seconds: float) -> int:
+    session = requests.Session()
+    done = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        session.get(f"{base_url}/openings/search", params=SEARCHES[done % len(SEARCHES)])
+        done += 1
+    return done
+
+
+def _book_all(base_url: str, opening_ids: list[str], seed: int) -> list[tuple[str, str]]:
+    session = requests.Session()
+    order = list(opening_ids)
+    random.Random(seed).shuffle(order)
+
+    outcomes = []
+    for opening_id in order:
+        body = {
+            "opening_id": opening_id,
+            "user": {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"},
+            "start_date": "2024-06-01",
+            "end_date": "2024-06-08",
+            "days_count": 7,
+            "people_count": 2,
+        }
+        response = session.post(f"{base_url}/reservations/book", json=body).json()
+        outcomes.append((opening_id, response["status"]))
+    return outcomes
+
+
+@cli_app.command()
+def run(
+    workers: Annotated[list[int], typer.Option(help="Worker process counts")] = [1, 2, 4],
+    clients: int = 8,
+    seconds: float = 5.0,
+    seed_size: int = 100_000,
+    hot_openings: int = 100,
+):
+    print(f"{os.cpu_count()} cpus")
+    print(f"{'workers':>8}{'searches':>10}{'searches/sec':>14}  bookings")
+    for worker_ct in workers:
+        with tempfile.TemporaryDirectory() as tmp, running_webservice(
+            worker_ct,
+            TRIP_STORAGE_BACKEND="shared",
+            TRIP_SHARED_PATH=str(Path(tmp) / "inventory"),
+            OPENINGS_SEED_SIZE=str(seed_size),
+        ) as server_url:
+            base_url = f"{server_url}/api/trip"
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                done = sum(pool.map(_search_load, [base_url] * clients, [seconds] * clients))
+
+                added = requests.get(f"{base_url}/openings/add", params={"n": hot_openings}).json()
+                hot_ids = added["record_ids"]
+                results = pool.map(
+                    _book_all, [base_url] * clients, [hot_ids] * clients, range(clients)
+                )
+                confirmed = [i for result in results for i, status in result if status == "confirmed"]
+
+        assert sorted(confirmed) == sorted(hot_ids), "an opening was booked zero or several times"
+        print(
+            f"{worker_ct:>8}{done:>10,}{done / seconds:>14,.0f}"
+            f"  ok: {len(hot_ids)} openings, one winner each"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
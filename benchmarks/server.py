@@ -0,0 +1,73 @@
+"""Run the webservice, in a subprocess or a thread, for benchmarks that talk HTTP to it."""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def running_webservice(workers: int = 1, **env):
+    """Start `uvicorn --workers N` on a free port; yields the base URL."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENINGS_SNAPSHOT_PATH": "",
+        "LOGURU_LEVEL": "WARNING",
+        **env,
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "webservice.app:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+    server = subprocess.Popen(command, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if requests.get(f"{base_url}/healthcheck", timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("webservice did not come up")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+@contextmanager
+def webservice_in_thread(app=None):
+    """Serve `app` (default: the webservice) from a thread of this process; yields the base URL."""
+    import uvicorn
+
+    if app is None:
+        from webservice.app import app
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=free_port(), log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 60
+        while not server.started:
+            if not thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("webservice did not come up")
+            time.sleep(0.05)
+        yield f"http://127.0.0.1:{server.config.port}"
+    finally:
+        server.should_exit = True
+        thread.join()
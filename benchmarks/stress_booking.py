@@ -0,0 +1,112 @@
+"""
+Concurrent booking stress test: many threads race to book the same openings.
+
+    python -m benchmarks.stress_booking --threads 1 --threads 8 --threads 32
+
+Every thread tries to book every opening in a shared "hot" set, in its own
+random order, through the same function the booking endpoint runs. The run
+fails if any opening is confirmed more than once, if a confirmed opening is
+still searchable, or if the store's counters drift from the reservations.
+"""
+
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from webservice import app as service
+from webservice.schemas import ResponseStatus, TripBookingRequest
+
+
+cli_app = typer.Typer()
+
+
+def _booking_request(opening_id: str) -> TripBookingRequest:
+    return TripBookingRequest(
+        opening_id=opening_id,
+        user=service.USERS_DB["otani"],
+        start_date="2024-06-01",
+        end_date="2024-06-08",
+        days_count=7,
+        people_count=2,
+    )
+
+
+def _race(hot_ids: list[str], threads: int, seed: int) -> tuple[dict, float]:
+    requests = {i: _booking_request(i) for i in hot_ids}
+
+    def worker(worker_id: int) -> list[tuple[str, ResponseStatus]]:
+        order = list(hot_ids)
+        random.Random(seed + worker_id).shuffle(order)
+        return [
+            (i, service.book_reservation(requests[i])["status"]) for i in order
+        ]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = [o for result in pool.map(worker, range(threads)) for o in result]
+    elapsed = time.perf_counter() - started
+
+    confirmed = dict()
+    for opening_id, status in outcomes:
+        if status == ResponseStatus.CONFIRMED:
+            confirmed[opening_id] = confirmed.get(opening_id, 0) + 1
+        else:
+            assert status == ResponseStatus.NOT_AVAILABLE, status
+    return confirmed, elapsed
+
+
+def _check_consistency(hot_ids: list[str], confirmed: dict, live_before: int):
+    double_booked = {i: ct for i, ct in confirmed.items() if ct > 1}
+    assert not double_booked, f"double bookings: {double_booked}"
+    assert set(confirmed) == set(hot_ids), "some hot openings were never booked"
+
+    booked_ids = [r.trip_opening.opening_id for r in service.RESERVATIONS_DB.values()]
+    assert len(booked_ids) == len(set(booked_ids)), "duplicate reservations"
+
+    store = service.OPENINGS_DB
+    assert len(store) == live_before - len(hot_ids) == int(store.alive.sum())
+    assert service.AGGREGATES.total == len(store)
+    assert not any(i in store for i in hot_ids)
+
+    searchable = service.SEARCH_PLANNER.matching_rows(service.SearchQuery())
+    assert not np.isin(searchable, [store.row_of(i) for i in hot_ids]).any()
+
+
+@cli_app.command()
+def run(
+    threads: Annotated[list[int], typer.Option(help="Thread counts to race with")] = [
+        1,
+        4,
+        16,
+        64,
+    ],
+    hot_openings: int = 500,
+    seed: int = 7,
+):
+    # switch threads far more often than the default to provoke interleavings
+    sys.setswitchinterval(1e-6)
+
+    print(f"{'threads':>8}{'attempts':>10}{'seconds':>10}{'attempts/sec':>14}  result")
+    for thread_ct in threads:
+        service.generate_openings(n=hot_openings)
+        store = service.OPENINGS_DB
+        live_before = len(store)
+        hot_ids = store.opening_ids[-hot_openings:]
+
+        confirmed, elapsed = _race(hot_ids, thread_ct, seed)
+        _check_consistency(hot_ids, confirmed, live_before)
+
+        attempts = thread_ct * hot_openings
+        print(
+            f"{thread_ct:>8}{attempts:>10,}{elapsed:>10.2f}{attempts / elapsed:>14,.0f}"
+            f"  ok: {len(confirmed)} openings, one winner each"
+        )
+
+
+if __name__ == "__main__":
+    cli_app()
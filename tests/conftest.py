@@ -0,0 +1,7 @@
+import os
+
+
+# webservice.app seeds its inventory on import: keep it in memory, unlogged and reproducible
+os.environ.update(TRIP_STORAGE_BACKEND="memory", OPENINGS_SEED="7", OPENINGS_SEED_SIZE="3000")
+for name in ("TRIP_WAL_PATH", "OPENINGS_SNAPSHOT_PATH"):
+    os.environ.pop(name, None)
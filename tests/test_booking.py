@@ -0,0 +1,117 @@
+"""
+Batch booking: an atomic group that cannot be booked in full leaves no trace.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from webservice import app as service
+from webservice.wal import BOOK, WriteAheadLog, decode_book, read_records
+
+
+SEARCH_URL = "/api/trip/openings/search"
+BATCH_URL = "/api/trip/reservations/book/batch"
+GROUP_SEARCH = {"country": "Japan", "limit": 4, "days_count": 3}
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    return TestClient(service.app)
+
+
+@pytest.fixture
+def wal(tmp_path, monkeypatch):
+    """Log the app's changes to a fresh write-ahead log for the duration of a test."""
+    wal = WriteAheadLog(tmp_path)
+    wal.attach(service.OPENINGS_DB, service.RESERVATIONS_DB)
+    monkeypatch.setattr(service, "WAL", wal)
+    yield wal
+    wal.close()
+    service.OPENINGS_DB._listeners.remove(wal)
+
+
+def _logged_bookings(wal: WriteAheadLog) -> list[tuple[list[str], list[bytes]]]:
+    (segment,) = wal.path.glob("segment-*.log")
+    records, _ = read_records(segment.read_bytes())
+    return [decode_book(payload) for kind, payload in records if kind == BOOK]
+
+
+def _booking(opening: dict) -> dict:
+    return {
+        "opening_id": opening["opening_id"],
+        "user": {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"},
+        "start_date": opening["start_date"],
+        "end_date": opening["end_date"],
+        "days_count": 3,
+        "people_count": 2,
+    }
+
+
+def _group(client: TestClient) -> list[dict]:
+    group = client.get(SEARCH_URL, params=GROUP_SEARCH).json()["results"]
+    assert len(group) == GROUP_SEARCH["limit"]
+    return group
+
+
+def test_atomic_group_with_a_booked_opening_books_nothing(client, wal):
+    group = _group(client)
+    taken = group[2]
+    assert client.post("/api/trip/reservations/book", json=_booking(taken)).json()["status"] == "confirmed"
+    reservations_before = dict(service.RESERVATIONS_DB)
+    logged_before = _logged_bookings(wal)
+
+    response = client.post(BATCH_URL, json={"bookings": [_booking(o) for o in group], "mode": "atomic"}).json()
+
+    assert response["status"] == "not-available"
+    assert [result["status"] for result in response["results"]] == ["not-available"] * len(group)
+    assert "no longer available" in response["results"][2]["msg"]
+    # nothing was claimed, reserved or logged
+    assert service.RESERVATIONS_DB == reservations_before
+    assert _logged_bookings(wal) == logged_before
+    others = [opening["opening_id"] for opening in group if opening is not taken]
+    assert all(opening_id in service.OPENINGS_DB for opening_id in others)
+    searchable = {opening["opening_id"] for opening in _group(client)}
+    assert set(others) <= searchable
+
+    # and the rest of the group can still be booked
+    rest = [_booking(opening) for opening in group if opening is not taken]
+    response = client.post(BATCH_URL, json={"bookings": rest, "mode": "atomic"}).json()
+    assert response["status"] == "confirmed"
+
+
+def test_atomic_group_is_logged_as_one_booking(client, wal):
+    group = _group(client)
+
+    response = client.post(BATCH_URL, json={"bookings": [_booking(o) for o in group], "mode": "atomic"}).json()
+
+    assert response["status"] == "confirmed"
+    assert all(opening["opening_id"] not in service.OPENINGS_DB for opening in group)
+    ((claimed, reservations),) = _logged_bookings(wal)
+    assert claimed == [opening["opening_id"] for opening in group]
+    assert len(reservations) == len(group)
+
+
+def test_atomic_group_repeating_an_opening_books_nothing(client, wal):
+    first, second = _group(client)[:2]
+    reservations_before = len(service.RESERVATIONS_DB)
+
+    bookings = [_booking(first), _booking(second), _booking(first)]
+    response = client.post(BATCH_URL, json={"bookings": bookings, "mode": "atomic"}).json()
+
+    assert response["status"] == "not-available"
+    assert "twice" in response["results"][2]["msg"]
+    assert first["opening_id"] in service.OPENINGS_DB and second["opening_id"] in service.OPENINGS_DB
+    assert len(service.RESERVATIONS_DB) == reservations_before
+    assert _logged_bookings(wal) == []
+
+
+def test_best_effort_group_books_what_is_available(client, wal):
+    group = _group(client)
+    taken = group[0]
+    client.post("/api/trip/reservations/book", json=_booking(taken))
+
+    response = client.post(BATCH_URL, json={"bookings": [_booking(o) for o in group]}).json()
+
+    assert response["status"] == "partial"
+    assert [result["status"] for result in response["results"]] == ["not-available"] + ["confirmed"] * 3
+    assert all(opening["opening_id"] not in service.OPENINGS_DB for opening in group)
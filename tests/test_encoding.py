@@ -0,0 +1,66 @@
+"""
+Search responses assembled from cached fragments must match the response model byte for byte.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from webservice import app as service
+from webservice.data_generator.generator_funcs import generate_vacation_columns
+from webservice.schemas import TripSearchResultsResponse
+
+
+SEARCHES = {
+    "unranked": dict(days_count=None),
+    "days_count": dict(),
+    "rate_filtered": dict(country=("Japan", "France"), rate=250.0, rank_by="rate"),
+    "dated": dict(start_date=datetime(2024, 6, 1), end_date=datetime(2024, 9, 1), rank_by="date_proximity"),
+    "covers": dict(start_date=datetime(2024, 7, 1, 12), date_match="covers", limit=50),
+    "empty": dict(rate=0.0),
+}
+
+
+def _search(country=None, start_date=None, end_date=None, rate=None, limit=20, days_count=3,
+            rank_by="days_count", cursor=None, date_match="within") -> service._SearchPage:
+    return service._ranked_search(
+        country, start_date, end_date, rate, limit, days_count, rank_by, cursor, date_match, None, None, None
+    )
+
+
+def _assert_matches_model(page: service._SearchPage):
+    body = service._encode_page(page)
+    expected = TripSearchResultsResponse(
+        results_count=len(page.rows),
+        search_params=page.search_params,
+        results=service.OPENINGS_DB.build_openings(page.rows, page.scores),
+        next_cursor=json.loads(body)["next_cursor"],
+    )
+    assert body == expected.model_dump_json().encode()
+
+
+@pytest.mark.parametrize("search", SEARCHES.values(), ids=SEARCHES.keys())
+def test_page_matches_response_model(search):
+    page = _search(**search)
+    _assert_matches_model(page)
+    # and again from the warm fragment cache
+    _assert_matches_model(page)
+
+
+def test_page_matches_response_model_after_claim():
+    page = _search()
+    _assert_matches_model(page)
+    assert service.OPENINGS_DB.claim(service.OPENINGS_DB.opening_ids[page.rows[0]]) is not None
+
+    after = _search()
+    assert page.rows[0] not in after.rows
+    _assert_matches_model(after)
+
+
+def test_page_matches_response_model_after_add_columns():
+    service.OPENINGS_DB.add_columns(generate_vacation_columns(n=500))
+
+    page = _search(limit=None)
+    assert page.rows.max() >= service.OPENINGS_DB.size - 500
+    _assert_matches_model(page)
@@ -0,0 +1,122 @@
+"""
+Keyset cursors: walking pages stays stable while the inventory changes underneath.
+"""
+
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from webservice import app as service
+
+
+SEARCH_URL = "/api/trip/openings/search"
+FILTERS = {"room_rate": 400.0, "days_count": 3}
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    return TestClient(service.app)
+
+
+def _book(client: TestClient, opening: dict) -> dict:
+    body = {
+        "opening_id": opening["opening_id"],
+        "user": {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"},
+        "start_date": opening["start_date"],
+        "end_date": opening["end_date"],
+        "days_count": 3,
+        "people_count": 2,
+    }
+    return client.post("/api/trip/reservations/book", json=body).json()
+
+
+def _walk(client: TestClient, params: dict, between_pages=lambda page: None) -> list[dict]:
+    results, cursor = [], None
+    while True:
+        page = client.get(SEARCH_URL, params={**params, "cursor": cursor} if cursor else params).json()
+        assert page["status"] == "found", page
+        results.extend(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return results
+        between_pages(page)
+
+
+def _ids(openings: list[dict]) -> list[str]:
+    return [opening["opening_id"] for opening in openings]
+
+
+@pytest.mark.parametrize("rank_by", ["days_count", "rate", "date_proximity"])
+def test_walk_while_openings_are_added_and_booked(client, rank_by):
+    params = {**FILTERS, "rank_by": rank_by, "start_date": "2024-01-01"}
+    before = client.get(SEARCH_URL, params={**params, "limit": 0}).json()["results"]
+    rng = random.Random(rank_by)
+    booked, added = set(), []
+
+    def change_inventory(page: dict):
+        added.extend(client.get("/api/trip/openings/add", params={"n": 20}).json()["record_ids"])
+        # one opening still ahead of the walk, and the page's last one, which the cursor points at
+        for opening in (rng.choice(before), page["results"][-1]):
+            if _book(client, opening)["status"] == "confirmed":
+                booked.add(opening["opening_id"])
+
+    walked = _walk(client, {**params, "limit": 40}, change_inventory)
+    walked_ids = _ids(walked)
+
+    assert len(walked_ids) == len(set(walked_ids))
+    # every opening that matched throughout the walk shows up exactly once
+    assert set(_ids(before)) - booked <= set(walked_ids)
+    assert set(walked_ids) <= set(_ids(before)) | set(added)
+    # pages continue each other in ranking order
+    scores = [opening["ranking_score"] for opening in walked]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_walk_without_changes_matches_one_page(client):
+    params = {**FILTERS, "country": ["Japan", "France"]}
+    everything = client.get(SEARCH_URL, params={**params, "limit": 0}).json()["results"]
+
+    assert _walk(client, {**params, "limit": 7}) == everything
+
+
+def test_stream_resumes_from_a_cursor(client):
+    first = client.get(SEARCH_URL, params={**FILTERS, "limit": 25}).json()
+    rest = client.get(SEARCH_URL, params={**FILTERS, "limit": 0, "cursor": first["next_cursor"]}).json()
+
+    streamed = client.get(
+        f"{SEARCH_URL}/stream", params={**FILTERS, "cursor": first["next_cursor"], "chunk_size": 16}
+    )
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    whole_stream = client.get(f"{SEARCH_URL}/stream", params=FILTERS).content.splitlines()
+    assert streamed.content.splitlines() == whole_stream[25:]
+    assert len(whole_stream[25:]) == rest["results_count"]
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        {"room_rate": 300.0},
+        {"days_count": 5},
+        {"rank_by": "rate"},
+        {"country": "Japan"},
+        {"date_match": "overlaps", "start_date": "2024-06-01"},
+    ],
+    ids=lambda changed: ",".join(changed),
+)
+def test_cursor_is_rejected_after_the_filters_change(client, changed):
+    cursor = client.get(SEARCH_URL, params={**FILTERS, "limit": 5}).json()["next_cursor"]
+    assert cursor is not None
+
+    response = client.get(SEARCH_URL, params={**FILTERS, **changed, "limit": 5, "cursor": cursor}).json()
+
+    assert response["status"] == "error"
+    assert response["results"] == []
+    assert response["search_params"] == {"cursor": cursor}
+
+
+def test_malformed_cursor_is_rejected(client):
+    response = client.get(SEARCH_URL, params={**FILTERS, "cursor": "not-a-cursor"}).json()
+
+    assert response["status"] == "error"
+    assert response["search_params"] == {"cursor": "not-a-cursor"}
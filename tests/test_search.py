@@ -0,0 +1,68 @@
+"""
+Searches running while openings are appended see columns of one length.
+"""
+
+import threading
+
+import numpy as np
+
+from webservice.data_generator.columns import COUNTRIES
+from webservice.data_generator.generator_funcs import generate_vacation_columns
+from webservice.search import QueryPlanner, SearchQuery
+from webservice.store import OpeningsStore
+
+
+# broad enough that the planner scans the whole table instead of using an index
+BROAD_QUERIES = [
+    SearchQuery.from_params(rate=900.0),
+    SearchQuery.from_params(rate=800.0, min_rate=20.0),
+    SearchQuery.from_params(country=[country.value for country in COUNTRIES[:20]], min_rate=50.0),
+]
+
+
+def _while_appending(store: OpeningsStore, search, rounds: int = 300) -> list[Exception]:
+    """Run `search()` `rounds` times while another thread keeps appending openings."""
+    errors = []
+    done = threading.Event()
+
+    def append():
+        while not done.is_set():
+            store.add_columns(generate_vacation_columns(n=7))
+
+    appender = threading.Thread(target=append)
+    appender.start()
+    try:
+        for _ in range(rounds):
+            try:
+                search()
+            except Exception as e:
+                errors.append(e)
+    finally:
+        done.set()
+        appender.join()
+    return errors
+
+
+def test_full_scan_while_appending():
+    store = OpeningsStore()
+    planner = QueryPlanner(store)
+    store.add_columns(generate_vacation_columns(n=2000))
+
+    def search():
+        for query in BROAD_QUERIES:
+            rows = planner.matching_rows(query)
+            assert np.array_equal(rows, np.flatnonzero(query.mask(store))[: len(rows)])
+
+    assert _while_appending(store, search) == []
+
+
+def test_batch_scan_while_appending():
+    store = OpeningsStore()
+    planner = QueryPlanner(store)
+    store.add_columns(generate_vacation_columns(n=2000))
+
+    def search():
+        for query, rows in zip(BROAD_QUERIES, planner.matching_rows_batch(BROAD_QUERIES)):
+            assert np.array_equal(rows, np.flatnonzero(query.mask(store))[: len(rows)])
+
+    assert _while_appending(store, search) == []
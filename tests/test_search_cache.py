@@ -0,0 +1,81 @@
+"""
+The search cache never serves an opening booked, or misses one added, after a page was cached.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from webservice import app as service
+
+
+SEARCH_URL = "/api/trip/openings/search"
+PAGE = {"country": "France", "limit": 5, "days_count": 4}
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    return TestClient(service.app)
+
+
+def _stats(client: TestClient) -> dict:
+    return client.get("/api/trip/admin/search_cache").json()
+
+
+def _warm(client: TestClient, params: dict) -> list[dict]:
+    """Search twice; the second answer must come from the cache."""
+    first = client.get(SEARCH_URL, params=params).json()
+    hits = _stats(client)["hits"]
+    assert client.get(SEARCH_URL, params=params).json() == first
+    assert _stats(client)["hits"] == hits + 1
+    return first["results"]
+
+
+def _book(client: TestClient, opening: dict) -> dict:
+    body = {
+        "opening_id": opening["opening_id"],
+        "user": {"username": "otani", "home_country": "Japan", "phone_number": "555", "email": "o@x.io"},
+        "start_date": opening["start_date"],
+        "end_date": opening["end_date"],
+        "days_count": 4,
+        "people_count": 2,
+    }
+    return client.post("/api/trip/reservations/book", json=body).json()
+
+
+def test_booked_opening_is_dropped_from_a_cached_page(client):
+    booked = _warm(client, PAGE)[1]
+    assert _book(client, booked)["status"] == "confirmed"
+    invalidations = _stats(client)["invalidations"]
+
+    results = client.get(SEARCH_URL, params=PAGE).json()["results"]
+
+    assert booked["opening_id"] not in {opening["opening_id"] for opening in results}
+    assert len(results) == PAGE["limit"]
+    assert _stats(client)["invalidations"] == invalidations + 1
+
+
+def test_cached_page_is_checked_against_bookings_not_yet_synced(client):
+    """A booking made by another worker reaches `alive` before it bumps this worker's generation."""
+    booked = _warm(client, PAGE)[0]
+    generation = service.OPENINGS_DB.generation
+    assert _book(client, booked)["status"] == "confirmed"
+    booked_generation, service.OPENINGS_DB.generation = service.OPENINGS_DB.generation, generation
+    try:
+        results = client.get(SEARCH_URL, params=PAGE).json()["results"]
+    finally:
+        service.OPENINGS_DB.generation = booked_generation
+
+    assert booked["opening_id"] not in {opening["opening_id"] for opening in results}
+
+
+def test_added_openings_invalidate_cached_pages(client):
+    everything = {"limit": 0, "days_count": 4}
+    before = _warm(client, everything)
+    invalidations = _stats(client)["invalidations"]
+
+    added = client.get("/api/trip/openings/add", params={"n": 25}).json()["record_ids"]
+    results = client.get(SEARCH_URL, params=everything).json()["results"]
+
+    assert len(results) == len(before) + len(added)
+    assert set(added) <= {opening["opening_id"] for opening in results}
+    assert _stats(client)["invalidations"] == invalidations + 1
@@ -0,0 +1,137 @@
+"""
+Snapshots saved while bookings are made hold every opening exactly once: live or reserved.
+"""
+
+import threading
+
+import pytest
+
+from webservice.data_generator.generator_funcs import generate_vacation_columns
+from webservice.schemas import TripReservation
+from webservice.shared import SharedOpeningsStore
+from webservice.snapshot import load_snapshot, save_snapshot, snapshot_exists, write_snapshot
+from webservice.store import OpeningsStore
+
+
+@pytest.fixture(params=["memory", "shared"])
+def store(request, tmp_path) -> OpeningsStore:
+    store = OpeningsStore() if request.param == "memory" else SharedOpeningsStore(tmp_path / "shared")
+    store.add_columns(generate_vacation_columns(n=600))
+    return store
+
+
+def _book(store: OpeningsStore, reservations: dict, opening_id: str):
+    with store.booking():
+        opening = store.pop(opening_id)
+        reservation = TripReservation(
+            trip_opening=opening,
+            user="otani",
+            home_country="Japan",
+            phone_number="555",
+            start_date=opening.start_date,
+            end_date=opening.end_date,
+            reservation_people_count=2,
+        )
+        reservations[reservation.reservation_id] = reservation
+
+
+def test_snapshot_during_bookings_is_consistent(store, tmp_path):
+    opening_ids = list(store.opening_ids)
+    reservations = dict()
+
+    def book(share: list[str]):
+        for opening_id in share:
+            _book(store, reservations, opening_id)
+
+    bookers = [threading.Thread(target=book, args=(opening_ids[i::4],)) for i in range(4)]
+    for booker in bookers:
+        booker.start()
+
+    path = tmp_path / "snapshot"
+    saves = 0
+    while saves < 3 or any(booker.is_alive() for booker in bookers):
+        with store.snapshot_lock():
+            save_snapshot(store, reservations, path)
+        saves += 1
+
+        columns, saved_reservations = load_snapshot(path)
+        live = set(columns.opening_ids)
+        reserved = {reservation.trip_opening.opening_id for reservation in saved_reservations.values()}
+        assert not live & reserved
+        assert live | reserved == set(opening_ids)
+
+    for booker in bookers:
+        booker.join()
+    assert len(store) == 0 and len(reservations) == len(opening_ids)
+
+
+def test_snapshot_lock_waits_for_bookings(store):
+    opening_id = store.opening_ids[0]
+    in_booking, release = threading.Event(), threading.Event()
+    saved = threading.Event()
+
+    def slow_booking():
+        with store.booking():
+            store.claim(opening_id)
+            in_booking.set()
+            release.wait()
+
+    def save():
+        with store.snapshot_lock():
+            saved.set()
+
+    booker = threading.Thread(target=slow_booking)
+    booker.start()
+    in_booking.wait()
+    saver = threading.Thread(target=save)
+    saver.start()
+
+    assert not saved.wait(0.2)
+    release.set()
+    assert saved.wait(5)
+    booker.join()
+    saver.join()
+
+
+def _saved_ids(path) -> set[str]:
+    return set(load_snapshot(path)[0].opening_ids)
+
+
+def test_save_switches_the_link_to_a_complete_version(store, tmp_path):
+    path = tmp_path / "inventory"
+    save_snapshot(store, dict(), path)
+    first = path.resolve()
+    store.claim(store.opening_ids[0])
+    save_snapshot(store, dict(), path)
+
+    assert path.is_symlink() and path.resolve() != first
+    # only the current version is kept
+    assert [version.name for version in tmp_path.glob("inventory.v*")] == [path.resolve().name]
+    assert _saved_ids(path) == set(store.opening_ids[1:])
+
+
+def test_crash_mid_save_leaves_the_previous_snapshot(store, tmp_path):
+    path = tmp_path / "inventory"
+    save_snapshot(store, dict(), path)
+    # a save that died halfway through writing its version
+    torn = tmp_path / "inventory.v1"
+    torn.mkdir()
+    (torn / "start_ord.npy").write_bytes(b"\x93NUMPY")
+
+    assert snapshot_exists(path)
+    assert _saved_ids(path) == set(store.opening_ids)
+
+    save_snapshot(store, dict(), path)
+    assert not torn.exists()
+
+
+def test_unversioned_snapshot_is_replaced(store, tmp_path):
+    path = tmp_path / "inventory"
+    write_snapshot(store, dict(), path)
+    store.claim(store.opening_ids[0])
+
+    save_snapshot(store, dict(), path)
+
+    assert path.is_symlink()
+    assert [version.name for version in tmp_path.glob("inventory.v*")] == [path.resolve().name]
+    assert _saved_ids(path) == set(store.opening_ids[1:])
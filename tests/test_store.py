@@ -0,0 +1,128 @@
+"""
+Concurrent claims: however many callers race for an opening, exactly one wins.
+"""
+
+import multiprocessing
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from webservice.data_generator.generator_funcs import generate_vacation_columns
+from webservice.shared import SharedOpeningsStore
+from webservice.store import OpeningsStore
+
+
+THREADS = 16
+
+
+def _race(threads: int, work):
+    """Run `work(thread_index)` on `threads` threads started together; return their results."""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(i: int):
+        barrier.wait()
+        results[i] = work(i)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def _claim_each(store: OpeningsStore, opening_ids: list[str], seed: int) -> list[str]:
+    opening_ids = list(opening_ids)
+    random.Random(seed).shuffle(opening_ids)
+    return [opening_id for opening_id in opening_ids if store.claim(opening_id) is not None]
+
+
+@pytest.fixture(params=["memory", "shared"])
+def store(request, tmp_path) -> OpeningsStore:
+    store = OpeningsStore() if request.param == "memory" else SharedOpeningsStore(tmp_path, capacity=4096)
+    store.add_columns(generate_vacation_columns(n=500))
+    return store
+
+
+def test_claim_has_one_winner_per_opening(store):
+    opening_ids = list(store.opening_ids)
+
+    won = _race(THREADS, lambda i: _claim_each(store, opening_ids, seed=i))
+
+    assert Counter(opening_id for ids in won for opening_id in ids) == Counter(opening_ids)
+    assert len(store) == 0
+    assert not store.alive.any()
+    assert store.claim(opening_ids[0]) is None
+
+
+def test_claim_all_is_all_or_nothing(store):
+    opening_ids = list(store.opening_ids)
+
+    def claim_batches(i: int) -> list[list[str]]:
+        rng = random.Random(i)
+        won = []
+        for _ in range(200):
+            batch = rng.sample(opening_ids, rng.randint(1, 5))
+            if store.claim_all(batch) is not None:
+                won.append(batch)
+        return won
+
+    batches = [batch for won in _race(THREADS, claim_batches) for batch in won]
+
+    claimed = Counter(opening_id for batch in batches for opening_id in batch)
+    assert max(claimed.values()) == 1
+    # every opening of a winning batch is gone, every other one is still there
+    assert {opening_id for opening_id in opening_ids if opening_id not in store} == set(claimed)
+    assert len(store) == len(opening_ids) - len(claimed)
+
+
+def test_claim_and_claim_all_race_on_the_same_openings(store):
+    opening_ids = list(store.opening_ids)
+    pairs = [opening_ids[i : i + 2] for i in range(0, len(opening_ids), 2)]
+
+    def work(i: int) -> list[str]:
+        if i % 2:
+            return _claim_each(store, opening_ids, seed=i)
+        return [opening_id for pair in pairs if store.claim_all(pair) is not None for opening_id in pair]
+
+    won = _race(THREADS, work)
+
+    assert Counter(opening_id for ids in won for opening_id in ids) == Counter(opening_ids)
+    assert len(store) == 0
+
+
+def test_claim_all_rejects_repeated_and_unknown_openings(store):
+    opening_id, other_id = store.opening_ids[:2]
+
+    assert store.claim_all([]) == []
+    assert store.claim_all([opening_id, opening_id]) is None
+    assert store.claim_all([opening_id, "no-such-opening"]) is None
+    assert opening_id in store
+
+    assert store.claim(other_id) is not None
+    assert store.claim_all([opening_id, other_id]) is None
+    assert opening_id in store
+
+
+def _claim_in_process(path: str, seed: int) -> list[str]:
+    store = SharedOpeningsStore(path)
+    return _claim_each(store, store.opening_ids, seed)
+
+
+def test_shared_claims_have_one_winner_across_processes(tmp_path):
+    store = SharedOpeningsStore(tmp_path, capacity=4096)
+    store.add_columns(generate_vacation_columns(n=500))
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=4, mp_context=context) as pool:
+        won = list(pool.map(_claim_in_process, [str(tmp_path)] * 4, range(4)))
+
+    assert Counter(opening_id for ids in won for opening_id in ids) == Counter(store.opening_ids)
+    store.sync()
+    assert len(store) == 0
+    assert np.count_nonzero(store.alive) == 0
@@ -0,0 +1,281 @@
+"""
+Write-ahead log recovery: unclean stops, checkpoints, torn tails and repeated replays.
+"""
+
+import json
+import random
+import shutil
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from webservice.data_generator.generator_funcs import generate_vacation_columns
+from webservice.schemas import TripReservation
+from webservice.snapshot import DATA_COLUMNS, write_snapshot
+from webservice.store import OpeningsStore
+from webservice.wal import (
+    CHECKPOINT_FILE,
+    FSYNC_POLICIES,
+    WriteAheadLog,
+    WriteAheadLogClosed,
+    read_records,
+    replay,
+)
+
+
+def _book(wal: WriteAheadLog, store: OpeningsStore, reservations: dict, opening_id: str) -> TripReservation:
+    with wal.booking():
+        opening = store.pop(opening_id)
+        reservation = TripReservation(
+            trip_opening=opening,
+            user="otani",
+            home_country="Japan",
+            phone_number="555",
+            start_date=opening.start_date,
+            end_date=opening.end_date,
+            reservation_people_count=2,
+        )
+        reservations[reservation.reservation_id] = reservation
+        wal.log_reservation(reservation)
+    return reservation
+
+
+def _fill(wal: WriteAheadLog, store: OpeningsStore, reservations: dict, seed: int, bookings: int = 30):
+    rng = random.Random(seed)
+    store.add_columns(generate_vacation_columns(n=200))
+    for _ in range(5):
+        store.add_columns(generate_vacation_columns(n=10))
+    for opening_id in rng.sample([i for i in store.opening_ids if i in store], bookings):
+        _book(wal, store, reservations, opening_id)
+    wal.commit()
+
+
+def _state(store: OpeningsStore, reservations: dict) -> tuple:
+    """Live openings with their values, in row order, and the reservation ids."""
+    # snapshots only keep live rows, so booked rows are not compared
+    rows = store.live_rows()
+    openings = [store.opening_ids[row] for row in rows]
+    values = [getattr(store, name)[rows].tolist() for name in DATA_COLUMNS]
+    return openings, values, sorted(reservations)
+
+
+def _recovered(path, **kwargs) -> tuple[WriteAheadLog, OpeningsStore, dict]:
+    wal = WriteAheadLog(path, **kwargs)
+    store, reservations = OpeningsStore(), dict()
+    wal.recover(store, reservations)
+    return wal, store, reservations
+
+
+def _logged(path, fsync: str = "group") -> tuple[WriteAheadLog, OpeningsStore, dict]:
+    wal = WriteAheadLog(path, fsync=fsync)
+    store, reservations = OpeningsStore(), dict()
+    wal.attach(store, reservations)
+    return wal, store, reservations
+
+
+@pytest.mark.parametrize("fsync", FSYNC_POLICIES)
+def test_replay_after_unclean_stop(tmp_path, fsync):
+    wal, store, reservations = _logged(tmp_path, fsync)
+    _fill(wal, store, reservations, seed=1)
+    committed = _state(store, reservations)
+    # the process dies without close() and before this booking is committed
+    _book(wal, store, reservations, [i for i in store.opening_ids if i in store][0])
+    booked = _state(store, reservations)
+
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    # stop the abandoned log's background sync
+    wal._closed.set()
+
+    state = _state(recovered, recovered_reservations)
+    if fsync == "always":
+        assert state == booked
+    elif fsync == "interval":
+        # the background sync may or may not have written the booking out, but never half of it
+        assert state in (committed, booked)
+    else:
+        assert state == committed
+    for reservation_id, reservation in recovered_reservations.items():
+        assert reservation == reservations[reservation_id]
+        assert reservation.trip_opening.opening_id not in recovered
+
+
+def test_recovered_log_keeps_appending(tmp_path):
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=2)
+    wal.close()
+
+    wal, store, reservations = _recovered(tmp_path)
+    wal.attach(store, reservations)
+    _fill(wal, store, reservations, seed=3)
+    wal.close()
+
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    assert _state(recovered, recovered_reservations) == _state(store, reservations)
+
+
+def test_replay_from_checkpoint_and_tail(tmp_path):
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=4)
+    checkpoint = wal.checkpoint()
+    _fill(wal, store, reservations, seed=5)
+    wal.close()
+
+    assert json.loads((tmp_path / CHECKPOINT_FILE).read_text()) == checkpoint
+    assert [file.name for file in tmp_path.glob("snapshot-*")] == [checkpoint["snapshot"]]
+    # segments before the checkpoint are gone, the tail is replayed on top of the snapshot
+    assert [file.name for file in sorted(tmp_path.glob("segment-*.log"))] == [
+        f"segment-{checkpoint['segment']:08d}.log"
+    ]
+
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    assert _state(recovered, recovered_reservations) == _state(store, reservations)
+
+
+def test_second_checkpoint_replaces_the_first(tmp_path):
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=6)
+    first = wal.checkpoint()
+    _fill(wal, store, reservations, seed=7)
+    second = wal.checkpoint()
+    wal.close()
+
+    assert second["segment"] > first["segment"]
+    assert [file.name for file in tmp_path.glob("snapshot-*")] == [second["snapshot"]]
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    assert _state(recovered, recovered_reservations) == _state(store, reservations)
+
+
+def _corrupt_last_record(segment, how: str):
+    data = bytearray(segment.read_bytes())
+    if how == "torn":
+        del data[-7:]
+    else:
+        data[-1] ^= 0xFF
+    segment.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("how", ["torn", "crc"])
+def test_bad_final_record_is_truncated(tmp_path, how):
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=8)
+    before_last = _state(store, reservations)
+    (segment,) = tmp_path.glob("segment-*.log")
+    intact = segment.stat().st_size
+    last = _book(wal, store, reservations, [i for i in store.opening_ids if i in store][0])
+    wal.close()
+
+    assert len(read_records(segment.read_bytes())[0]) > 1
+    _corrupt_last_record(segment, how)
+
+    wal, recovered, recovered_reservations = _recovered(tmp_path)
+
+    # the whole last booking is dropped: neither its claim nor its reservation survives
+    assert _state(recovered, recovered_reservations) == before_last
+    assert last.trip_opening.opening_id in recovered
+    assert segment.stat().st_size == intact
+
+    # the log continues cleanly after the cut
+    wal.attach(recovered, recovered_reservations)
+    _book(wal, recovered, recovered_reservations, last.trip_opening.opening_id)
+    wal.close()
+    _, again, again_reservations = _recovered(tmp_path)
+    assert _state(again, again_reservations) == _state(recovered, recovered_reservations)
+
+
+def test_replay_is_idempotent(tmp_path):
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=9)
+    wal.close()
+    expected = _state(store, reservations)
+
+    wal, recovered, recovered_reservations = _recovered(tmp_path)
+    assert wal.recover(recovered, recovered_reservations)
+    assert _state(recovered, recovered_reservations) == expected
+
+    (segment,) = tmp_path.glob("segment-*.log")
+    data = segment.read_bytes()
+    replay(data, recovered, recovered_reservations)
+    assert _state(recovered, recovered_reservations) == expected
+    assert np.array_equal(recovered.alive, store.alive)
+    assert len(recovered.opening_ids) == len(store.opening_ids)
+
+
+def test_snapshot_overlapping_the_tail_is_replayed_once(tmp_path):
+    """Changes already in the checkpoint snapshot are not applied again from the tail segment."""
+    wal, store, reservations = _logged(tmp_path)
+    _fill(wal, store, reservations, seed=10)
+    checkpoint = wal.checkpoint()
+    _fill(wal, store, reservations, seed=11)
+    wal.close()
+
+    # as if the snapshot had been taken after the tail was logged, which compaction allows
+    shutil.rmtree(tmp_path / checkpoint["snapshot"])
+    write_snapshot(store, reservations, tmp_path / checkpoint["snapshot"])
+
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    assert _state(recovered, recovered_reservations) == _state(store, reservations)
+    assert len(set(recovered.opening_ids)) == len(recovered.opening_ids)
+
+
+def test_empty_log_holds_no_state(tmp_path):
+    wal = WriteAheadLog(tmp_path)
+    assert not wal.recover(OpeningsStore(), dict())
+
+
+@pytest.mark.parametrize("fsync", FSYNC_POLICIES)
+def test_booking_after_close_is_refused(tmp_path, fsync):
+    wal, store, reservations = _logged(tmp_path, fsync)
+    _fill(wal, store, reservations, seed=12)
+    committed = _state(store, reservations)
+    wal.close()
+
+    late = _book(wal, store, reservations, [i for i in store.opening_ids if i in store][0])
+    with pytest.raises(WriteAheadLogClosed):
+        wal.commit()
+    with pytest.raises(WriteAheadLogClosed):
+        wal.checkpoint()
+    wal.close()
+
+    _, recovered, recovered_reservations = _recovered(tmp_path)
+    assert _state(recovered, recovered_reservations) == committed
+    assert late.trip_opening.opening_id in recovered
+
+
+@pytest.mark.parametrize("fsync", FSYNC_POLICIES)
+def test_close_while_bookings_are_in_flight(tmp_path, fsync):
+    wal = WriteAheadLog(tmp_path, fsync=fsync, sync_interval_ms=0.1)
+    store, reservations = OpeningsStore(), dict()
+    wal.attach(store, reservations)
+    store.add_columns(generate_vacation_columns(n=2000))
+    wal.commit()
+    opening_ids = list(store.opening_ids)
+    confirmed, errors = [[] for _ in range(4)], []
+
+    def book(share: list[str], confirmed: list[str]):
+        for opening_id in share:
+            _book(wal, store, reservations, opening_id)
+            try:
+                wal.commit()
+            except WriteAheadLogClosed:
+                continue
+            except Exception as e:
+                errors.append(e)
+            confirmed.append(opening_id)
+
+    bookers = [
+        threading.Thread(target=book, args=(opening_ids[i::4], confirmed[i])) for i in range(4)
+    ]
+    for booker in bookers:
+        booker.start()
+    while not any(confirmed):
+        time.sleep(0.001)
+    wal.close()
+    for booker in bookers:
+        booker.join()
+
+    assert errors == []
+    # every booking confirmed to its client survives
+    _, recovered, _ = _recovered(tmp_path)
+    assert not any(opening_id in recovered for share in confirmed for opening_id in share)
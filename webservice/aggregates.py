@@ -0,0 +1,98 @@
+"""
+Inventory aggregates maintained incrementally from store events.
+
+Every insert and booking adjusts a handful of counters, so reading the
+breakdowns costs the same no matter how many openings are stored. Day rates
+are summarized per country with a fixed-width histogram sketch, from which
+min/max/percentiles are read (exact for whole-number rates below
+`RATE_SKETCH_BUCKETS`, which is all the generator produces).
+"""
+
+import numpy as np
+
+from webservice.store import (
+    COUNTRIES,
+    HOTEL_COMPANIES,
+    LODGING_CLASSES,
+    OpeningsStore,
+)
+
+
+RATE_SKETCH_BUCKETS = 4096
+RATE_SKETCH_WIDTH = 1.0
+RATE_PERCENTILES = (50, 90, 99)
+
+
+class InventoryAggregates:
+    def __init__(self, store: OpeningsStore):
+        self.country_counts = np.zeros(len(COUNTRIES), dtype=np.int64)
+        self.lodging_class_counts = np.zeros(len(LODGING_CLASSES), dtype=np.int64)
+        self.hotel_company_counts = np.zeros(len(HOTEL_COMPANIES), dtype=np.int64)
+        self.rate_sums = np.zeros(len(COUNTRIES), dtype=np.float64)
+        self.rate_sketch = np.zeros((len(COUNTRIES), RATE_SKETCH_BUCKETS), dtype=np.int64)
+
+        self.on_insert(store, store.live_rows())
+        store.add_listener(self)
+
+    @staticmethod
+    def _rate_buckets(rates: np.ndarray) -> np.ndarray:
+        buckets = (rates // RATE_SKETCH_WIDTH).astype(np.int64)
+        return np.clip(buckets, 0, RATE_SKETCH_BUCKETS - 1)
+
+    def _apply(self, store: OpeningsStore, rows: np.ndarray, sign: int):
+        countries = store.country[rows]
+        rates = store.day_rate[rows]
+        np.add.at(self.country_counts, countries, sign)
+        np.add.at(self.lodging_class_counts, store.lodging_class[rows], sign)
+        np.add.at(self.hotel_company_counts, store.hotel_company[rows], sign)
+        np.add.at(self.rate_sums, countries, sign * rates)
+        np.add.at(self.rate_sketch, (countries, self._rate_buckets(rates)), sign)
+
+    def on_insert(self, store: OpeningsStore, rows: np.ndarray):
+        self._apply(store, rows, 1)
+
+    def on_remove(self, store: OpeningsStore, row: int):
+        self._apply(store, np.array([row]), -1)
+
+    @property
+    def total(self) -> int:
+        return int(self.country_counts.sum())
+
+    def country_count_map(self) -> dict:
+        return {c: int(ct) for c, ct in zip(COUNTRIES, self.country_counts) if ct}
+
+    def lodging_class_count_map(self) -> dict:
+        return {
+            lc: int(ct) for lc, ct in zip(LODGING_CLASSES, self.lodging_class_counts) if ct
+        }
+
+    def hotel_company_count_map(self) -> dict:
+        return {
+            hc: int(ct) for hc, ct in zip(HOTEL_COMPANIES, self.hotel_company_counts) if ct
+        }
+
+    def rate_stats(self) -> dict:
+        """Per-country count/min/max/mean and percentiles of the day rate."""
+        stats = dict()
+        for code, country in enumerate(COUNTRIES):
+            count = int(self.country_counts[code])
+            if count == 0:
+                continue
+
+            sketch = self.rate_sketch[code]
+            filled = np.flatnonzero(sketch)
+            cumulative = np.cumsum(sketch)
+            percentiles = {
+                f"p{p}": float(
+                    np.searchsorted(cumulative, np.ceil(count * p / 100)) * RATE_SKETCH_WIDTH
+                )
+                for p in RATE_PERCENTILES
+            }
+            stats[country] = {
+                "count": count,
+                "min": float(filled[0] * RATE_SKETCH_WIDTH),
+                "max": float(filled[-1] * RATE_SKETCH_WIDTH),
+                "mean": round(float(self.rate_sums[code]) / count, 2),
+                **percentiles,
+            }
+        return stats
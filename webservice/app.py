@@ -10,35 +10,139 @@ The agent will be responsible for searching for openings.
 The agent will be responsible for checking the availability of a reservation.
 """
 
-from collections import defaultdict
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
 from datetime import date, datetime
 from loguru import logger
-from fastapi import Query, APIRouter
+from fastapi import Depends, Query, APIRouter
 from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic_core import to_json
+from starlette.concurrency import run_in_threadpool
 import numpy as np
 
 import uvicorn
 from webservice.schemas import (
+    BookingMode,
+    DateMatch,
     ResponseStatus,
+    TripBatchBookingRequest,
+    TripBatchBookingResponse,
     TripBookingRequest,
+    TripSearchBatchResponse,
+    TripSearchRequest,
     TripSearchResultsResponse,
     ExistingTripReservationsResponse,
+    TripOpening,
     TripBookingResponse,
     CountryCountsResponse,
-    TripOpening,
+    InventoryBreakdownResponse,
     TripReservation,
     WebsiteUserProfile,
 )
-from webservice.data_generator.enums import Country
+from webservice.data_generator.enums import Country, HotelCompany, LodgingClass
 from webservice.data_generator.generator_funcs import (
-    generate_vacation_openings,
+    generate_vacation_columns,
+)
+from webservice.aggregates import InventoryAggregates
+from webservice.cache import SearchResultCache
+from webservice.encoding import (
+    OpeningFragments,
+    encode_batch_response,
+    encode_search_response,
+    encode_sse_event,
+)
+from webservice.metrics import REGISTRY, SEARCH_STAGE_SECONDS, MetricsMiddleware
+from webservice.pagination import (
+    SearchCursor,
+    decode_cursor,
+    encode_cursor,
+    query_fingerprint,
+)
+from webservice.ranking import DEFAULT_RANKING, RANKING_FUNCTIONS, score_rows, select_page
+from webservice.search import QueryPlanner, SearchQuery
+from webservice.shared import SharedOpeningsStore, SharedReservationLog
+from webservice.snapshot import restore_snapshot, save_snapshot, snapshot_exists
+from webservice.store import OpeningsStore
+from webservice.subscriptions import SubscriptionRegistry
+from webservice.wal import WriteAheadLog
+
+
+# the simulated competition draws from per-thread generators, since sync
+# endpoints run concurrently in the threadpool and RandomState is not thread-safe
+_COMPETITION_SEEDS = np.random.SeedSequence(1337)
+_COMPETITION_SEEDS_LOCK = threading.Lock()
+_COMPETITION_RANDOM = threading.local()
+
+# inventory seeding and snapshots, configured through the environment
+OPENINGS_SEED_SIZE = int(os.getenv("OPENINGS_SEED_SIZE", "3000"))
+OPENINGS_SEED = os.getenv("OPENINGS_SEED")
+SNAPSHOT_PATH = os.getenv("OPENINGS_SNAPSHOT_PATH")
+SNAPSHOT_ON_SHUTDOWN = os.getenv("OPENINGS_SNAPSHOT_ON_SHUTDOWN", "true").lower() == "true"
+
+# "memory" keeps the inventory private to this process; "shared" maps it from
+# TRIP_SHARED_PATH so several `uvicorn --workers` processes serve the same state
+STORAGE_BACKEND = os.getenv("TRIP_STORAGE_BACKEND", "memory")
+SHARED_PATH = os.getenv("TRIP_SHARED_PATH", "/tmp/trip-inventory")
+SHARED_CAPACITY = int(os.getenv("TRIP_SHARED_CAPACITY", "1000000"))
+
+# identical searches within the TTL are served from memory; size 0 disables
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+
+# subscription streams: how often to pick up other workers' openings while
+# idle, and to send a keepalive comment through proxies
+SUBSCRIPTION_SYNC_SECONDS = float(os.getenv("SUBSCRIPTION_SYNC_SECONDS", "1"))
+SUBSCRIPTION_KEEPALIVE_SECONDS = float(os.getenv("SUBSCRIPTION_KEEPALIVE_SECONDS", "15"))
+
+# write-ahead log of inventory changes and reservations (memory backend only):
+# TRIP_WAL_PATH enables it; TRIP_WAL_FSYNC is always, group, interval or none
+WAL_PATH = os.getenv("TRIP_WAL_PATH")
+WAL_FSYNC = os.getenv("TRIP_WAL_FSYNC", "group")
+WAL_GROUP_COMMIT_MS = float(os.getenv("TRIP_WAL_GROUP_COMMIT_MS", "0"))
+WAL_SYNC_INTERVAL_MS = float(os.getenv("TRIP_WAL_SYNC_INTERVAL_MS", "10"))
+WAL_COMPACT_MB = float(os.getenv("TRIP_WAL_COMPACT_MB", "64"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if WAL is not None:
+        WAL.close()
+    if SNAPSHOT_PATH and SNAPSHOT_ON_SHUTDOWN:
+        _save_snapshot()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+def sync_shared_state():
+    """Pick up openings, bookings and reservations made by other workers."""
+    OPENINGS_DB.sync()
+    if RESERVATION_LOG is not None:
+        RESERVATION_LOG.sync(RESERVATIONS_DB)
+
+
+def _save_snapshot() -> dict:
+    # with a shared inventory every worker saves at shutdown: one at a time,
+    # each after catching up, so the last snapshot written holds every change
+    with OPENINGS_DB.snapshot_lock():
+        sync_shared_state()
+        return save_snapshot(OPENINGS_DB, RESERVATIONS_DB, SNAPSHOT_PATH)
+
+
+# a private store has nothing to catch up on: skip the dependency and the
+# threadpool hop it costs every request
+router = APIRouter(
+    prefix="/api/trip",
+    dependencies=[Depends(sync_shared_state)] if STORAGE_BACKEND == "shared" else [],
 )
-
-
-NP_RANDOM = np.random.RandomState(1337)
-
-app = FastAPI()
-router = APIRouter(prefix="/api/trip")
 
 USERS_DB = {
     "otani": WebsiteUserProfile(
@@ -55,13 +159,103 @@ USERS_DB = {
     ),
 }
 
-OPENINGS_DB = dict()
+if STORAGE_BACKEND == "shared":
+    OPENINGS_DB = SharedOpeningsStore(SHARED_PATH, capacity=SHARED_CAPACITY)
+    RESERVATION_LOG = SharedReservationLog(SHARED_PATH)
+else:
+    OPENINGS_DB = OpeningsStore()
+    RESERVATION_LOG = None
+SEARCH_PLANNER = QueryPlanner(OPENINGS_DB)
+AGGREGATES = InventoryAggregates(OPENINGS_DB)
+SUBSCRIPTIONS = SubscriptionRegistry(OPENINGS_DB)
+FRAGMENTS = OpeningFragments(OPENINGS_DB)
+SEARCH_CACHE = SearchResultCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
 
 # user_id -> reservation_id -> TripReservation
 RESERVATIONS_DB: dict[str, TripReservation] = dict()
 
+if WAL_PATH and STORAGE_BACKEND == "shared":
+    logger.warning("TRIP_WAL_PATH is ignored with the shared backend, which keeps its state in TRIP_SHARED_PATH")
+    WAL = None
+elif WAL_PATH:
+    WAL = WriteAheadLog(
+        WAL_PATH,
+        fsync=WAL_FSYNC,
+        group_commit_ms=WAL_GROUP_COMMIT_MS,
+        sync_interval_ms=WAL_SYNC_INTERVAL_MS,
+        compact_bytes=int(WAL_COMPACT_MB * 2**20),
+    )
+else:
+    WAL = None
+
 # kick off
-OPENINGS_DB.update({row.opening_id: row for row in generate_vacation_openings(n=3000)})
+_startup_began = time.perf_counter()
+_recovered = False
+with OPENINGS_DB.seeding() as _needs_seed:
+    if not _needs_seed:
+        # another worker created (and seeded) the shared inventory
+        sync_shared_state()
+    elif WAL is not None and WAL.recover(OPENINGS_DB, RESERVATIONS_DB):
+        # the log carries on from the last run, past its last snapshot
+        _recovered = True
+    elif SNAPSHOT_PATH and snapshot_exists(SNAPSHOT_PATH):
+        restore_snapshot(OPENINGS_DB, RESERVATIONS_DB, SNAPSHOT_PATH)
+        if RESERVATION_LOG is not None:
+            for reservation in RESERVATIONS_DB.values():
+                RESERVATION_LOG.append(reservation)
+    else:
+        seed_state = None if OPENINGS_SEED is None else np.random.RandomState(int(OPENINGS_SEED))
+        OPENINGS_DB.add_columns(
+            generate_vacation_columns(n=OPENINGS_SEED_SIZE, random_state=seed_state)
+        )
+if WAL is not None:
+    WAL.attach(OPENINGS_DB, RESERVATIONS_DB)
+    if not _recovered:
+        # the starting inventory goes into the first checkpoint, not the log
+        WAL.checkpoint()
+logger.info(
+    f"Inventory ready with {len(OPENINGS_DB):,} openings "
+    f"in {time.perf_counter() - _startup_began:.3f}s"
+)
+
+# read at scrape time, so keeping them costs nothing per request
+REGISTRY.gauge("trip_openings_available", "Openings that can still be booked.", lambda: len(OPENINGS_DB))
+REGISTRY.gauge(
+    "trip_reservations",
+    "Reservations made, this worker's view in shared mode after a sync.",
+    lambda: len(RESERVATIONS_DB),
+)
+REGISTRY.gauge(
+    "trip_inventory_generation", "Inventory changes (inserts and bookings) so far.", lambda: OPENINGS_DB.generation
+)
+REGISTRY.gauge("trip_search_cache_entries", "Cached search results.", lambda: len(SEARCH_CACHE))
+REGISTRY.gauge("trip_subscriptions", "Open opening subscriptions.", lambda: len(SUBSCRIPTIONS))
+REGISTRY.counter(
+    "trip_subscription_matches_total",
+    "New openings queued for subscribers, counted once per subscriber.",
+    lambda: SUBSCRIPTIONS.delivered,
+)
+REGISTRY.counter(
+    "trip_subscription_dropped_total",
+    "New openings dropped because a subscriber's queue was full.",
+    lambda: SUBSCRIPTIONS.dropped,
+)
+if WAL is not None:
+    REGISTRY.counter("trip_wal_fsyncs_total", "Write-ahead log fsyncs.", lambda: WAL.fsyncs)
+    REGISTRY.counter("trip_wal_commits_total", "Requests waiting on the write-ahead log.", lambda: WAL.commits)
+REGISTRY.counter(
+    "trip_search_cache_lookups_total",
+    "Search result cache lookups by outcome.",
+    lambda: {("hit",): SEARCH_CACHE.hits, ("miss",): SEARCH_CACHE.misses},
+    ("outcome",),
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Request latency, search stage timings and inventory gauges, Prometheus text format."""
+    sync_shared_state()
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/healthcheck")
@@ -76,88 +270,469 @@ def get_count():
 
 @router.get("/openings/countries", response_model=CountryCountsResponse)
 def get_countries_count():
-    country_counts = defaultdict(int)
-    for opening in OPENINGS_DB.values():
-        country_counts[opening.country] += 1
+    return {
+        "status": ResponseStatus.FOUND,
+        "country_counts": AGGREGATES.country_count_map(),
+        "total_openings": len(OPENINGS_DB),
+    }
+
 
+@router.get("/openings/breakdown", response_model=InventoryBreakdownResponse)
+def get_inventory_breakdown():
     return {
         "status": ResponseStatus.FOUND,
-        "country_counts": dict(country_counts),
         "total_openings": len(OPENINGS_DB),
+        "country_counts": AGGREGATES.country_count_map(),
+        "lodging_class_counts": AGGREGATES.lodging_class_count_map(),
+        "hotel_company_counts": AGGREGATES.hotel_company_count_map(),
+        "rate_stats": AGGREGATES.rate_stats(),
     }
 
 
 @router.get("/openings/add")
 def generate_openings(n: int = 10):
-    new_rows = [row for row in generate_vacation_openings(n=n)]
-    OPENINGS_DB.update({n.vid: n for n in new_rows})
+    new_rows = generate_vacation_columns(n=n)
+    OPENINGS_DB.add_columns(new_rows)
+    _commit_log()
 
     new_ct = len(OPENINGS_DB)
     return {
         "msg": f"{len(new_rows):,} rows added",
         "updated_rows_ct": new_ct,
-        "record_ids": [n.vid for n in new_rows],
+        "record_ids": new_rows.opening_ids,
     }
 
 
-@router.get("/openings/search", response_model=TripSearchResultsResponse)
-def search_openings(
-    country: str | None = Query(None),
-    start_date: datetime | None = Query(None),
-    end_date: datetime | None = Query(None),
-    room_rate: float | None = Query(None),
-    limit: int | None = Query(10),
-    days_count: int | None = Query(2),
-):
-    rows: list[TripOpening] = [r for r in OPENINGS_DB.values()]
-    rate = room_rate
+class _SearchRejected(Exception):
+    """Raised while preparing a search that cannot be answered."""
+
+    def __init__(self, search_params: dict, status=ResponseStatus.NOT_AVAILABLE):
+        super().__init__(search_params)
+        self.response = {
+            "results_count": 0,
+            "search_params": search_params,
+            "results": [],
+            "status": status,
+        }
+
 
+# page size of a search that does not give a limit
+SEARCH_DEFAULT_LIMIT = 10
+
+
+@dataclass
+class _PreparedSearch:
+    search_params: dict
+    query: SearchQuery
+    fingerprint: str
+    # (score, row) of the last result already seen, from the cursor
+    after: tuple[float | None, int] | None
+    limit: int | None
+    days_count: int | None
+    rank_by: str
+
+
+@dataclass
+class _SearchPage:
+    search_params: dict
+    fingerprint: str
+    rows: np.ndarray
+    scores: np.ndarray | None
+    eligible: int
+
+
+def _enum_values(values) -> tuple[str, ...] | None:
+    """A single or multi-valued enum filter as a hashable tuple (None when unset)."""
+    if values is None or isinstance(values, str):
+        return values if values is None else (values,)
+    return tuple(dict.fromkeys(values)) or None
+
+
+def _echo(values: tuple[str, ...]) -> str | list[str]:
+    # a single value is echoed as given by clients that only send one
+    return values[0] if len(values) == 1 else list(values)
+
+
+def _prepare_search(
+    country: tuple[str, ...] | None,
+    start_date: datetime | None,
+    end_date: datetime | None,
+    rate: float | None,
+    limit: int | None,
+    days_count: int | None,
+    rank_by: str,
+    cursor: str | None,
+    date_match: str = DateMatch.WITHIN,
+    lodging_class: tuple[str, ...] | None = None,
+    hotel_company: tuple[str, ...] | None = None,
+    min_rate: float | None = None,
+) -> _PreparedSearch:
     search_params = dict()
-    if country is not None:
-        if country not in Country._value2member_map_:
-            return {
-                "results_count": 0,
-                "search_params": {"country": country},
-                "results": [],
-                "status": ResponseStatus.NOT_AVAILABLE,
-            }
+    enum_filters = (
+        ("country", country, Country),
+        ("lodging_class", lodging_class, LodgingClass),
+        ("hotel_company", hotel_company, HotelCompany),
+    )
+    for name, values, enum in enum_filters:
+        if values is not None:
+            if any(value not in enum._value2member_map_ for value in values):
+                raise _SearchRejected({name: _echo(values)})
+
+            search_params[name] = _echo(values)
 
-        search_params["country"] = country
-        rows = [r for r in rows if r.country == country]
+    if rank_by not in RANKING_FUNCTIONS:
+        raise _SearchRejected({"rank_by": rank_by})
+
+    if date_match not in DateMatch._value2member_map_:
+        raise _SearchRejected({"date_match": date_match})
 
     if start_date is not None:
         search_params["start_date"] = start_date
-        rows = [r for r in rows if r.start_date >= start_date]
 
     if end_date is not None:
         search_params["end_date"] = end_date
-        rows = [r for r in rows if r.end_date <= end_date]
+
+    if min_rate is not None:
+        search_params["min_rate"] = min_rate
 
     if rate is not None:
         search_params["rate"] = rate
-        rows = [r for r in rows if r.day_rate <= rate]
 
     if days_count is not None:
         search_params["days_count"] = days_count
-        scores_and_results = []
-        for row in rows:
-            score = abs(row.days_count - days_count) / max(days_count, row.days_count)
-            row.ranking_score = round(score, 5)
 
-        rows = sorted(rows, key=lambda x: x.ranking_score or -1, reverse=True)
+    if rank_by != DEFAULT_RANKING:
+        search_params["rank_by"] = rank_by
+
+    if date_match != DateMatch.WITHIN:
+        search_params["date_match"] = date_match
+
+    query = SearchQuery.from_params(
+        country, start_date, end_date, rate, date_match, lodging_class, hotel_company, min_rate
+    )
+    fingerprint = query_fingerprint(query, days_count, rank_by)
+
+    after = None
+    if cursor is not None:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            raise _SearchRejected({"cursor": cursor}, status=ResponseStatus.ERROR)
+
+        after_row = OPENINGS_DB.row_of(position.opening_id)
+        if position.fingerprint != fingerprint or after_row is None:
+            raise _SearchRejected({"cursor": cursor}, status=ResponseStatus.ERROR)
+        after = (position.score, after_row)
+
+    return _PreparedSearch(
+        search_params, query, fingerprint, after, limit, days_count, rank_by
+    )
+
+
+def _rank_matches(prepared: _PreparedSearch, matched: np.ndarray) -> _SearchPage:
+    with SEARCH_STAGE_SECONDS.time("rank"):
+        scores = score_rows(OPENINGS_DB, matched, prepared.query, prepared.rank_by, prepared.days_count)
+    with SEARCH_STAGE_SECONDS.time("slice"):
+        rows, scores, eligible = select_page(matched, scores, prepared.limit, prepared.after)
+    return _SearchPage(prepared.search_params, prepared.fingerprint, rows, scores, eligible)
+
+
+def _ranked_search(*search_args) -> _SearchPage:
+    """Prepare, match and rank one search; takes `_prepare_search`'s arguments."""
+    with SEARCH_STAGE_SECONDS.time("prepare"):
+        prepared = _prepare_search(*search_args)
+    with SEARCH_STAGE_SECONDS.time("filter"):
+        matched = SEARCH_PLANNER.matching_rows(prepared.query)
+    return _rank_matches(prepared, matched)
+
+
+def _encode_page(page: _SearchPage) -> bytes:
+    with SEARCH_STAGE_SECONDS.time("serialize"):
+        # the openings were validated on the way into the store: serve their
+        # cached JSON instead of rebuilding and re-serializing the models
+        openings = FRAGMENTS.encode_openings(page.rows, page.scores)
+
+        next_cursor = None
+        if openings and page.eligible > len(openings):
+            last_score = None if page.scores is None else float(page.scores[-1])
+            last_id = OPENINGS_DB.opening_ids[page.rows[-1]]
+            next_cursor = encode_cursor(SearchCursor(last_score, last_id, page.fingerprint))
 
-    if limit:
-        rows = rows[:limit]
+        logger.debug(f"Found {len(openings)} results")
+        return encode_search_response(page.search_params, openings, next_cursor)
 
-    results_ct = len(rows)
-    logger.debug(f"Found {results_ct} results")
+
+@router.get("/openings/search", response_model=TripSearchResultsResponse)
+def search_openings(
+    country: list[str] | None = Query(None),
+    start_date: datetime | None = Query(None),
+    end_date: datetime | None = Query(None),
+    room_rate: float | None = Query(None),
+    limit: int | None = Query(SEARCH_DEFAULT_LIMIT),
+    days_count: int | None = Query(2),
+    rank_by: str = Query(DEFAULT_RANKING),
+    cursor: str | None = Query(None),
+    date_match: str = Query(DateMatch.WITHIN),
+    lodging_class: list[str] | None = Query(None),
+    hotel_company: list[str] | None = Query(None),
+    min_room_rate: float | None = Query(None),
+):
+    """
+    Search openings, best matches first.
+
+    `date_match` says how openings relate to the `start_date` / `end_date`
+    window: `within` it (the default), `covers` the whole stay or `overlaps`
+    it by at least a day.
+
+    `country`, `lodging_class` and `hotel_company` may be repeated to accept
+    any of several values; `min_room_rate` and `room_rate` bound the day rate.
+
+    When more matches remain after this page, `next_cursor` is set; pass it
+    back as `cursor` (with the same filters) to fetch the next page.
+    """
+    # the parsed parameters double as the cache key
+    search_args = (
+        _enum_values(country), start_date, end_date, room_rate, limit, days_count, rank_by,
+        cursor, date_match, _enum_values(lodging_class), _enum_values(hotel_company),
+        min_room_rate,
+    )
+    # read before searching: a result that races with an inventory change is
+    # then stored under the older generation and never served as current
+    generation = OPENINGS_DB.generation
+    cached = SEARCH_CACHE.get(search_args, generation, is_valid=_all_rows_alive)
+    if cached is not None:
+        return Response(cached[1], media_type="application/json")
+
+    try:
+        page = _ranked_search(*search_args)
+    except _SearchRejected as e:
+        return e.response
+
+    body = _encode_page(page)
+    SEARCH_CACHE.put(search_args, generation, (page.rows, body))
+    return Response(body, media_type="application/json")
+
+
+@router.post("/openings/search/batch", response_model=TripSearchBatchResponse)
+def batch_search_openings(searches: list[TripSearchRequest]):
+    """
+    Run many searches in one call; results come back in request order.
+
+    Each search is answered exactly like `GET /openings/search` with the same
+    filters (`rate` is the room rate cap; no `limit` means the usual page
+    size). Searches not already cached are matched together, sharing filter
+    masks and a single pass over the inventory.
+    """
+    generation = OPENINGS_DB.generation
+    bodies: list[bytes | None] = [None] * len(searches)
+    pending = []
+    for i, search in enumerate(searches):
+        search_args = (
+            _enum_values(search.country),
+            search.start_date,
+            search.end_date,
+            None if search.rate is None else float(search.rate),
+            SEARCH_DEFAULT_LIMIT if search.limit is None else search.limit,
+            search.days_count,
+            DEFAULT_RANKING,
+            None,
+            search.date_match.value,
+            _enum_values(search.lodging_class),
+            _enum_values(search.hotel_company),
+            None if search.min_rate is None else float(search.min_rate),
+        )
+        cached = SEARCH_CACHE.get(search_args, generation, is_valid=_all_rows_alive)
+        if cached is not None:
+            bodies[i] = cached[1]
+            continue
+
+        try:
+            with SEARCH_STAGE_SECONDS.time("prepare"):
+                pending.append((i, search_args, _prepare_search(*search_args)))
+        except _SearchRejected as e:
+            rejected = TripSearchResultsResponse.model_validate(e.response)
+            bodies[i] = rejected.model_dump_json().encode()
+
+    with SEARCH_STAGE_SECONDS.time("filter"):
+        matched = SEARCH_PLANNER.matching_rows_batch([prepared.query for _, _, prepared in pending])
+    for (i, search_args, prepared), rows in zip(pending, matched):
+        page = _rank_matches(prepared, rows)
+        bodies[i] = _encode_page(page)
+        SEARCH_CACHE.put(search_args, generation, (page.rows, bodies[i]))
+
+    return Response(encode_batch_response(bodies), media_type="application/json")
+
+
+def _all_rows_alive(cached: tuple[np.ndarray, bytes]) -> bool:
+    # bookings made by other workers only bump our generation at the next
+    # sync, but the shared `alive` column is always current
+    return bool(OPENINGS_DB.alive[cached[0]].all())
+
+
+@router.get("/openings/search/stream")
+def stream_search_openings(
+    country: list[str] | None = Query(None),
+    start_date: datetime | None = Query(None),
+    end_date: datetime | None = Query(None),
+    room_rate: float | None = Query(None),
+    limit: int | None = Query(None),
+    days_count: int | None = Query(2),
+    rank_by: str = Query(DEFAULT_RANKING),
+    cursor: str | None = Query(None),
+    date_match: str = Query(DateMatch.WITHIN),
+    lodging_class: list[str] | None = Query(None),
+    hotel_company: list[str] | None = Query(None),
+    min_room_rate: float | None = Query(None),
+    chunk_size: int = Query(500, gt=0),
+):
+    """
+    Stream every match (or the first `limit`) as newline-delimited JSON
+    `TripOpening` objects, best matches first.
+
+    Only the ranked row numbers are held in memory; openings are built and
+    encoded `chunk_size` at a time, and rows booked mid-stream are skipped.
+    """
+    try:
+        page = _ranked_search(
+            _enum_values(country), start_date, end_date, room_rate, limit, days_count, rank_by,
+            cursor, date_match, _enum_values(lodging_class), _enum_values(hotel_company),
+            min_room_rate,
+        )
+    except _SearchRejected as e:
+        return JSONResponse(jsonable_encoder(e.response))
+
+    def ndjson_chunks():
+        for lo in range(0, len(page.rows), chunk_size):
+            rows = page.rows[lo : lo + chunk_size]
+            scores = None if page.scores is None else page.scores[lo : lo + chunk_size]
+
+            alive = OPENINGS_DB.alive[rows]
+            rows = rows[alive]
+            scores = None if scores is None else scores[alive]
+            yield b"".join(
+                opening + b"\n" for opening in FRAGMENTS.encode_openings(rows, scores)
+            )
+
+    return StreamingResponse(ndjson_chunks(), media_type="application/x-ndjson")
+
+
+@router.post("/openings/subscribe")
+async def subscribe_openings(search: TripSearchRequest):
+    """
+    Push new openings matching a standing search, as Server-Sent Events.
+
+    The stream opens with a `subscribed` event echoing the search, then sends
+    an `openings` event (a JSON list of `TripOpening`) whenever openings added
+    from now on match it. Only new openings are checked; run a search for the
+    existing ones. A `lagged` event reports matches dropped because the
+    client fell behind. With a `limit`, the stream ends with a `done` event
+    after that many openings.
+    """
+    try:
+        prepared = _prepare_search(
+            _enum_values(search.country),
+            search.start_date,
+            search.end_date,
+            None if search.rate is None else float(search.rate),
+            search.limit,
+            search.days_count,
+            DEFAULT_RANKING,
+            None,
+            search.date_match.value,
+            _enum_values(search.lodging_class),
+            _enum_values(search.hotel_company),
+            None if search.min_rate is None else float(search.min_rate),
+        )
+    except _SearchRejected as e:
+        return JSONResponse(jsonable_encoder(e.response))
+
+    # registered before the response starts, so no opening added meanwhile is missed
+    subscription = SUBSCRIPTIONS.subscribe(prepared.query)
+    limit = search.limit
+
+    async def events():
+        next_rows = None
+        try:
+            yield encode_sse_event(
+                "subscribed",
+                to_json(
+                    {
+                        "subscription_id": subscription.subscription_id,
+                        "search_params": prepared.search_params,
+                    }
+                ),
+            )
+            sent = 0
+            idle_seconds = 0.0
+            while limit is None or sent < limit:
+                # one get() is kept across timeouts: cancelling it, as wait_for
+                # does, can lose a batch dequeued just as the timeout fires
+                if next_rows is None:
+                    next_rows = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait({next_rows}, timeout=SUBSCRIPTION_SYNC_SECONDS)
+                if not done:
+                    if STORAGE_BACKEND == "shared":
+                        await run_in_threadpool(OPENINGS_DB.sync)
+                    idle_seconds += SUBSCRIPTION_SYNC_SECONDS
+                    if idle_seconds >= SUBSCRIPTION_KEEPALIVE_SECONDS:
+                        idle_seconds = 0.0
+                        yield b": keepalive\n\n"
+                    continue
+
+                rows, next_rows = next_rows.result(), None
+                idle_seconds = 0.0
+                if subscription.lagged:
+                    yield encode_sse_event("lagged", to_json({"dropped": subscription.lagged}))
+                    subscription.lagged = 0
+
+                # skip openings booked since they were matched
+                rows = rows[OPENINGS_DB.alive[rows]]
+                if limit is not None:
+                    rows = rows[: limit - sent]
+                if len(rows):
+                    openings = FRAGMENTS.encode_openings(rows)
+                    yield encode_sse_event("openings", b"[" + b",".join(openings) + b"]")
+                    sent += len(rows)
+            yield encode_sse_event("done", to_json({"results_count": sent}))
+        finally:
+            if next_rows is not None:
+                next_rows.cancel()
+            SUBSCRIPTIONS.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.post("/admin/snapshot")
+def dump_snapshot():
+    """Write the inventory and reservations to the configured snapshot path."""
+    if not SNAPSHOT_PATH:
+        return {
+            "msg": "OPENINGS_SNAPSHOT_PATH is not configured",
+            "status": ResponseStatus.ERROR,
+        }
+
+    manifest = _save_snapshot()
     return {
-        "results_count": results_ct,
-        "search_params": search_params,
-        "results": rows,
+        "msg": f"snapshot written to {SNAPSHOT_PATH}",
+        "status": ResponseStatus.CONFIRMED,
+        **manifest,
     }
 
 
+@router.get("/admin/wal")
+def get_wal_stats():
+    """Write-ahead log segment and fsync counters, for choosing TRIP_WAL_FSYNC."""
+    if WAL is None:
+        return {"msg": "TRIP_WAL_PATH is not configured", "status": ResponseStatus.NOT_FOUND}
+    return {"status": ResponseStatus.FOUND, **WAL.stats()}
+
+
+@router.get("/admin/search_cache")
+def get_search_cache_stats():
+    """Search result cache counters, for sizing SEARCH_CACHE_SIZE / SEARCH_CACHE_TTL."""
+    return {"status": ResponseStatus.FOUND, **SEARCH_CACHE.stats()}
+
+
 @router.get("/reservations", response_model=ExistingTripReservationsResponse)
 def get_reservations_list(user: str):
     reservations_index = RESERVATIONS_DB.get(user)
@@ -167,29 +742,142 @@ def get_reservations_list(user: str):
     return {"status": ResponseStatus.FOUND, "reservations": reservations_index}
 
 
-def _pop_opening_and_book_reservation(request: TripBookingRequest):
-    opening = OPENINGS_DB.pop(request.opening_id)
-    if not opening:
+def _competition_roll() -> float:
+    rng = getattr(_COMPETITION_RANDOM, "rng", None)
+    if rng is None:
+        with _COMPETITION_SEEDS_LOCK:
+            (seed,) = _COMPETITION_SEEDS.spawn(1)
+        rng = _COMPETITION_RANDOM.rng = np.random.default_rng(seed)
+    return rng.random()
+
+
+def _booking_failure(opening_id: str) -> dict:
+    if OPENINGS_DB.row_of(opening_id) is not None:
         return {
-            "msg": "could not find reservation: {}".format(request.opening_id),
-            "status": ResponseStatus.NOT_FOUND,
+            "msg": "opening is no longer available",
+            "status": ResponseStatus.NOT_AVAILABLE,
         }
+    return {
+        "msg": "could not find reservation: {}".format(opening_id),
+        "status": ResponseStatus.NOT_FOUND,
+    }
 
+
+def _lost_to_competition() -> dict:
+    return {
+        "msg": "opening is no longer available",
+        "status": ResponseStatus.NOT_AVAILABLE,
+    }
+
+
+def _make_reservation(request: TripBookingRequest, opening: TripOpening) -> TripReservation:
     new_booking = {
-        "vacation_opening": opening.model_dump(),
-        "user": request.user,
+        "trip_opening": opening,
+        "user": request.user.username,
         "home_country": request.user.home_country,
         "phone_number": request.user.phone_number,
         "start_date": request.start_date,
         "end_date": request.end_date,
         "reservation_people_count": request.people_count,
     }
+    return TripReservation.model_validate(new_booking)
+
 
-    ressy = TripReservation.model_validate(new_booking)
+def _record_reservation(ressy: TripReservation) -> dict:
     RESERVATIONS_DB[ressy.reservation_id] = ressy
+    if RESERVATION_LOG is not None:
+        RESERVATION_LOG.append(ressy)
+    if WAL is not None:
+        WAL.log_reservation(ressy)
     return {"msg": "booking made", "status": ResponseStatus.CONFIRMED, "details": ressy}
 
 
+def _commit_log():
+    """Wait until this request's changes are in the write-ahead log, before confirming them."""
+    if WAL is not None:
+        WAL.commit()
+
+
+@contextmanager
+def _logged_booking():
+    """
+    Log the openings claimed and reservations made inside as one write-ahead
+    log record, and wait for it before the booking is confirmed.
+
+    Snapshots wait for the block to finish, so they never save an opening
+    that is claimed but not yet reserved.
+    """
+    if WAL is None:
+        with OPENINGS_DB.booking():
+            yield
+        return
+    with OPENINGS_DB.booking(), WAL.booking():
+        yield
+    WAL.commit()
+
+
+def _pop_opening_and_book_reservation(request: TripBookingRequest):
+    # the claim is atomic: of many concurrent bookings for one opening,
+    # exactly one gets it back and everyone else sees NOT_AVAILABLE
+    opening = OPENINGS_DB.pop(request.opening_id, None)
+    if not opening:
+        return _booking_failure(request.opening_id)
+
+    return _record_reservation(_make_reservation(request, opening))
+
+
+def _book_all_or_nothing(bookings: list[TripBookingRequest], lost: list[bool]) -> dict:
+    opening_ids = [booking.opening_id for booking in bookings]
+
+    failures = dict()
+    seen = set()
+    for i, (opening_id, lost_item) in enumerate(zip(opening_ids, lost)):
+        if lost_item:
+            failures[i] = _lost_to_competition()
+        elif opening_id in seen:
+            failures[i] = {
+                "msg": "opening requested twice in one batch",
+                "status": ResponseStatus.NOT_AVAILABLE,
+            }
+        elif opening_id not in OPENINGS_DB:
+            failures[i] = _booking_failure(opening_id)
+        seen.add(opening_id)
+
+    if not failures:
+        # build every reservation before claiming anything, so nothing can
+        # fail once the openings are taken
+        reservations = [
+            _make_reservation(
+                booking, OPENINGS_DB.build_opening(OPENINGS_DB.row_of(booking.opening_id))
+            )
+            for booking in bookings
+        ]
+        if OPENINGS_DB.claim_all(opening_ids) is None:
+            # another request claimed one of them since the checks above
+            failures = {
+                i: _booking_failure(opening_id)
+                for i, opening_id in enumerate(opening_ids)
+                if opening_id not in OPENINGS_DB
+            }
+
+    if failures:
+        rolled_back = {
+            "msg": "not booked: another opening in the batch is unavailable",
+            "status": ResponseStatus.NOT_AVAILABLE,
+        }
+        return {
+            "msg": f"no bookings made: {len(failures)} of {len(bookings)} openings unavailable",
+            "status": ResponseStatus.NOT_AVAILABLE,
+            "results": [failures.get(i, rolled_back) for i in range(len(bookings))],
+        }
+
+    return {
+        "msg": f"{len(bookings)} bookings made",
+        "status": ResponseStatus.CONFIRMED,
+        "results": [_record_reservation(ressy) for ressy in reservations],
+    }
+
+
 @router.post("/reservations/book", response_model=TripBookingResponse)
 def book_reservation(request: TripBookingRequest):
     """
@@ -197,7 +885,8 @@ def book_reservation(request: TripBookingRequest):
     This is a mock function to mimic the booking process.
     It will return a booking response with a status of CONFIRMED.
     """
-    return _pop_opening_and_book_reservation(request)
+    with _logged_booking():
+        return _pop_opening_and_book_reservation(request)
 
 
 @router.post("/reservations/competitive_book", response_model=TripBookingResponse)
@@ -210,13 +899,50 @@ def book_reservation_against_others(request: TripBookingRequest):
     If the booking is not successful, it will return a booking response with a status of NOT_AVAILABLE.
     """
     # to mimick incase reservation doesn't exist again
-    if NP_RANDOM.rand() > 0.3:
+    if _competition_roll() > 0.3:
         return {
             "msg": "opening is no longer available",
             "status": ResponseStatus.NOT_AVAILABLE,
         }
 
-    return _pop_opening_and_book_reservation(request)
+    with _logged_booking():
+        return _pop_opening_and_book_reservation(request)
+
+
+@router.post("/reservations/book/batch", response_model=TripBatchBookingResponse)
+def book_reservations_batch(request: TripBatchBookingRequest):
+    """
+    Book several openings in one call, e.g. the rooms or legs of a group trip.
+
+    In `best_effort` mode every item is booked like `/reservations/book` and
+    reported on its own. In `atomic` mode either every opening is booked or,
+    if any of them is unavailable, none is. With `competitive`, each item
+    faces the odds of `/reservations/competitive_book`; in atomic mode one
+    lost item loses the whole batch.
+    """
+    bookings = request.bookings
+    lost = [request.competitive and _competition_roll() > 0.3 for _ in bookings]
+    if request.mode == BookingMode.ATOMIC:
+        with _logged_booking():
+            return _book_all_or_nothing(bookings, lost)
+
+    with _logged_booking():
+        results = [
+            _lost_to_competition() if lost_item else _pop_opening_and_book_reservation(booking)
+            for booking, lost_item in zip(bookings, lost)
+        ]
+    confirmed = sum(result["status"] == ResponseStatus.CONFIRMED for result in results)
+    if confirmed == len(results):
+        status = ResponseStatus.CONFIRMED
+    elif confirmed == 0:
+        status = ResponseStatus.NOT_AVAILABLE
+    else:
+        status = ResponseStatus.PARTIAL
+    return {
+        "msg": f"{confirmed} of {len(results)} bookings made",
+        "status": status,
+        "results": results,
+    }
 
 
 # Mount the router with the /api prefix
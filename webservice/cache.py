@@ -0,0 +1,105 @@
+"""
+Bounded LRU + TTL cache for search results.
+
+Entries are tagged with the store generation they were computed at. The store
+bumps its generation on every insert and booking, so a lookup made after any
+inventory change misses without the cache having to track which entries the
+change affects. Callers record the generation *before* computing a result, so
+a result that raced with a change is never stored as current.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class _Entry:
+    generation: int
+    stored_at: float
+    value: Any
+
+
+class SearchResultCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        # entries dropped for room, for age, and for predating an inventory change
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(
+        self,
+        key: Hashable,
+        generation: int,
+        is_valid: Callable[[Any], bool] | None = None,
+    ) -> Any | None:
+        """
+        The value stored under `key` at `generation`, if still fresh.
+
+        `is_valid` can veto an entry the generation check alone would accept.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.generation != generation or (
+                is_valid is not None and not is_valid(entry.value)
+            ):
+                self.invalidations += 1
+            elif self._clock() - entry.stored_at > self.ttl_seconds:
+                self.expirations += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, generation: int, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = _Entry(generation, self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,66 @@
+"""
+The column encoding of openings, shared by the data generator and the store.
+
+Dates are day ordinals and enum fields small integer codes: the position of
+the member in `COUNTRIES`, `LODGING_CLASSES` or `HOTEL_COMPANIES`.
+"""
+
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from webservice.data_generator.enums import Country, HotelCompany, LodgingClass
+from webservice.schemas import TripOpening
+
+
+COUNTRIES: tuple[Country, ...] = tuple(Country)
+LODGING_CLASSES: tuple[LodgingClass, ...] = tuple(LodgingClass)
+HOTEL_COMPANIES: tuple[HotelCompany, ...] = tuple(HotelCompany)
+
+COUNTRY_CODES = {member: code for code, member in enumerate(COUNTRIES)}
+LODGING_CLASS_CODES = {member: code for code, member in enumerate(LODGING_CLASSES)}
+HOTEL_COMPANY_CODES = {member: code for code, member in enumerate(HOTEL_COMPANIES)}
+
+COLUMN_DTYPES = {
+    "start_ord": np.int32,
+    "end_ord": np.int32,
+    "day_rate": np.float64,
+    "country": np.int8,
+    "lodging_class": np.int8,
+    "hotel_company": np.int8,
+    "alive": np.bool_,
+}
+
+
+@dataclass
+class OpeningColumns:
+    """A batch of openings in the store's column encoding."""
+
+    opening_ids: list[str]
+    start_ord: np.ndarray
+    end_ord: np.ndarray
+    day_rate: np.ndarray
+    country: np.ndarray
+    lodging_class: np.ndarray
+    hotel_company: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.opening_ids)
+
+    @classmethod
+    def from_openings(cls, openings: Iterable[TripOpening]) -> "OpeningColumns":
+        openings = list(openings)
+        return cls(
+            opening_ids=[o.opening_id for o in openings],
+            start_ord=np.array([o.start_date.toordinal() for o in openings]),
+            end_ord=np.array([o.end_date.toordinal() for o in openings]),
+            day_rate=np.array([o.day_rate for o in openings], dtype=np.float64),
+            country=np.array([COUNTRY_CODES[o.country] for o in openings]),
+            lodging_class=np.array(
+                [LODGING_CLASS_CODES[o.lodging_class] for o in openings]
+            ),
+            hotel_company=np.array(
+                [HOTEL_COMPANY_CODES[o.hotel_company] for o in openings]
+            ),
+        )
@@ -1,40 +1,103 @@
-from pydantic import BaseModel, Field
-
 import datetime
-from uuid import uuid4
-from datetime import timedelta
+import os
+
+import numpy as np
 
-from webservice.data_generator.enums import Country, LodgingClass, HotelCompany
+from webservice.data_generator.columns import (
+    COUNTRIES,
+    HOTEL_COMPANIES,
+    LODGING_CLASSES,
+    OpeningColumns,
+)
+from webservice.data_generator.enums import Country, HotelCompany
 from webservice.data_generator.randomizer import (
-    generate_countries,
-    generate_hotel,
-    generate_lodging,
-    generate_start_dates,
+    _generate_weighted_codes,
     generate_durations,
+    generate_lodging_codes,
+    generate_start_ordinals,
 )
 from webservice.schemas import TripOpening
 
 
-def generate_vacation_openings(n: int = 100):
-    countries = generate_countries(n)
-    hotels = generate_hotel(n)
-    lodge_classes = generate_lodging(n)
-    start_dates = generate_start_dates(n)
-    durations = generate_durations(n)
+# (start, end) of each hex group in a formatted UUID string
+_UUID_GROUPS = ((0, 8), (9, 13), (14, 18), (19, 23), (24, 36))
+
+
+def generate_opening_ids(n: int) -> list[str]:
+    """`n` random version-4 UUID strings, formatted in bulk."""
+    raw = np.frombuffer(os.urandom(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+
+    hexed = np.frombuffer(raw.tobytes().hex().encode(), dtype=np.uint8).reshape(n, 32)
+    chars = np.full((n, 36), ord("-"), dtype=np.uint8)
+    offset = 0
+    for start, end in _UUID_GROUPS:
+        chars[:, start:end] = hexed[:, offset : offset + end - start]
+        offset += end - start
+    return [b.decode() for b in chars.view("S36").ravel().tolist()]
 
-    collector = []
-    zip_package = zip(countries, hotels, lodge_classes, start_dates, durations)
 
-    for c, h, lc, s, d in zip_package:
-        l, r = lc
+def generate_vacation_columns(
+    n: int = 100, random_state: np.random.RandomState | None = None
+) -> OpeningColumns:
+    """
+    Generate `n` openings directly in the store's column encoding.
+
+    Values are drawn in the same order, and from the same seeded random state,
+    as the per-row generator, so both produce identical openings.
+    """
+    countries = _generate_weighted_codes(Country, n, random_state)
+    hotels = _generate_weighted_codes(HotelCompany, n, random_state)
+    lodge_classes, rates = generate_lodging_codes(n, random_state)
+    start_ords = generate_start_ordinals(n, random_state)
+    durations = generate_durations(n, random_state)
+
+    return OpeningColumns(
+        opening_ids=generate_opening_ids(n),
+        start_ord=start_ords,
+        end_ord=start_ords + durations,
+        day_rate=rates.astype(np.float64),
+        country=countries,
+        lodging_class=lodge_classes,
+        hotel_company=hotels,
+    )
+
+
+def generate_vacation_openings(
+    n: int = 100,
+    validate: bool = True,
+    random_state: np.random.RandomState | None = None,
+) -> list[TripOpening]:
+    """
+    Generate `n` openings as `TripOpening` models.
+
+    With `validate=False` the models are built with `model_construct`, which
+    skips pydantic validation of the (already well-typed) generated values.
+    """
+    columns = generate_vacation_columns(n, random_state)
+    build = TripOpening if validate else TripOpening.model_construct
+
+    collector = []
+    zip_package = zip(
+        columns.opening_ids,
+        columns.start_ord.tolist(),
+        columns.end_ord.tolist(),
+        columns.country,
+        columns.lodging_class,
+        columns.day_rate.tolist(),
+        columns.hotel_company,
+    )
+    for opening_id, s, e, c, lc, r, h in zip_package:
         collector.append(
-            TripOpening(
-                start_date=s,
-                end_date=s + timedelta(days=int(d)),
-                country=c,
-                lodging_class=l,
+            build(
+                opening_id=opening_id,
+                start_date=datetime.datetime.fromordinal(s),
+                end_date=datetime.datetime.fromordinal(e),
+                country=COUNTRIES[c],
+                lodging_class=LODGING_CLASSES[lc],
                 day_rate=r,
-                hotel_company=h,
+                hotel_company=HOTEL_COMPANIES[h],
             )
         )
     return collector
@@ -1,7 +1,8 @@
+import datetime
+
 import numpy as np
 from numpy.typing import ArrayLike
 from enum import Enum
-import pandas as pd
 from loguru import logger
 
 from webservice.data_generator.enums import (
@@ -14,6 +15,16 @@ from webservice.data_generator.enums import LODGING_RATE_RANGE
 
 RANDOM_STATE = np.random.RandomState(42)
 
+FIRST_DATE_ORDINAL = datetime.date(2024, 1, 1).toordinal()
+ANNUAL_DATES = [
+    datetime.date.fromordinal(o)
+    for o in range(FIRST_DATE_ORDINAL, datetime.date(2024, 12, 31).toordinal() + 1)
+]
+
+# rate bounds indexed by lodging class code (position in LodgingClass)
+LODGING_RATE_LOWS = np.array([LODGING_RATE_RANGE[lc][0] for lc in LodgingClass])
+LODGING_RATE_HIGHS = np.array([LODGING_RATE_RANGE[lc][1] for lc in LodgingClass])
+
 
 def _generate_choice_probs(n: int) -> ArrayLike:
     vals = np.arange(1, n + 1)
@@ -22,35 +33,56 @@ def _generate_choice_probs(n: int) -> ArrayLike:
     return prof
 
 
-def _generate_weighted_sample(var_enum: type[Enum], generated_ct: int):
-    vals = list(var_enum.__members__.values())
-    probs = _generate_choice_probs(len(vals))
-    return RANDOM_STATE.choice(np.array(vals), size=generated_ct, p=np.array(probs))
+def _generate_weighted_codes(
+    var_enum: type[Enum], generated_ct: int, random_state: np.random.RandomState | None = None
+) -> np.ndarray:
+    """Weighted sample of member positions; draws exactly what the member sample draws."""
+    random_state = random_state or RANDOM_STATE
+    probs = _generate_choice_probs(len(var_enum.__members__))
+    return random_state.choice(len(probs), size=generated_ct, p=np.array(probs))
+
+
+def _generate_weighted_sample(
+    var_enum: type[Enum], generated_ct: int, random_state: np.random.RandomState | None = None
+):
+    vals = np.array(list(var_enum.__members__.values()))
+    return vals[_generate_weighted_codes(var_enum, generated_ct, random_state)]
+
+
+def generate_countries(n: int, random_state: np.random.RandomState | None = None):
+    return _generate_weighted_sample(Country, generated_ct=n, random_state=random_state)
+
+
+def generate_lodging_codes(
+    n: int, random_state: np.random.RandomState | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Lodging class codes and a day rate drawn from each class's rate range."""
+    random_state = random_state or RANDOM_STATE
+    codes = _generate_weighted_codes(LodgingClass, n, random_state)
+    rates = random_state.randint(LODGING_RATE_LOWS[codes], LODGING_RATE_HIGHS[codes])
+    return codes, rates
 
 
-def generate_countries(n: int):
-    return _generate_weighted_sample(Country, generated_ct=n)
+def generate_lodging(n: int, random_state: np.random.RandomState | None = None):
+    codes, rates = generate_lodging_codes(n, random_state)
+    lodgings = list(LodgingClass)
+    return [[lodgings[code], int(rate)] for code, rate in zip(codes, rates)]
 
 
-def generate_lodging(n: int):
-    lodgings = _generate_weighted_sample(LodgingClass, generated_ct=n)
-    collector = []
-    for ld in lodgings:
-        low, high = LODGING_RATE_RANGE[ld]
-        rate = RANDOM_STATE.randint(low, high)
-        collector.append([ld, rate])
-    return collector
+def generate_hotel(n: int, random_state: np.random.RandomState | None = None):
+    return _generate_weighted_sample(HotelCompany, generated_ct=n, random_state=random_state)
 
 
-def generate_hotel(n: int):
-    return _generate_weighted_sample(HotelCompany, generated_ct=n)
+def generate_start_ordinals(n: int, random_state: np.random.RandomState | None = None):
+    random_state = random_state or RANDOM_STATE
+    return FIRST_DATE_ORDINAL + random_state.choice(len(ANNUAL_DATES), size=n)
 
 
-def generate_start_dates(n: int):
-    annual_dates = pd.date_range("2024-01-01", "2024-12-31")
-    annual_dates = [ad.date() for ad in annual_dates]
-    return RANDOM_STATE.choice(annual_dates, size=n)
+def generate_start_dates(n: int, random_state: np.random.RandomState | None = None):
+    ordinals = generate_start_ordinals(n, random_state)
+    return np.array([ANNUAL_DATES[o - FIRST_DATE_ORDINAL] for o in ordinals])
 
 
-def generate_durations(n: int):
-    return RANDOM_STATE.randint(2, 30, size=n)
+def generate_durations(n: int, random_state: np.random.RandomState | None = None):
+    random_state = random_state or RANDOM_STATE
+    return random_state.randint(2, 30, size=n)
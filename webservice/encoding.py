@@ -0,0 +1,126 @@
+"""
+Pre-encoded JSON for search responses.
+
+Returning models through `response_model` revalidates and re-encodes every
+`TripOpening` on every request. A store row never changes once inserted
+(booking only tombstones it), so each row's JSON is encoded once, cached, and
+responses are assembled from those bytes. Everything is encoded with
+pydantic's serializer, so the output is byte-for-byte what the response
+model would have produced.
+"""
+
+import threading
+
+import numpy as np
+from pydantic_core import to_json
+
+from webservice.schemas import ResponseStatus, TripOpening
+from webservice.store import OpeningsStore
+
+
+# upper bound on cached fragments; the oldest are dropped first
+FRAGMENT_CACHE_ROWS = 250_000
+
+# what an opening without a score serializes as
+UNRANKED_SCORE = to_json(float(TripOpening.model_fields["ranking_score"].default))
+
+
+class OpeningFragments:
+    """Cached JSON of each row's `TripOpening`, open-ended before the ranking score."""
+
+    def __init__(self, store: OpeningsStore, max_rows: int = FRAGMENT_CACHE_ROWS):
+        self.store = store
+        self.max_rows = max_rows
+        self._fragments: dict[int, bytes] = dict()
+        self._lock = threading.Lock()
+        store.add_listener(self)
+
+    def on_insert(self, store: OpeningsStore, rows: np.ndarray):
+        # fragments are encoded lazily, the first time a row is served
+        pass
+
+    def on_remove(self, store: OpeningsStore, row: int):
+        with self._lock:
+            self._fragments.pop(row, None)
+
+    def _encode(self, row: int) -> bytes:
+        opening = self.store.build_opening(row)
+        # drop the closing brace so a score can be appended
+        body = opening.model_dump_json(exclude={"ranking_score"})[:-1]
+        return body.encode() + b',"ranking_score":'
+
+    def fragments(self, rows: list[int]) -> list[bytes]:
+        cached = self._fragments
+        out = [cached.get(row) for row in rows]
+        missing = [i for i, fragment in enumerate(out) if fragment is None]
+        if not missing:
+            return out
+
+        for i in missing:
+            out[i] = self._encode(rows[i])
+        with self._lock:
+            while cached and len(cached) + len(missing) > self.max_rows:
+                cached.pop(next(iter(cached)))
+            cached.update((rows[i], out[i]) for i in missing)
+        return out
+
+    def encode_openings(self, rows: np.ndarray, scores: np.ndarray | None = None) -> list[bytes]:
+        """One encoded `TripOpening` per row, scored like `OpeningsStore.build_openings`."""
+        fragments = self.fragments(rows.tolist())
+        return [
+            fragment + score + b"}"
+            for fragment, score in zip(fragments, encode_scores(scores, len(fragments)))
+        ]
+
+
+def encode_scores(scores: np.ndarray | None, n: int) -> list[bytes]:
+    if scores is None:
+        return [UNRANKED_SCORE] * n
+    if n == 0:
+        return []
+    # one serializer call for the whole page; encoded floats never contain commas
+    return to_json([round(score, 5) for score in scores.tolist()])[1:-1].split(b",")
+
+
+def encode_search_response(
+    search_params: dict,
+    openings: list[bytes],
+    next_cursor: str | None = None,
+    status: ResponseStatus = ResponseStatus.FOUND,
+) -> bytes:
+    """A `TripSearchResultsResponse` body around already-encoded openings."""
+    return b"".join(
+        (
+            b'{"status":',
+            to_json(status),
+            b',"results_count":',
+            to_json(len(openings)),
+            b',"search_params":',
+            to_json(search_params),
+            b',"results":[',
+            b",".join(openings),
+            b'],"next_cursor":',
+            to_json(next_cursor),
+            b"}",
+        )
+    )
+
+
+def encode_batch_response(responses: list[bytes]) -> bytes:
+    """A `TripSearchBatchResponse` body around already-encoded search responses."""
+    return b"".join(
+        (
+            b'{"status":',
+            to_json(ResponseStatus.FOUND),
+            b',"results_count":',
+            to_json(len(responses)),
+            b',"results":[',
+            b",".join(responses),
+            b"]}",
+        )
+    )
+
+
+def encode_sse_event(event: str, data: bytes) -> bytes:
+    """One Server-Sent Events message; `data` must be single-line JSON."""
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
@@ -0,0 +1,352 @@
+"""
+Secondary indexes over an `OpeningsStore`.
+
+Indexes register themselves as store listeners, so they are updated as rows
+are inserted and tombstoned. Bitmap indexes clear booked rows right away;
+elsewhere removal is lazy: a booked row stays in the index arrays until the
+next vacuum, and callers are expected to drop dead rows with the store's
+`alive` column.
+
+Searches run concurrently with inserts and bookings, and vacuums run inline
+from a booking. So the arrays of a sorted or interval index are published
+together as one tuple, replaced rather than mutated in place; a query reads
+that attribute once and works on the snapshot it got, never mixing positions
+found in one version of the arrays with another version's rows.
+"""
+
+import numpy as np
+
+from webservice.store import OpeningsStore
+
+
+# rebuild an index once this fraction of its entries belongs to booked rows
+VACUUM_DEAD_FRACTION = 0.25
+
+
+# bitmaps are split in chunks of 2**16 rows, each stored as the sorted uint16
+# offsets of its set rows while there are at most ARRAY_MAX_ROWS of them (a
+# smaller encoding than the 8 KiB packed bitmap used past that)
+CHUNK_BITS = 16
+CHUNK_ROWS = 1 << CHUNK_BITS
+ARRAY_MAX_ROWS = 4096
+
+
+def _is_array(container: np.ndarray) -> bool:
+    return container.dtype == np.uint16
+
+
+def _to_bitmap(offsets: np.ndarray) -> np.ndarray:
+    bits = np.zeros(CHUNK_ROWS, dtype=np.uint8)
+    bits[offsets] = 1
+    return np.packbits(bits)
+
+
+def _add(container: np.ndarray | None, offsets: np.ndarray) -> np.ndarray:
+    if container is not None and not _is_array(container):
+        return container | _to_bitmap(offsets)
+    merged = np.unique(offsets) if container is None else np.union1d(container, offsets)
+    return merged if len(merged) <= ARRAY_MAX_ROWS else _to_bitmap(merged)
+
+
+def _discard(container: np.ndarray, offset: int) -> np.ndarray | None:
+    if _is_array(container):
+        kept = container[container != offset]
+        return kept if len(kept) else None
+    bitmap = container.copy()
+    bitmap[offset >> 3] &= ~np.uint8(0x80 >> (offset & 7))
+    return bitmap
+
+
+def _offsets(container: np.ndarray) -> np.ndarray:
+    if _is_array(container):
+        return container
+    return np.flatnonzero(np.unpackbits(container)).astype(np.uint16)
+
+
+def _intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray | None:
+    """`a` AND `b`, None when empty; `a` is an array whenever `b` is."""
+    if _is_array(a):
+        if _is_array(b):
+            kept = np.intersect1d(a, b, assume_unique=True)
+        else:
+            offsets = a.astype(np.intp)
+            kept = a[(b[offsets >> 3] & (0x80 >> (offsets & 7))) != 0]
+        return kept if len(kept) else None
+    both = a & b
+    return both if both.any() else None
+
+
+class BitmapIndex:
+    """
+    Compressed per-code row bitmaps for a small integer-coded column.
+
+    Each code has one container per chunk of rows (None where it has no
+    rows). Containers are replaced, never mutated, and booked rows are
+    cleared right away, so the bitmaps always hold exactly the live rows.
+    """
+
+    def __init__(self, column: str, n_codes: int):
+        self.column = column
+        self._containers: list[list[np.ndarray | None]] = [[] for _ in range(n_codes)]
+        self.live_counts = np.zeros(n_codes, dtype=np.int64)
+
+    def insert(self, codes: np.ndarray, rows: np.ndarray):
+        for code in np.unique(codes):
+            code_rows = rows[codes == code]
+            self.live_counts[code] += len(code_rows)
+            containers = self._containers[code]
+            chunk_of = code_rows >> CHUNK_BITS
+            for chunk in np.unique(chunk_of).tolist():
+                offsets = (code_rows[chunk_of == chunk] & (CHUNK_ROWS - 1)).astype(np.uint16)
+                containers.extend([None] * (chunk + 1 - len(containers)))
+                containers[chunk] = _add(containers[chunk], offsets)
+
+    def remove(self, code: int, row: int):
+        containers = self._containers[code]
+        chunk = row >> CHUNK_BITS
+        containers[chunk] = _discard(containers[chunk], row & (CHUNK_ROWS - 1))
+        self.live_counts[code] -= 1
+
+    def estimate(self, codes: tuple[int, ...]) -> int:
+        return int(self.live_counts[list(codes)].sum())
+
+    @property
+    def n_chunks(self) -> int:
+        return max(map(len, self._containers), default=0)
+
+    def union(self, codes: tuple[int, ...], chunk: int) -> np.ndarray | None:
+        """The container of rows in `chunk` holding any of `codes`."""
+        parts = [
+            self._containers[code][chunk]
+            for code in codes
+            if chunk < len(self._containers[code]) and self._containers[code][chunk] is not None
+        ]
+        if len(parts) <= 1:
+            return parts[0] if parts else None
+
+        arrays = [part for part in parts if _is_array(part)]
+        if len(arrays) == len(parts) and sum(map(len, arrays)) <= ARRAY_MAX_ROWS:
+            # a row holds a single code, so the arrays are disjoint
+            return np.sort(np.concatenate(arrays))
+        bitmaps = [part for part in parts if not _is_array(part)]
+        if arrays:
+            bitmaps.append(_to_bitmap(np.concatenate(arrays)))
+        return np.bitwise_or.reduce(bitmaps)
+
+
+def match_bitmaps(facets: list[tuple[BitmapIndex, tuple[int, ...]]]) -> np.ndarray:
+    """
+    Live rows holding one of the given codes in every facet, in row order.
+
+    Chunk by chunk, the codes of each facet are OR-ed and the facets AND-ed,
+    smallest container first; a chunk is skipped as soon as a facet has no
+    rows in it.
+    """
+    matched = []
+    for chunk in range(max(index.n_chunks for index, _ in facets)):
+        containers = []
+        for index, codes in facets:
+            container = index.union(codes, chunk)
+            if container is None:
+                break
+            containers.append(container)
+        else:
+            # arrays (at most ARRAY_MAX_ROWS rows) first, then bitmaps
+            containers.sort(key=lambda container: len(container) if _is_array(container) else CHUNK_ROWS)
+            result = containers[0]
+            for container in containers[1:]:
+                result = _intersect(result, container)
+                if result is None:
+                    break
+            if result is not None:
+                matched.append((chunk << CHUNK_BITS) + _offsets(result).astype(np.int64))
+    return np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+
+
+class SortedIndex:
+    """Column values kept sorted alongside their rows, searched with bisection."""
+
+    def __init__(self, column: str, dtype):
+        self.column = column
+        self.dtype = dtype
+        # (keys, rows), replaced as a whole
+        self._entries = (np.empty(0, dtype=dtype), np.empty(0, dtype=np.int64))
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._entries[1])
+
+    def insert(self, keys: np.ndarray, rows: np.ndarray):
+        # the order of rows within equal keys is irrelevant: range() callers
+        # re-sort candidates by row
+        order = np.argsort(keys)
+        keys, rows = keys[order], rows[order]
+        old_keys, old_rows = self._entries
+        if len(old_keys) == 0:
+            self._entries = (keys.astype(self.dtype), rows.astype(np.int64))
+            return
+
+        positions = np.searchsorted(old_keys, keys, side="right")
+        self._entries = (np.insert(old_keys, positions, keys), np.insert(old_rows, positions, rows))
+
+    def remove(self):
+        self._dead += 1
+
+    @staticmethod
+    def _bounds(keys: np.ndarray, low=None, high=None) -> tuple[int, int]:
+        """Slice bounds for `low <= key <= high`; either side may be open."""
+        lo = 0 if low is None else int(np.searchsorted(keys, low, side="left"))
+        hi = len(keys) if high is None else int(np.searchsorted(keys, high, side="right"))
+        return lo, max(lo, hi)
+
+    def estimate(self, low=None, high=None) -> int:
+        lo, hi = self._bounds(self._entries[0], low, high)
+        return hi - lo
+
+    def range(self, low=None, high=None) -> np.ndarray:
+        keys, rows = self._entries
+        lo, hi = self._bounds(keys, low, high)
+        return rows[lo:hi]
+
+    def needs_vacuum(self) -> bool:
+        return len(self) > 0 and self._dead / len(self) > VACUUM_DEAD_FRACTION
+
+    def vacuum(self, alive: np.ndarray):
+        keys, rows = self._entries
+        keep = alive[rows]
+        self._entries = (keys[keep], rows[keep])
+        self._dead = 0
+
+
+class IntervalIndex:
+    """
+    Opening [start, end] day intervals, for queries of the form
+    `start <= a and end >= b`: openings covering a stay window, or
+    overlapping one.
+
+    Entries are sorted by start, then by end descending, under one composite
+    int64 key per row. Within the run of entries sharing a start day, those
+    ending on or after `b` are then a prefix, so one vectorized searchsorted
+    over the distinct start days up to `a` finds every matching run. A query
+    costs O(d log n + k) for d distinct start days (bounded by the calendar,
+    not by the table) and k entries returned.
+    """
+
+    # ordinals stay below 2**22 (year 9999 is day 3,652,059)
+    END_BITS = 22
+    END_MASK = (1 << END_BITS) - 1
+
+    def __init__(self):
+        # (distinct start days with entries, keys, rows), replaced as a whole
+        empty = np.empty(0, dtype=np.int64)
+        self._entries = (empty, empty, empty)
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._entries[2])
+
+    def _key(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        starts, ends = starts.astype(np.int64), ends.astype(np.int64)
+        return (starts << self.END_BITS) | (self.END_MASK - ends)
+
+    def insert(self, starts: np.ndarray, ends: np.ndarray, rows: np.ndarray):
+        keys = self._key(starts, ends)
+        order = np.argsort(keys)
+        keys, rows = keys[order], rows[order].astype(np.int64)
+        old_starts, old_keys, old_rows = self._entries
+        positions = np.searchsorted(old_keys, keys, side="right")
+        self._entries = (
+            np.union1d(old_starts, starts.astype(np.int64)),
+            np.insert(old_keys, positions, keys),
+            np.insert(old_rows, positions, rows),
+        )
+
+    def remove(self):
+        self._dead += 1
+
+    def _runs(self, entries: tuple, max_start: int, min_end: int) -> tuple[np.ndarray, np.ndarray]:
+        """[lo, hi) positions in `entries` of the matching prefix of each start day's run."""
+        starts, keys, _ = entries
+        days = starts[: np.searchsorted(starts, max_start, side="right")]
+        if min_end > self.END_MASK:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        lo = np.searchsorted(keys, days << self.END_BITS, side="left")
+        hi = np.searchsorted(keys, (days << self.END_BITS) | (self.END_MASK - max(min_end, 0)), side="right")
+        return lo, hi
+
+    def estimate(self, max_start: int, min_end: int) -> int:
+        lo, hi = self._runs(self._entries, max_start, min_end)
+        return int((hi - lo).sum())
+
+    def dominated(self, max_start: int, min_end: int) -> np.ndarray:
+        """Rows with `start <= max_start` and `end >= min_end`, possibly including dead rows."""
+        entries = self._entries
+        lo, hi = self._runs(entries, max_start, min_end)
+        counts = hi - lo
+        taken = counts > 0
+        lo, counts = lo[taken], counts[taken]
+        total = int(counts.sum())
+        # positions lo[i], lo[i] + 1, ..., hi[i] - 1 for every run, concatenated
+        run_offsets = np.cumsum(counts) - counts
+        positions = np.arange(total) + np.repeat(lo - run_offsets, counts)
+        return entries[2][positions]
+
+    def needs_vacuum(self) -> bool:
+        return len(self) > 0 and self._dead / len(self) > VACUUM_DEAD_FRACTION
+
+    def vacuum(self, alive: np.ndarray):
+        _, keys, rows = self._entries
+        keep = alive[rows]
+        keys = keys[keep]
+        self._entries = (np.unique(keys >> self.END_BITS), keys, rows[keep])
+        self._dead = 0
+
+
+class OpeningIndexes:
+    """The secondary indexes used by the search planner, kept in sync with a store."""
+
+    def __init__(
+        self,
+        store: OpeningsStore,
+        n_countries: int,
+        n_lodging_classes: int,
+        n_hotel_companies: int,
+    ):
+        self.store = store
+        self.country = BitmapIndex("country", n_countries)
+        self.lodging_class = BitmapIndex("lodging_class", n_lodging_classes)
+        self.hotel_company = BitmapIndex("hotel_company", n_hotel_companies)
+        self.start_ord = SortedIndex("start_ord", np.int32)
+        self.end_ord = SortedIndex("end_ord", np.int32)
+        self.day_rate = SortedIndex("day_rate", np.float64)
+        self.interval = IntervalIndex()
+
+        self.on_insert(store, store.live_rows())
+        store.add_listener(self)
+
+    @property
+    def bitmap_indexes(self) -> tuple[BitmapIndex, ...]:
+        return (self.country, self.lodging_class, self.hotel_company)
+
+    @property
+    def sorted_indexes(self) -> tuple[SortedIndex, ...]:
+        return (self.start_ord, self.end_ord, self.day_rate)
+
+    def on_insert(self, store: OpeningsStore, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        for index in self.bitmap_indexes:
+            index.insert(getattr(store, index.column)[rows], rows)
+        for index in self.sorted_indexes:
+            index.insert(getattr(store, index.column)[rows], rows)
+        self.interval.insert(store.start_ord[rows], store.end_ord[rows], rows)
+
+    def on_remove(self, store: OpeningsStore, row: int):
+        for index in self.bitmap_indexes:
+            index.remove(int(getattr(store, index.column)[row]), row)
+        for index in (*self.sorted_indexes, self.interval):
+            index.remove()
+
+        for index in (*self.sorted_indexes, self.interval):
+            if index.needs_vacuum():
+                index.vacuum(store.alive)
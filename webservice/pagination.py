@@ -0,0 +1,39 @@
+"""
+Opaque keyset cursors for paginating ranked search results.
+
+A cursor records the (score, opening_id) of the last row a client received,
+plus a fingerprint of the query it belongs to. The next page continues with
+rows strictly after that key in ranking order, so pages stay stable while
+openings are added or booked in between requests.
+"""
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SearchCursor:
+    score: float | None
+    opening_id: str
+    fingerprint: str
+
+
+def query_fingerprint(*parts) -> str:
+    return hashlib.blake2b(repr(parts).encode(), digest_size=6).hexdigest()
+
+
+def encode_cursor(cursor: SearchCursor) -> str:
+    payload = json.dumps([cursor.score, cursor.opening_id, cursor.fingerprint])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> SearchCursor:
+    """Parse a cursor produced by `encode_cursor`, raising ValueError if it is malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        score, opening_id, fingerprint = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {token!r}") from e
+    return SearchCursor(score=score, opening_id=opening_id, fingerprint=fingerprint)
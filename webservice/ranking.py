@@ -0,0 +1,126 @@
+"""
+Relevance ranking for opening search.
+
+Ranking functions compute one score per candidate row (higher ranks first)
+from the store's columns; they never touch the stored openings, so concurrent
+requests cannot see each other's scores. Only the best `limit` rows are
+selected and ordered, with ties kept in row (insertion) order.
+"""
+
+from collections.abc import Callable
+
+import numpy as np
+
+from webservice.data_generator.enums import LODGING_RATE_RANGE
+from webservice.search import SearchQuery
+from webservice.store import OpeningsStore
+
+
+DEFAULT_RANKING = "days_count"
+
+# (store, candidate rows, query, requested days_count) -> scores
+RankingFunction = Callable[[OpeningsStore, np.ndarray, SearchQuery, int | None], np.ndarray]
+
+RANKING_FUNCTIONS: dict[str, RankingFunction] = dict()
+
+MAX_LISTED_RATE = max(high for _, high in LODGING_RATE_RANGE.values())
+
+
+def ranking_function(name: str):
+    """Register a ranking function under `name`, selectable with `rank_by`."""
+
+    def register(func: RankingFunction) -> RankingFunction:
+        RANKING_FUNCTIONS[name] = func
+        return func
+
+    return register
+
+
+@ranking_function("days_count")
+def rank_by_days_count(store, rows, query, days_count):
+    row_days = store.end_ord[rows] - store.start_ord[rows]
+    return np.abs(row_days - days_count) / np.maximum(days_count, row_days)
+
+
+@ranking_function("rate")
+def rank_by_rate(store, rows, query, days_count):
+    """Cheaper is better, relative to the requested rate cap if there is one."""
+    reference = query.max_rate or MAX_LISTED_RATE
+    return np.clip(1 - store.day_rate[rows] / reference, 0, 1)
+
+
+@ranking_function("date_proximity")
+def rank_by_date_proximity(store, rows, query, days_count):
+    """Openings starting closest to the first day of the requested stay rank first, in any date mode."""
+    if query.target_start_ord is None:
+        return np.zeros(len(rows))
+    distance = np.abs(store.start_ord[rows] - query.target_start_ord)
+    return 1 / (1 + distance)
+
+
+def top_k_order(scores: np.ndarray, k: int | None) -> np.ndarray:
+    """
+    Positions of the `k` highest scores, best first, ties in position order.
+
+    Selection is a linear-time partition; only the selected `k` are sorted.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+
+    threshold = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)[: k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.argsort(-scores[chosen], kind="stable")]
+
+
+def score_rows(
+    store: OpeningsStore,
+    rows: np.ndarray,
+    query: SearchQuery,
+    rank_by: str,
+    days_count: int | None,
+) -> np.ndarray | None:
+    """
+    Scores of `rows` under `rank_by`, or None when they keep insertion order.
+
+    As before ranking functions existed, `days_count` ranking is skipped when
+    no `days_count` is requested.
+    """
+    if rank_by == DEFAULT_RANKING and days_count is None:
+        return None
+    return RANKING_FUNCTIONS[rank_by](store, rows, query, days_count)
+
+
+def select_page(
+    rows: np.ndarray,
+    scores: np.ndarray | None,
+    limit: int | None,
+    after: tuple[float | None, int] | None = None,
+) -> tuple[np.ndarray, np.ndarray | None, int]:
+    """
+    Return the first `limit` of the scored `rows` (all when falsy), their
+    scores and the number of rows that were eligible.
+
+    `after` is the (score, row) key of the last row of a previous page; only
+    rows that rank strictly after it are eligible.
+    """
+    if after is not None:
+        after_score, after_row = after
+        keep = rows > after_row
+        if scores is not None:
+            keep = (scores < after_score) | ((scores == after_score) & keep)
+            scores = scores[keep]
+        rows = rows[keep]
+
+    eligible = len(rows)
+    if scores is None:
+        return (rows[:limit] if limit else rows), None, eligible
+
+    k = limit if limit and limit > 0 else None
+    order = top_k_order(scores, k)
+    if limit and k is None:
+        order = order[:limit]
+    return rows[order], scores[order], eligible
+
@@ -47,6 +47,24 @@ class ResponseStatus(StrEnum):
     NOT_FOUND = "not-found"
     FOUND = "found"
     ERROR = "error"
+    # some, but not all, items of a batch succeeded
+    PARTIAL = "partial"
+
+
+class BookingMode(StrEnum):
+    # book whatever is available, reporting each item separately
+    BEST_EFFORT = "best_effort"
+    # book every item or none of them
+    ATOMIC = "atomic"
+
+
+class DateMatch(StrEnum):
+    # the opening lies within [start_date, end_date]
+    WITHIN = "within"
+    # the opening spans the whole [start_date, end_date] stay
+    COVERS = "covers"
+    # the opening shares at least one day with [start_date, end_date]
+    OVERLAPS = "overlaps"
 
 
 class TripBookingRequest(BaseModel):
@@ -58,12 +76,28 @@ class TripBookingRequest(BaseModel):
     people_count: int
 
 
+class TripBatchBookingRequest(BaseModel):
+    bookings: list[TripBookingRequest]
+    mode: BookingMode = BookingMode.BEST_EFFORT
+    # face the same competition as /reservations/competitive_book
+    competitive: bool = False
+
+
 class TripSearchRequest(BaseModel):
-    country: Country | None = None
+    # one country, or any of several
+    country: Country | list[Country] | None = None
     start_date: datetime.datetime | None = None
     end_date: datetime.datetime | None = None
     rate: float | int | None = None
+    # lower bound of the day rate, `rate` being the upper one
+    min_rate: float | int | None = None
+    lodging_class: list[LodgingClass] | None = None
+    hotel_company: list[HotelCompany] | None = None
     limit: int | None = None
+    # preferred trip length in days; openings closest to it rank first
+    days_count: int | None = 2
+    # how openings must relate to the start_date / end_date window
+    date_match: DateMatch = DateMatch.WITHIN
 
 
 class TripSearchResultsResponse(BaseModel):
@@ -71,6 +105,15 @@ class TripSearchResultsResponse(BaseModel):
     results_count: int
     search_params: dict[str, Any]
     results: list[TripOpening]
+    # opaque keyset cursor for the next page, None when there are no more matches
+    next_cursor: str | None = None
+
+
+class TripSearchBatchResponse(BaseModel):
+    status: ResponseStatus = ResponseStatus.FOUND
+    results_count: int
+    # one response per submitted search, in request order
+    results: list[TripSearchResultsResponse]
 
 
 class ExistingTripReservationsResponse(BaseModel):
@@ -84,7 +127,33 @@ class TripBookingResponse(BaseModel):
     details: TripReservation | None = None
 
 
+class TripBatchBookingResponse(BaseModel):
+    msg: str = ""
+    status: ResponseStatus
+    # one response per requested booking, in request order
+    results: list[TripBookingResponse]
+
+
 class CountryCountsResponse(BaseModel):
     status: ResponseStatus = ResponseStatus.FOUND
     country_counts: dict[Country, int]
     total_openings: int
+
+
+class RateStats(BaseModel):
+    count: int
+    min: float
+    max: float
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+
+
+class InventoryBreakdownResponse(BaseModel):
+    status: ResponseStatus = ResponseStatus.FOUND
+    total_openings: int
+    country_counts: dict[Country, int]
+    lodging_class_counts: dict[LodgingClass, int]
+    hotel_company_counts: dict[HotelCompany, int]
+    rate_stats: dict[Country, RateStats]
@@ -0,0 +1,267 @@
+"""
+Query planning for opening search.
+
+A `SearchQuery` is the normalized form of the search endpoint's filters. Date
+windows match in one of three `DateMatch` modes: openings within the window
+(a start and an end range), openings covering it or openings overlapping it
+(both answered by the interval index as `start <= a and end >= b`). Country,
+lodging class and hotel company filters accept several values each and are
+answered together by AND-ing the OR of their per-value bitmaps. The
+`QueryPlanner` estimates how many rows each filter would touch using the
+secondary indexes, fetches candidates from the most selective one and checks
+the remaining filters only on that candidate set.
+"""
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from loguru import logger
+
+from webservice.data_generator.columns import (
+    COUNTRIES,
+    COUNTRY_CODES,
+    HOTEL_COMPANIES,
+    HOTEL_COMPANY_CODES,
+    LODGING_CLASSES,
+    LODGING_CLASS_CODES,
+)
+from webservice.data_generator.enums import Country, HotelCompany, LodgingClass
+from webservice.indexes import OpeningIndexes, match_bitmaps
+from webservice.schemas import DateMatch
+from webservice.store import OpeningsStore, to_ordinal_ceil, to_ordinal_floor
+
+
+# when the best index still covers this fraction of the table, a plain
+# vectorized scan is cheaper than gathering and re-sorting candidates
+FULL_SCAN_FRACTION = 0.3
+
+def _codes(values: str | Iterable[str] | None, enum, codes: dict) -> tuple[int, ...] | None:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = (values,)
+    return tuple(sorted({codes[enum(value)] for value in values}))
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    country_codes: tuple[int, ...] | None = None
+    min_start_ord: int | None = None
+    max_end_ord: int | None = None
+    max_rate: float | None = None
+    # covering and overlapping windows: start_ord <= max_start_ord and end_ord >= min_end_ord
+    max_start_ord: int | None = None
+    min_end_ord: int | None = None
+    lodging_class_codes: tuple[int, ...] | None = None
+    hotel_company_codes: tuple[int, ...] | None = None
+    min_rate: float | None = None
+    # first day of the requested stay in any date mode, what date_proximity ranks against
+    target_start_ord: int | None = None
+
+    @classmethod
+    def from_params(
+        cls,
+        country: str | Iterable[str] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        rate: float | None = None,
+        date_match: str = DateMatch.WITHIN,
+        lodging_class: str | Iterable[str] | None = None,
+        hotel_company: str | Iterable[str] | None = None,
+        min_rate: float | None = None,
+    ) -> "SearchQuery":
+        facets = dict(
+            country_codes=_codes(country, Country, COUNTRY_CODES),
+            lodging_class_codes=_codes(lodging_class, LodgingClass, LODGING_CLASS_CODES),
+            hotel_company_codes=_codes(hotel_company, HotelCompany, HOTEL_COMPANY_CODES),
+            max_rate=rate,
+            min_rate=min_rate,
+        )
+        if date_match == DateMatch.WITHIN or (start_date is None and end_date is None):
+            min_start_ord = None if start_date is None else to_ordinal_ceil(start_date)
+            return cls(
+                min_start_ord=min_start_ord,
+                max_end_ord=None if end_date is None else to_ordinal_floor(end_date),
+                target_start_ord=min_start_ord,
+                **facets,
+            )
+
+        # a single date is a one-day window
+        first, last = start_date or end_date, end_date or start_date
+        if DateMatch(date_match) == DateMatch.COVERS:
+            max_start_ord, min_end_ord = to_ordinal_floor(first), to_ordinal_ceil(last)
+        else:
+            max_start_ord, min_end_ord = to_ordinal_floor(last), to_ordinal_ceil(first)
+        return cls(
+            max_start_ord=max_start_ord,
+            min_end_ord=min_end_ord,
+            target_start_ord=to_ordinal_ceil(first),
+            **facets,
+        )
+
+    def code_filters(self) -> list[tuple[str, tuple[int, ...]]]:
+        """(column, accepted codes) for every multi-valued filter set on the query."""
+        return [
+            (column, codes)
+            for column, codes in (
+                ("country", self.country_codes),
+                ("lodging_class", self.lodging_class_codes),
+                ("hotel_company", self.hotel_company_codes),
+            )
+            if codes is not None
+        ]
+
+    def filters(self) -> list[tuple[str, Callable, int | float | tuple[int, ...]]]:
+        """(column, comparison, value) for every filter set on the query."""
+        filters = []
+        for column, codes in self.code_filters():
+            if len(codes) == 1:
+                filters.append((column, np.equal, codes[0]))
+            else:
+                filters.append((column, np.isin, codes))
+        if self.min_start_ord is not None:
+            filters.append(("start_ord", np.greater_equal, self.min_start_ord))
+        if self.max_end_ord is not None:
+            filters.append(("end_ord", np.less_equal, self.max_end_ord))
+        if self.max_start_ord is not None:
+            filters.append(("start_ord", np.less_equal, self.max_start_ord))
+        if self.min_end_ord is not None:
+            filters.append(("end_ord", np.greater_equal, self.min_end_ord))
+        if self.min_rate is not None:
+            filters.append(("day_rate", np.greater_equal, self.min_rate))
+        if self.max_rate is not None:
+            filters.append(("day_rate", np.less_equal, self.max_rate))
+        return filters
+
+    def mask(self, store: OpeningsStore, rows: np.ndarray | None = None) -> np.ndarray:
+        """Evaluate every filter of the query over `rows` (default: whole table)."""
+        filters = self.filters()
+        views = store.columns(["alive", *(name for name, _, _ in filters)])
+
+        def column(name: str) -> np.ndarray:
+            values = views[name]
+            return values if rows is None else values[rows]
+
+        mask = column("alive").copy()
+        for name, compare, value in filters:
+            mask &= compare(column(name), value)
+        return mask
+
+
+class QueryPlanner:
+    def __init__(self, store: OpeningsStore):
+        self.store = store
+        self.indexes = OpeningIndexes(
+            store,
+            n_countries=len(COUNTRIES),
+            n_lodging_classes=len(LODGING_CLASSES),
+            n_hotel_companies=len(HOTEL_COMPANIES),
+        )
+
+    def _access_paths(self, query: SearchQuery) -> list[tuple[int, str, Callable[[], np.ndarray]]]:
+        """(estimated rows, name, fetch) for every index usable by the query."""
+        indexes = self.indexes
+        paths = []
+        code_filters = query.code_filters()
+        if code_filters:
+            facets = [(getattr(indexes, column), codes) for column, codes in code_filters]
+            # facets assumed independent
+            estimate = float(max(len(self.store), 1))
+            for index, codes in facets:
+                estimate *= index.estimate(codes) / max(len(self.store), 1)
+            paths.append(
+                (
+                    round(estimate),
+                    "+".join(column for column, _ in code_filters),
+                    lambda: match_bitmaps(facets),
+                )
+            )
+
+        if query.max_start_ord is not None and query.min_end_ord is not None:
+            max_start, min_end = query.max_start_ord, query.min_end_ord
+            paths.append(
+                (
+                    indexes.interval.estimate(max_start, min_end),
+                    "interval",
+                    lambda: np.sort(indexes.interval.dominated(max_start, min_end)),
+                )
+            )
+
+        range_filters = (
+            ("start_date", indexes.start_ord, query.min_start_ord, query.max_start_ord),
+            ("end_date", indexes.end_ord, query.min_end_ord, query.max_end_ord),
+            ("rate", indexes.day_rate, query.min_rate, query.max_rate),
+        )
+        for name, index, low, high in range_filters:
+            if low is None and high is None:
+                continue
+            paths.append(
+                (
+                    index.estimate(low, high),
+                    name,
+                    lambda index=index, low=low, high=high: np.sort(index.range(low, high)),
+                )
+            )
+        return paths
+
+    def matching_rows(self, query: SearchQuery) -> np.ndarray:
+        """Live rows matching `query`, in insertion (row) order."""
+        store = self.store
+        paths = self._access_paths(query)
+        if not paths:
+            return store.live_rows()
+
+        estimate, name, fetch = min(paths, key=lambda path: path[0])
+        if estimate > FULL_SCAN_FRACTION * store.size:
+            logger.debug(f"Planner: full scan (best index {name} ~{estimate} rows)")
+            return np.flatnonzero(query.mask(store))
+
+        logger.debug(f"Planner: index {name} ~{estimate} rows")
+        candidates = fetch()
+        return candidates[query.mask(store, candidates)]
+
+    def matching_rows_batch(self, queries: list[SearchQuery]) -> list[np.ndarray]:
+        """
+        `matching_rows` for many queries at once, in order.
+
+        Selective queries fetch candidates from their best index as usual. The
+        others share one pass over the table: each distinct filter among them
+        is evaluated into a full-table mask once, and every query combines the
+        masks it needs. Duplicate queries are answered once.
+        """
+        store = self.store
+        matches: dict[SearchQuery, np.ndarray] = dict()
+        broad = []
+        for query in dict.fromkeys(queries):
+            paths = self._access_paths(query)
+            if paths:
+                estimate, name, fetch = min(paths, key=lambda path: path[0])
+                if estimate <= FULL_SCAN_FRACTION * store.size:
+                    candidates = fetch()
+                    matches[query] = candidates[query.mask(store, candidates)]
+                    continue
+            broad.append(query)
+
+        if broad:
+            # one row count for every column, or rows appended meanwhile misalign the masks
+            query_filters = {query: query.filters() for query in broad}
+            names = {name for filters in query_filters.values() for name, _, _ in filters}
+            views = store.columns(["alive", *names])
+            alive = views["alive"].copy()
+            filter_masks = dict()
+            for query in broad:
+                mask = alive.copy()
+                for name, compare, value in query_filters[query]:
+                    key = (name, compare, value)
+                    if key not in filter_masks:
+                        filter_masks[key] = compare(views[name], value)
+                    mask &= filter_masks[key]
+                matches[query] = np.flatnonzero(mask)
+
+        logger.debug(
+            f"Planner: batch of {len(queries)} ({len(matches)} distinct, "
+            f"{len(broad)} sharing a scan)"
+        )
+        return [matches[query] for query in queries]
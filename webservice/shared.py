@@ -0,0 +1,244 @@
+"""
+Inventory shared between worker processes.
+
+`SharedOpeningsStore` keeps the store's columns in memory-mapped files under
+one directory, so every `uvicorn --workers N` process maps the same pages and
+searches the same inventory in parallel. Next to the columns live the opening
+ids (fixed-width bytes), a header with the shared row count, and a claim log:
+the rows booked so far, in order.
+
+Each process keeps its own derived state (id map, indexes, aggregates) and
+catches up in `sync()` by replaying rows appended and claims logged since it
+last looked, through the usual listener callbacks. Writers take `fcntl`
+byte-range locks on a lock file in addition to the in-process locks, since
+those locks are held per process.
+
+`SharedReservationLog` does the same for reservations with an append-only
+JSON lines file.
+"""
+
+import fcntl
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from webservice.schemas import TripReservation
+from webservice.store import CLAIM_LOCK_STRIPES, COLUMN_DTYPES, OpeningColumns, OpeningsStore
+
+
+SHARED_FORMAT_VERSION = 2
+OPENING_ID_DTYPE = "S36"
+
+# header slots
+_VERSION, _CAPACITY, _SIZE, _CLAIMS, _SEEDED = range(5)
+_HEADER_SLOTS = 8
+
+# lock file bytes: 0 guards appends and the claim log, 1.. are claim stripes,
+# then one byte each for seeding and for saving snapshots
+_WRITE_LOCK_BYTE = 0
+_SEED_LOCK_BYTE = 1 + CLAIM_LOCK_STRIPES
+_SNAPSHOT_LOCK_BYTE = 2 + CLAIM_LOCK_STRIPES
+
+
+class SharedOpeningsStore(OpeningsStore):
+    def __init__(self, path: str | Path, capacity: int = 1_000_000):
+        super().__init__(capacity=1)
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.path / "lock", os.O_RDWR | os.O_CREAT, 0o644)
+
+        with self._file_lock(_WRITE_LOCK_BYTE):
+            header_file = self.path / "header.npy"
+            created = not header_file.exists()
+            mode = "w+" if created else "r+"
+
+            self._header = np.lib.format.open_memmap(
+                header_file, mode=mode, dtype=np.int64, shape=(_HEADER_SLOTS,)
+            )
+            if created:
+                self._header[_VERSION] = SHARED_FORMAT_VERSION
+                self._header[_CAPACITY] = capacity
+            elif self._header[_VERSION] != SHARED_FORMAT_VERSION:
+                raise ValueError(f"unsupported shared inventory format in {self.path}")
+
+            self.capacity = int(self._header[_CAPACITY])
+            self._columns = {
+                name: self._open_column(name, dtype, mode)
+                for name, dtype in COLUMN_DTYPES.items()
+            }
+            self._shared_ids = self._open_column("opening_ids", OPENING_ID_DTYPE, mode)
+            self._claim_log = self._open_column("claims", np.int64, mode)
+
+        self._claims_seen = 0
+        self.sync()
+
+    def _open_column(self, name: str, dtype, mode: str) -> np.memmap:
+        return np.lib.format.open_memmap(
+            self.path / f"{name}.npy", mode=mode, dtype=dtype, shape=(self.capacity,)
+        )
+
+    @contextmanager
+    def seeding(self):
+        """
+        Yields True to the one process that must seed the inventory, False to the rest.
+
+        Other processes wait until seeding is over, and the inventory only
+        counts as seeded once the block completes: if the seeding process dies
+        first, the next one to start seeds it instead.
+        """
+        with self._file_lock(_SEED_LOCK_BYTE):
+            self.sync()
+            # rows are published in one batch, so a seeder that died after adding them is done
+            if self._header[_SEEDED] or self._header[_SIZE] > 0:
+                yield False
+                return
+            yield True
+            self._header[_SEEDED] = 1
+
+    # fcntl locks belong to the process, so the in-process gate of the base
+    # class decides between threads and the snapshot byte between processes:
+    # shared while any booking runs here, exclusive while a snapshot is saved
+
+    def _bookings_started(self):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_SH, 1, _SNAPSHOT_LOCK_BYTE)
+
+    def _bookings_ended(self):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, _SNAPSHOT_LOCK_BYTE)
+
+    @contextmanager
+    def snapshot_lock(self):
+        """Saves take turns across workers, and wait for every worker's bookings in progress."""
+        with super().snapshot_lock(), self._file_lock(_SNAPSHOT_LOCK_BYTE):
+            yield
+
+    @contextmanager
+    def _file_lock(self, byte: int):
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, byte)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, byte)
+
+    def _reserve(self, extra: int):
+        if int(self._header[_SIZE]) + extra > self.capacity:
+            raise RuntimeError(
+                f"shared inventory at {self.path} is full ({self.capacity:,} rows)"
+            )
+
+    def add_columns(self, columns: OpeningColumns) -> np.ndarray:
+        n = len(columns)
+        if any(len(i) > 36 for i in columns.opening_ids):
+            raise ValueError("shared inventory opening ids are limited to 36 characters")
+
+        with self._write_lock, self._file_lock(_WRITE_LOCK_BYTE):
+            self._reserve(n)
+            lo = int(self._header[_SIZE])
+            hi = lo + n
+
+            for name in COLUMN_DTYPES:
+                if name != "alive":
+                    self._columns[name][lo:hi] = getattr(columns, name)
+            self._columns["alive"][lo:hi] = True
+            self._shared_ids[lo:hi] = np.array(columns.opening_ids, dtype=OPENING_ID_DTYPE)
+
+            # publish the rows only once they are fully written
+            self._header[_SIZE] = hi
+
+        self.sync()
+        return np.arange(lo, hi)
+
+    @contextmanager
+    def _hold_stripes(self, rows):
+        # other processes only see the file locks, this one only the thread locks
+        with ExitStack() as stack:
+            for stripe in sorted({row % CLAIM_LOCK_STRIPES for row in rows}):
+                stack.enter_context(self._claim_locks[stripe])
+                stack.enter_context(self._file_lock(1 + stripe))
+            yield
+
+    def _publish_claims(self, rows: list[int]):
+        with self._write_lock, self._file_lock(_WRITE_LOCK_BYTE):
+            logged = int(self._header[_CLAIMS])
+            self._claim_log[logged : logged + len(rows)] = rows
+            self._header[_CLAIMS] = logged + len(rows)
+
+        # listeners learn about the claims like those of any other process
+        self.sync()
+
+    def claim(self, opening_id: str) -> int | None:
+        if opening_id not in self._row_by_id:
+            # it may have been added by another worker since our last sync
+            self.sync()
+        return super().claim(opening_id)
+
+    def claim_all(self, opening_ids: list[str]) -> list[int] | None:
+        if any(opening_id not in self._row_by_id for opening_id in opening_ids):
+            self.sync()
+        return super().claim_all(opening_ids)
+
+    def sync(self):
+        """Replay rows and claims published by any process since the last sync."""
+        if (
+            int(self._header[_CLAIMS]) == self._claims_seen
+            and int(self._header[_SIZE]) == self._size
+        ):
+            return
+
+        with self._write_lock:
+            # claims first: every logged claim is for a row published before it
+            claims = int(self._header[_CLAIMS])
+            size = int(self._header[_SIZE])
+
+            if size > self._size:
+                lo = self._size
+                new_ids = [i.decode() for i in self._shared_ids[lo:size].tolist()]
+                self.opening_ids.extend(new_ids)
+                self._row_by_id.update(zip(new_ids, range(lo, size)))
+                self._size = size
+                self._live_count += size - lo
+
+                rows = np.arange(lo, size)
+                for listener in self._listeners:
+                    listener.on_insert(self, rows)
+
+            for row in self._claim_log[self._claims_seen : claims].tolist():
+                self._live_count -= 1
+                for listener in self._listeners:
+                    listener.on_remove(self, row)
+            self._claims_seen = claims
+            self.generation += 1
+
+
+class SharedReservationLog:
+    """Append-only reservations file that every worker replays into its own dict."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path) / "reservations.jsonl"
+        self.path.touch()
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def append(self, reservation: TripReservation):
+        line = (reservation.model_dump_json() + "\n").encode()
+        # a single O_APPEND write lands whole at the end of the file
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def sync(self, reservations: dict[str, TripReservation]):
+        if self.path.stat().st_size == self._offset:
+            return
+
+        with self._lock, open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                reservation = TripReservation.model_validate_json(line)
+                reservations[reservation.reservation_id] = reservation
+                self._offset += len(line)
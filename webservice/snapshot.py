@@ -0,0 +1,162 @@
+"""
+On-disk snapshots of the openings inventory and reservations.
+
+A snapshot is a directory holding one `.npy` file per store column (live rows
+only), the opening ids as newline-separated text, the reservations as JSON
+lines and a small manifest. Columns are memory-mapped on load and copied
+straight into a store, so restoring skips generation and validation entirely.
+
+`save_snapshot` keeps each snapshot in a directory of its own and points the
+configured path at the newest one through a symlink.
+"""
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from webservice.schemas import TripReservation
+from webservice.store import OpeningColumns, OpeningsStore
+
+
+SNAPSHOT_VERSION = 1
+DATA_COLUMNS = (
+    "start_ord",
+    "end_ord",
+    "day_rate",
+    "country",
+    "lodging_class",
+    "hotel_company",
+)
+
+
+def fsync_path(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_tree(path: Path):
+    for child in path.iterdir():
+        fsync_path(child)
+    fsync_path(path)
+
+
+def write_snapshot(
+    store: OpeningsStore, reservations: dict[str, TripReservation], directory: str | Path
+) -> dict:
+    """
+    Write a snapshot of `store` and `reservations` into a new `directory` and fsync it.
+
+    Bookings still in progress can leave an opening claimed but not yet
+    reserved; hold the store's `snapshot_lock` to have them finish first.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True)
+
+    # reservations first: an opening is claimed before its reservation is
+    # recorded, so none of these can still be live in the rows read after
+    saved_reservations = list(reservations.values())
+    columns = store.columns(["alive", *DATA_COLUMNS])
+    rows = np.flatnonzero(columns["alive"])
+    for name in DATA_COLUMNS:
+        np.save(directory / f"{name}.npy", columns[name][rows])
+
+    opening_ids = [store.opening_ids[row] for row in rows]
+    (directory / "opening_ids.txt").write_text("\n".join(opening_ids))
+
+    with open(directory / "reservations.jsonl", "w") as f:
+        for reservation in saved_reservations:
+            f.write(reservation.model_dump_json() + "\n")
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "openings": len(rows),
+        "reservations": len(saved_reservations),
+        "created_at": time.time(),
+    }
+    (directory / "manifest.json").write_text(json.dumps(manifest))
+    fsync_tree(directory)
+    return manifest
+
+
+def save_snapshot(
+    store: OpeningsStore, reservations: dict[str, TripReservation], path: str | Path
+) -> dict:
+    """
+    Save a snapshot of `store` and `reservations` and point `path` at it.
+
+    `path` is a symlink to the current snapshot, a sibling directory named
+    after it. Each save writes a new directory in full and then replaces the
+    link with one rename, so `path` names a complete snapshot at every
+    moment; the previous directory is deleted only after the switch.
+    """
+    started = time.perf_counter()
+    path = Path(path)
+    version = path.with_name(f"{path.name}.v{time.time_ns()}")
+    manifest = write_snapshot(store, reservations, version)
+
+    if path.is_dir() and not path.is_symlink():
+        # a snapshot saved before snapshots were versioned: it becomes a version
+        # too, the one moment without a snapshot at `path`
+        os.replace(path, path.with_name(f"{path.name}.v0"))
+    link = path.with_name(f"{path.name}.link{os.getpid()}")
+    link.unlink(missing_ok=True)
+    os.symlink(version.name, link)
+    os.replace(link, path)
+    fsync_path(path.parent)
+
+    # earlier versions, and any left half-written by a crash
+    for stale in path.parent.glob(f"{path.name}.v*"):
+        if stale != version:
+            shutil.rmtree(stale, ignore_errors=True)
+
+    manifest["seconds"] = round(time.perf_counter() - started, 4)
+    logger.info(f"Saved snapshot to {path}: {manifest}")
+    return manifest
+
+
+def snapshot_exists(path: str | Path) -> bool:
+    return (Path(path) / "manifest.json").exists()
+
+
+def load_snapshot(path: str | Path) -> tuple[OpeningColumns, dict[str, TripReservation]]:
+    path = Path(path)
+    manifest = json.loads((path / "manifest.json").read_text())
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version {manifest['version']} in {path}")
+
+    columns = {
+        name: np.load(path / f"{name}.npy", mmap_mode="r") for name in DATA_COLUMNS
+    }
+    opening_ids = (path / "opening_ids.txt").read_text()
+    columns["opening_ids"] = opening_ids.split("\n") if opening_ids else []
+
+    reservations = dict()
+    with open(path / "reservations.jsonl") as f:
+        for line in f:
+            reservation = TripReservation.model_validate_json(line)
+            reservations[reservation.reservation_id] = reservation
+
+    return OpeningColumns(**columns), reservations
+
+
+def restore_snapshot(
+    store: OpeningsStore, reservations: dict[str, TripReservation], path: str | Path
+) -> int:
+    """Load the snapshot at `path` into an (empty) store; returns the openings loaded."""
+    started = time.perf_counter()
+    columns, saved_reservations = load_snapshot(path)
+    store.add_columns(columns)
+    reservations.update(saved_reservations)
+    logger.info(
+        f"Restored {len(columns):,} openings and {len(saved_reservations):,} "
+        f"reservations from {path} in {time.perf_counter() - started:.3f}s"
+    )
+    return len(columns)
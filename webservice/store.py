@@ -0,0 +1,349 @@
+"""
+Columnar in-memory storage for trip openings.
+
+Openings are kept as parallel NumPy arrays (one per field) instead of a dict of
+pydantic models, so searches can be answered with vectorized masks and
+`TripOpening` objects are only built for the rows that are actually returned.
+
+Rows are append-only: booking an opening tombstones its row rather than
+shifting the arrays, so row numbers stay stable for the lifetime of the store.
+
+Derived structures (indexes, aggregates, ...) subscribe with `add_listener` and
+are notified through `on_insert(store, rows)` and `on_remove(store, row)`.
+
+Booking is an atomic claim: the alive flag of a row is tested and cleared
+under one of `CLAIM_LOCK_STRIPES` locks picked by row number, so exactly one of
+many concurrent claims on an opening wins while claims on different openings
+rarely contend. Listener callbacks run under a separate short write lock.
+"""
+
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from webservice.data_generator.columns import (
+    COLUMN_DTYPES,
+    COUNTRIES,
+    HOTEL_COMPANIES,
+    LODGING_CLASSES,
+    OpeningColumns,
+)
+from webservice.schemas import TripOpening
+
+
+CLAIM_LOCK_STRIPES = 64
+
+
+def to_ordinal_floor(value: datetime) -> int:
+    """Day ordinal of `value`, i.e. the last midnight at or before it."""
+    return value.toordinal()
+
+
+def to_ordinal_ceil(value: datetime) -> int:
+    """Day ordinal of the first midnight at or after `value`."""
+    ordinal = value.toordinal()
+    if (value.hour, value.minute, value.second, value.microsecond) != (0, 0, 0, 0):
+        ordinal += 1
+    return ordinal
+
+
+class OpeningsStore:
+    """
+    Append-only columnar table of openings with an id -> row map.
+
+    Opening dates are stored as day ordinals (the generator only produces
+    midnight timestamps) and enum fields as small integer codes indexing into
+    `COUNTRIES`, `LODGING_CLASSES` and `HOTEL_COMPANIES`.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self._live_count = 0
+        self._columns = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in COLUMN_DTYPES.items()
+        }
+        self.opening_ids: list[str] = []
+        self._row_by_id: dict[str, int] = dict()
+        self._listeners = []
+        self._claim_locks = [threading.Lock() for _ in range(CLAIM_LOCK_STRIPES)]
+        self._write_lock = threading.Lock()
+        # bookings in progress, and whether a snapshot is being saved (see `booking`)
+        self._gate = threading.Condition()
+        self._bookings = 0
+        self._saving = False
+        # bumped on every insert and claim, so derived results can tell they are stale
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    def __contains__(self, opening_id: str) -> bool:
+        row = self._row_by_id.get(opening_id)
+        return row is not None and bool(self._columns["alive"][row])
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def sync(self):
+        """Catch up with changes made by other processes; a private store has none."""
+
+    @contextmanager
+    def seeding(self):
+        """Yields whether the caller should seed this store; a private store always should."""
+        yield True
+
+    @contextmanager
+    def booking(self):
+        """
+        Held while openings are claimed and their reservations recorded.
+
+        Any number of bookings run together; `snapshot_lock` waits for them
+        to finish, so a snapshot never sees an opening claimed but not yet
+        reserved. Not reentrant: a thread must not nest bookings.
+        """
+        with self._gate:
+            while self._saving:
+                self._gate.wait()
+            self._bookings += 1
+            if self._bookings == 1:
+                self._bookings_started()
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._bookings -= 1
+                if self._bookings == 0:
+                    self._bookings_ended()
+                    self._gate.notify_all()
+
+    def _bookings_started(self):
+        """Called as this process goes from no booking in progress to one."""
+
+    def _bookings_ended(self):
+        """Called as the last booking in progress in this process finishes."""
+
+    @contextmanager
+    def snapshot_lock(self):
+        """Held while a snapshot of this store is saved: one saver at a time, and no bookings."""
+        with self._gate:
+            while self._saving:
+                self._gate.wait()
+            # new bookings wait from here on, so the ones in progress drain
+            self._saving = True
+            while self._bookings:
+                self._gate.wait()
+        try:
+            yield
+        finally:
+            with self._gate:
+                self._saving = False
+                self._gate.notify_all()
+
+    @property
+    def size(self) -> int:
+        """Number of rows ever inserted, including tombstoned ones."""
+        return self._size
+
+    def _view(self, name: str) -> np.ndarray:
+        return self._columns[name][: self._size]
+
+    def columns(self, names: Iterable[str]) -> dict[str, np.ndarray]:
+        """
+        Views of several columns cut at one row count.
+
+        Reading the column properties one by one can see rows appended in
+        between; these views always line up.
+        """
+        size = self._size
+        return {name: self._columns[name][:size] for name in names}
+
+    @property
+    def start_ord(self) -> np.ndarray:
+        return self._view("start_ord")
+
+    @property
+    def end_ord(self) -> np.ndarray:
+        return self._view("end_ord")
+
+    @property
+    def day_rate(self) -> np.ndarray:
+        return self._view("day_rate")
+
+    @property
+    def country(self) -> np.ndarray:
+        return self._view("country")
+
+    @property
+    def lodging_class(self) -> np.ndarray:
+        return self._view("lodging_class")
+
+    @property
+    def hotel_company(self) -> np.ndarray:
+        return self._view("hotel_company")
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._view("alive")
+
+    @property
+    def days_count(self) -> np.ndarray:
+        return self.end_ord - self.start_ord
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self._columns["alive"])
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        # claims write into the alive column, so hold every stripe while the
+        # columns are copied to keep a concurrent tombstone from being lost
+        with ExitStack() as stack:
+            for lock in self._claim_locks:
+                stack.enter_context(lock)
+            for name, column in self._columns.items():
+                grown = np.zeros(capacity, dtype=column.dtype)
+                grown[: self._size] = column[: self._size]
+                self._columns[name] = grown
+
+    def add_columns(self, columns: OpeningColumns) -> np.ndarray:
+        """Append already-encoded columns and return the new row numbers."""
+        n = len(columns)
+        with self._write_lock:
+            self._reserve(n)
+            lo, hi = self._size, self._size + n
+
+            for name in COLUMN_DTYPES:
+                if name != "alive":
+                    self._columns[name][lo:hi] = getattr(columns, name)
+            self._columns["alive"][lo:hi] = True
+
+            self.opening_ids.extend(columns.opening_ids)
+            self._row_by_id.update(zip(columns.opening_ids, range(lo, hi)))
+            self._size = hi
+            self._live_count += n
+
+            rows = np.arange(lo, hi)
+            for listener in self._listeners:
+                listener.on_insert(self, rows)
+            self.generation += 1
+        return rows
+
+    def add_openings(self, openings: Iterable[TripOpening]) -> np.ndarray:
+        return self.add_columns(OpeningColumns.from_openings(openings))
+
+    def row_of(self, opening_id: str) -> int | None:
+        """Row number of `opening_id`, which is kept even after it is booked."""
+        return self._row_by_id.get(opening_id)
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    def build_opening(self, row: int, ranking_score: float | None = None) -> TripOpening:
+        """
+        Materialize a single row as a fresh `TripOpening`.
+
+        The values were validated when they entered the store, so the model is
+        constructed without re-running validation.
+        """
+        columns = self._columns
+        fields = dict(
+            opening_id=self.opening_ids[row],
+            start_date=datetime.fromordinal(int(columns["start_ord"][row])),
+            end_date=datetime.fromordinal(int(columns["end_ord"][row])),
+            country=COUNTRIES[columns["country"][row]],
+            lodging_class=LODGING_CLASSES[columns["lodging_class"][row]],
+            day_rate=float(columns["day_rate"][row]),
+            hotel_company=HOTEL_COMPANIES[columns["hotel_company"][row]],
+        )
+        if ranking_score is not None:
+            fields["ranking_score"] = ranking_score
+        return TripOpening.model_construct(**fields)
+
+    def build_openings(
+        self, rows: np.ndarray, scores: np.ndarray | None = None
+    ) -> list[TripOpening]:
+        if scores is None:
+            return [self.build_opening(int(row)) for row in rows]
+        return [
+            self.build_opening(int(row), round(float(score), 5))
+            for row, score in zip(rows, scores)
+        ]
+
+    def get(self, opening_id: str) -> TripOpening | None:
+        if opening_id not in self:
+            return None
+        return self.build_opening(self._row_by_id[opening_id])
+
+    @contextmanager
+    def _hold_stripes(self, rows: Iterable[int]):
+        """Hold the claim locks of the stripes covering `rows`, taken in stripe order."""
+        with ExitStack() as stack:
+            for stripe in sorted({row % CLAIM_LOCK_STRIPES for row in rows}):
+                stack.enter_context(self._claim_locks[stripe])
+            yield
+
+    def _publish_claims(self, rows: list[int]):
+        """Let listeners drop rows that were just tombstoned."""
+        with self._write_lock:
+            self._live_count -= len(rows)
+            for row in rows:
+                for listener in self._listeners:
+                    listener.on_remove(self, row)
+            self.generation += 1
+
+    def claim(self, opening_id: str) -> int | None:
+        """
+        Atomically tombstone the opening's row and return it.
+
+        Returns None when the opening does not exist or another caller has
+        already claimed it.
+        """
+        row = self._row_by_id.get(opening_id)
+        if row is None:
+            return None
+
+        with self._hold_stripes((row,)):
+            alive = self._columns["alive"]
+            if not alive[row]:
+                return None
+            alive[row] = False
+
+        self._publish_claims([row])
+        return row
+
+    def claim_all(self, opening_ids: list[str]) -> list[int] | None:
+        """
+        Atomically tombstone the rows of all `opening_ids`, or of none of them.
+
+        The locks of every stripe involved are held while the rows are checked
+        and cleared, so no other claim can interleave. Returns None when any
+        opening does not exist, is repeated or has already been claimed.
+        """
+        rows = [self._row_by_id.get(opening_id) for opening_id in opening_ids]
+        if None in rows or len(set(rows)) != len(rows):
+            return None
+        if not rows:
+            return rows
+
+        with self._hold_stripes(rows):
+            alive = self._columns["alive"]
+            if not alive[rows].all():
+                return None
+            alive[rows] = False
+
+        self._publish_claims(rows)
+        return rows
+
+    def pop(self, opening_id: str, default=None) -> TripOpening | None:
+        """Claim the opening and return it, like `dict.pop`."""
+        row = self.claim(opening_id)
+        if row is None:
+            return default
+        return self.build_opening(row)
@@ -0,0 +1,167 @@
+"""
+Standing searches whose new matches are pushed to their subscribers.
+
+`SubscriptionRegistry` listens to the store: on every insert it checks only the
+new rows against the registered queries, never the whole inventory. Queries
+are indexed by the countries they accept (those without a country filter sit
+in a wildcard bucket), so a batch of openings is only checked against queries
+that can match one of its countries. Identical queries are evaluated once for
+all of their subscribers, and each is compiled on registration into tests
+over the new rows' columns (multi-valued filters become lookup tables).
+
+Inserts run in the threadpool while subscribers wait on the event loop, so
+matched rows are handed over with one `call_soon_threadsafe` per loop and insert. A subscriber whose
+queue is full misses those rows; the count is kept in `lagged` so it can be
+told to fall back to a search. Queues, `lagged` and the registry's
+`delivered` / `dropped` counters are only updated from that callback, on the
+subscriber's loop.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from webservice.search import SearchQuery
+from webservice.store import COLUMN_DTYPES, COUNTRIES, OpeningsStore
+
+
+# batches of matched rows waiting to be sent to one subscriber
+SUBSCRIPTION_QUEUE_SIZE = 256
+
+_FILTER_COLUMNS = tuple(name for name in COLUMN_DTYPES if name != "alive")
+
+
+def compile_query(query: SearchQuery) -> list[tuple[str, Callable[[np.ndarray], np.ndarray]]]:
+    """(column, test) pairs that together evaluate `query.filters()` on column values."""
+    tests = []
+    for column, compare, value in query.filters():
+        if compare is np.isin:
+            # enum columns hold small non-negative int8 codes
+            table = np.zeros(np.iinfo(np.int8).max + 1, dtype=bool)
+            table[list(value)] = True
+            tests.append((column, table.take))
+        else:
+            tests.append((column, lambda values, compare=compare, value=value: compare(values, value)))
+    return tests
+
+
+@dataclass(eq=False)
+class Subscription:
+    query: SearchQuery
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIPTION_QUEUE_SIZE))
+    subscription_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # rows dropped because the queue was full, not yet reported
+    lagged: int = 0
+
+    def deliver(self, rows: np.ndarray) -> bool:
+        """Queue matched rows, False if they were dropped; runs on `loop`."""
+        try:
+            self.queue.put_nowait(rows)
+        except asyncio.QueueFull:
+            self.lagged += len(rows)
+            return False
+        return True
+
+
+class SubscriptionRegistry:
+    def __init__(self, store: OpeningsStore):
+        self.store = store
+        self._subscribers: dict[SearchQuery, list[Subscription]] = dict()
+        self._compiled: dict[SearchQuery, list] = dict()
+        # country code -> queries accepting it; queries without a country filter
+        self._by_country: list[dict[SearchQuery, None]] = [dict() for _ in COUNTRIES]
+        self._any_country: dict[SearchQuery, None] = dict()
+        self._lock = threading.Lock()
+        # rows queued for / dropped from subscribers, counted once per subscriber
+        self.delivered = 0
+        self.dropped = 0
+        self._counts_lock = threading.Lock()
+        store.add_listener(self)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(map(len, self._subscribers.values()))
+
+    def _buckets(self, query: SearchQuery) -> list[dict[SearchQuery, None]]:
+        if query.country_codes is None:
+            return [self._any_country]
+        return [self._by_country[code] for code in query.country_codes]
+
+    def subscribe(self, query: SearchQuery) -> Subscription:
+        """Register `query` for the running event loop's task."""
+        subscription = Subscription(query, asyncio.get_running_loop())
+        with self._lock:
+            subscribers = self._subscribers.setdefault(query, [])
+            if not subscribers:
+                self._compiled[query] = compile_query(query)
+                for bucket in self._buckets(query):
+                    bucket[query] = None
+            subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        query = subscription.query
+        with self._lock:
+            subscribers = self._subscribers.get(query, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(query, None)
+                self._compiled.pop(query, None)
+                for bucket in self._buckets(query):
+                    bucket.pop(query, None)
+
+    def on_insert(self, store: OpeningsStore, rows: np.ndarray):
+        if len(rows) == 0 or not self._subscribers:
+            return
+
+        with self._lock:
+            candidates = dict(self._any_country)
+            for code in np.unique(store.country[rows]).tolist():
+                candidates.update(self._by_country[code])
+            deliveries = [
+                (self._compiled[query], list(self._subscribers[query])) for query in candidates
+            ]
+
+        # rows were alive when inserted; the stream drops any booked since
+        columns = {name: getattr(store, name)[rows] for name in _FILTER_COLUMNS}
+        by_loop: dict[asyncio.AbstractEventLoop, list] = dict()
+        for tests, subscribers in deliveries:
+            matched = rows
+            if tests:
+                mask = tests[0][1](columns[tests[0][0]])
+                for column, test in tests[1:]:
+                    mask &= test(columns[column])
+                matched = rows[mask]
+            if len(matched) == 0:
+                continue
+            for subscription in subscribers:
+                by_loop.setdefault(subscription.loop, []).append((subscription, matched))
+
+        for loop, loop_deliveries in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver_all, loop_deliveries)
+            except RuntimeError:
+                # the loop closed before its subscriptions were dropped
+                continue
+
+    def _deliver_all(self, deliveries: list[tuple[Subscription, np.ndarray]]):
+        """Hand matched rows to the subscriptions of one loop; runs on that loop."""
+        delivered = dropped = 0
+        for subscription, rows in deliveries:
+            if subscription.deliver(rows):
+                delivered += len(rows)
+            else:
+                dropped += len(rows)
+        # subscribers may wait on several loops
+        with self._counts_lock:
+            self.delivered += delivered
+            self.dropped += dropped
+
+    def on_remove(self, store: OpeningsStore, row: int):
+        pass
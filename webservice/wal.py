@@ -0,0 +1,507 @@
+"""
+Write-ahead log of inventory and reservation changes.
+
+Every mutation is appended as one binary record: `ADD` (a batch of openings in
+the store's column encoding) or `BOOK` (claimed opening ids and the
+reservations made for them, as JSON). Each record is framed by its kind,
+payload length and CRC32, so a record torn by a crash is detected and cut off
+on replay. The log registers as a store listener, so inserts and claims are
+logged in the order the store applies them; reservations are handed to it by
+the booking code.
+
+Inside `booking()`, claims and reservations are held back and appended as a
+single `BOOK` record when the block ends. A booking is therefore durable as a
+whole or not at all: another request's fsync can never persist the claim of
+an opening without the reservation that took it.
+
+Appends only copy bytes into a buffer. `commit()` makes the calling thread's
+records durable according to the fsync policy:
+
+- always: write and fsync inside every append (no batching)
+- group: group commit; one waiting thread writes and fsyncs everything
+  buffered so far, optionally after waiting `group_commit_ms` for more, and
+  every request covered by that fsync returns
+- interval: write on commit, fsync from a background thread every
+  `sync_interval_ms` (a crash of the machine loses at most that window)
+- none: write on commit, leave flushing to the OS
+
+The log is split into numbered segments. Once the current segment grows past
+`compact_bytes`, a background compaction starts a new segment and writes a
+snapshot of the store and reservations to a directory of its own. Only once
+that is fsynced does `checkpoint.json` switch to the new snapshot and the
+segment it replays from; the previous snapshot and older segments are deleted
+after that, so a crash at any point leaves a complete checkpoint behind. The
+snapshot is taken while writes continue, so it may already contain changes
+logged in the new segment; replay is idempotent (known ids are not added
+twice, booked or unknown ids are not claimed) to allow that.
+
+Recovery restores the checkpoint snapshot, then replays the segments in
+order, each as one batch of inserts followed by one batch of claims.
+"""
+
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from webservice.schemas import TripReservation
+from webservice.shared import OPENING_ID_DTYPE
+from webservice.snapshot import DATA_COLUMNS, fsync_path, restore_snapshot, write_snapshot
+from webservice.store import COLUMN_DTYPES, OpeningColumns, OpeningsStore
+
+
+FSYNC_POLICIES = ("always", "group", "interval", "none")
+
+ADD, BOOK = 1, 2
+# kind, payload length, CRC32 of the payload
+_HEADER = struct.Struct("<BII")
+_COUNT = struct.Struct("<I")
+_ID_BYTES = np.dtype(OPENING_ID_DTYPE).itemsize
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+class WriteAheadLogClosed(RuntimeError):
+    """Records could not be made durable: the log was closed first."""
+
+
+def _segment_name(seq: int) -> str:
+    return f"segment-{seq:08d}.log"
+
+
+def _snapshot_name(seq: int) -> str:
+    return f"snapshot-{seq:08d}"
+
+
+def encode_record(kind: int, payload: bytes) -> bytes:
+    return _HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+def encode_add(store: OpeningsStore, rows: np.ndarray) -> bytes:
+    ids = np.array([store.opening_ids[row] for row in rows.tolist()], dtype=OPENING_ID_DTYPE)
+    parts = [_COUNT.pack(len(rows)), ids.tobytes()]
+    for name in DATA_COLUMNS:
+        parts.append(np.ascontiguousarray(getattr(store, name)[rows], dtype=COLUMN_DTYPES[name]).tobytes())
+    return encode_record(ADD, b"".join(parts))
+
+
+def decode_add(payload: memoryview) -> OpeningColumns:
+    (n,) = _COUNT.unpack_from(payload)
+    offset = _COUNT.size
+    ids = np.frombuffer(payload, dtype=OPENING_ID_DTYPE, count=n, offset=offset)
+    offset += n * _ID_BYTES
+    columns = dict()
+    for name in DATA_COLUMNS:
+        dtype = np.dtype(COLUMN_DTYPES[name])
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=n, offset=offset)
+        offset += n * dtype.itemsize
+    return OpeningColumns(opening_ids=[i.decode() for i in ids.tolist()], **columns)
+
+
+def encode_book(opening_ids: list[str], reservations: list[TripReservation]) -> bytes:
+    ids = np.array(opening_ids, dtype=OPENING_ID_DTYPE)
+    lines = b"\n".join(reservation.model_dump_json().encode() for reservation in reservations)
+    return encode_record(BOOK, _COUNT.pack(len(ids)) + ids.tobytes() + lines)
+
+
+def decode_book(payload: memoryview) -> tuple[list[str], list[bytes]]:
+    (n,) = _COUNT.unpack_from(payload)
+    offset = _COUNT.size + n * _ID_BYTES
+    ids = np.frombuffer(payload, dtype=OPENING_ID_DTYPE, count=n, offset=_COUNT.size)
+    lines = bytes(payload[offset:])
+    return [i.decode() for i in ids.tolist()], lines.split(b"\n") if lines else []
+
+
+def read_records(data: bytes) -> tuple[list[tuple[int, memoryview]], int]:
+    """(kind, payload) of every intact record in `data`, and the length they span."""
+    view = memoryview(data)
+    records = []
+    offset = 0
+    while offset + _HEADER.size <= len(view):
+        kind, length, crc = _HEADER.unpack_from(view, offset)
+        end = offset + _HEADER.size + length
+        if end > len(view):
+            break
+        payload = view[offset + _HEADER.size : end]
+        if kind not in (ADD, BOOK) or zlib.crc32(payload) != crc:
+            break
+        records.append((kind, payload))
+        offset = end
+    return records, offset
+
+
+def _apply(
+    kind: int,
+    payloads: list[memoryview],
+    store: OpeningsStore,
+    reservations: dict[str, TripReservation],
+):
+    if kind == ADD:
+        batches = [decode_add(payload) for payload in payloads]
+        ids = [opening_id for batch in batches for opening_id in batch.opening_ids]
+        # ids already in the store, or earlier in the segment, are not added again
+        seen = set()
+        keep = np.zeros(len(ids), dtype=bool)
+        for i, opening_id in enumerate(ids):
+            keep[i] = opening_id not in seen and store.row_of(opening_id) is None
+            seen.add(opening_id)
+        if not keep.any():
+            return
+        store.add_columns(
+            OpeningColumns(
+                opening_ids=[opening_id for opening_id, kept in zip(ids, keep) if kept],
+                **{
+                    name: np.concatenate([getattr(batch, name) for batch in batches])[keep]
+                    for name in DATA_COLUMNS
+                },
+            )
+        )
+    else:
+        claimed, lines = dict(), []
+        for payload in payloads:
+            ids, reservation_lines = decode_book(payload)
+            claimed.update(dict.fromkeys(ids))
+            lines.extend(reservation_lines)
+        store.claim_all([opening_id for opening_id in claimed if opening_id in store])
+        for line in lines:
+            reservation = TripReservation.model_validate_json(line)
+            reservations[reservation.reservation_id] = reservation
+
+
+def replay(data: bytes, store: OpeningsStore, reservations: dict[str, TripReservation]) -> tuple[int, int]:
+    """Apply the intact records of one segment; returns (records applied, bytes they span)."""
+    records, end = read_records(data)
+    by_kind = {ADD: [], BOOK: []}
+    for kind, payload in records:
+        by_kind[kind].append(payload)
+    # an opening is always logged as added before it is claimed, so each kind can go in one batch
+    for kind, payloads in by_kind.items():
+        if payloads:
+            _apply(kind, payloads, store, reservations)
+    return len(records), end
+
+
+class WriteAheadLog:
+    def __init__(
+        self,
+        path: str | Path,
+        fsync: str = "group",
+        group_commit_ms: float = 0.0,
+        sync_interval_ms: float = 10.0,
+        compact_bytes: int = 64 * 2**20,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.group_commit_seconds = group_commit_ms / 1e3
+        self.sync_interval_seconds = sync_interval_ms / 1e3
+        self.compact_bytes = compact_bytes
+
+        self._store: OpeningsStore | None = None
+        self._reservations: dict[str, TripReservation] | None = None
+        # appends fill the buffer; bytes are counted from the start of the log
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._appended = 0
+        # written: handed to the OS; durable: fsynced
+        self._io_lock = threading.Lock()
+        self._written = 0
+        self._durable = 0
+        self._syncing = False
+        self._synced = threading.Condition(threading.Lock())
+        self._local = threading.local()
+
+        self._seq = 0
+        self._fd: int | None = None
+        self._segment_bytes = 0
+        self._compacting = False
+        self._closed = threading.Event()
+        self.fsyncs = 0
+        self.commits = 0
+
+    # --- recovery ---------------------------------------------------------
+
+    def _segments(self) -> list[tuple[int, Path]]:
+        segments = []
+        for file in self.path.glob("segment-*.log"):
+            segments.append((int(file.stem.split("-")[1]), file))
+        return sorted(segments)
+
+    def _checkpoint(self) -> dict | None:
+        checkpoint_file = self.path / CHECKPOINT_FILE
+        if not checkpoint_file.exists():
+            return None
+        return json.loads(checkpoint_file.read_text())
+
+    def recover(self, store: OpeningsStore, reservations: dict[str, TripReservation]) -> bool:
+        """
+        Rebuild `store` and `reservations` from the log; False when it holds no state.
+
+        Call before `attach`, so that replayed changes are not logged again.
+        """
+        started = time.perf_counter()
+        checkpoint = self._checkpoint()
+        first_segment = 0
+        if checkpoint is not None:
+            restore_snapshot(store, reservations, self.path / checkpoint["snapshot"])
+            first_segment = checkpoint["segment"]
+
+        applied = 0
+        segments = [(seq, file) for seq, file in self._segments() if seq >= first_segment]
+        for seq, file in segments:
+            data = file.read_bytes()
+            records, end = replay(data, store, reservations)
+            applied += records
+            if end < len(data):
+                logger.warning(f"Dropping {len(data) - end} bytes of torn records at the end of {file}")
+                os.truncate(file, end)
+
+        self._seq = segments[-1][0] if segments else first_segment
+        if checkpoint is None and applied == 0:
+            return False
+        logger.info(
+            f"Recovered {len(store):,} openings and {len(reservations):,} reservations from "
+            f"{self.path} ({applied:,} log records) in {time.perf_counter() - started:.3f}s"
+        )
+        return True
+
+    # --- appending ----------------------------------------------------------
+
+    def _open_segment(self):
+        file = self.path / _segment_name(self._seq)
+        self._fd = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_bytes = os.fstat(self._fd).st_size
+
+    def attach(self, store: OpeningsStore, reservations: dict[str, TripReservation]):
+        """Start logging changes to `store` and receive reservations to log."""
+        self._store, self._reservations = store, reservations
+        if self._fd is None:
+            self._open_segment()
+        store.add_listener(self)
+        if self.fsync == "interval":
+            threading.Thread(target=self._sync_periodically, name="wal-sync", daemon=True).start()
+
+    def _append(self, record: bytes):
+        if self.fsync == "always":
+            with self._io_lock:
+                if self._fd is not None:
+                    os.write(self._fd, record)
+                    os.fsync(self._fd)
+                    self.fsyncs += 1
+                    self._segment_bytes += len(record)
+                    with self._lock:
+                        self._appended += len(record)
+                        self._written = self._durable = self._local.lsn = self._appended
+                    return
+            # closed: the record stays buffered and `commit` reports it
+
+        with self._lock:
+            self._buffer += record
+            self._appended += len(record)
+            self._local.lsn = self._appended
+
+    def on_insert(self, store: OpeningsStore, rows: np.ndarray):
+        if len(rows):
+            self._append(encode_add(store, rows))
+
+    def on_remove(self, store: OpeningsStore, row: int):
+        booking = getattr(self._local, "booking", None)
+        if booking is None:
+            self._append(encode_book([store.opening_ids[row]], []))
+        else:
+            booking[0].append(store.opening_ids[row])
+
+    def log_reservation(self, reservation: TripReservation):
+        booking = getattr(self._local, "booking", None)
+        if booking is None:
+            self._append(encode_book([], [reservation]))
+        else:
+            booking[1].append(reservation)
+
+    @contextmanager
+    def booking(self):
+        """Log the claims and reservations this thread makes inside the block as one record."""
+        if getattr(self._local, "booking", None) is not None:
+            yield
+            return
+        self._local.booking = booking = ([], [])
+        try:
+            yield
+        finally:
+            self._local.booking = None
+            # claims are logged even if the block failed: the store has applied them
+            if booking[0] or booking[1]:
+                self._append(encode_book(*booking))
+
+    # --- durability -----------------------------------------------------------
+
+    def _write_out(self) -> int:
+        """Hand everything buffered to the OS; returns the log position written. Holds `_io_lock`."""
+        if self._fd is None:
+            raise WriteAheadLogClosed(f"write-ahead log {self.path} is closed")
+        with self._lock:
+            data, end = bytes(self._buffer), self._appended
+            self._buffer.clear()
+        if data:
+            os.write(self._fd, data)
+            self._segment_bytes += len(data)
+        self._written = end
+        return end
+
+    def _sync(self) -> int:
+        with self._io_lock:
+            end = self._write_out()
+            os.fsync(self._fd)
+            self.fsyncs += 1
+        return end
+
+    def commit(self):
+        """Return once this thread's records are as durable as the fsync policy makes them."""
+        lsn = getattr(self._local, "lsn", 0)
+        self.commits += 1
+        if self.fsync == "always":
+            if self._written < lsn:
+                raise WriteAheadLogClosed(f"write-ahead log {self.path} is closed")
+        elif self.fsync in ("interval", "none"):
+            if self._written < lsn:
+                with self._io_lock:
+                    if self._written < lsn:
+                        self._write_out()
+        else:
+            self._group_commit(lsn)
+        self._maybe_compact()
+
+    def _group_commit(self, lsn: int):
+        with self._synced:
+            while self._durable < lsn:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._synced.wait()
+            else:
+                return
+
+        durable = self._durable
+        try:
+            if self.group_commit_seconds:
+                # let concurrent requests add their records to this fsync
+                time.sleep(self.group_commit_seconds)
+            durable = self._sync()
+        finally:
+            with self._synced:
+                self._durable = max(self._durable, durable)
+                self._syncing = False
+                self._synced.notify_all()
+
+    def _sync_periodically(self):
+        while not self._closed.wait(self.sync_interval_seconds):
+            if self._written > self._durable or self._appended > self._written:
+                try:
+                    self._durable = self._sync()
+                except WriteAheadLogClosed:
+                    return
+
+    # --- compaction -----------------------------------------------------------
+
+    def _maybe_compact(self):
+        if self._segment_bytes < self.compact_bytes or self._compacting:
+            return
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact, name="wal-compact", daemon=True).start()
+
+    def _compact(self):
+        try:
+            self.checkpoint()
+        except WriteAheadLogClosed:
+            logger.info("Write-ahead log closed before compaction started")
+
+    def checkpoint(self) -> dict:
+        """Snapshot the attached state, then drop the segments the snapshot covers."""
+        self._compacting = True
+        try:
+            started = time.perf_counter()
+            # records logged from here on go to the new segment
+            with self._io_lock:
+                if self._closed.is_set():
+                    raise WriteAheadLogClosed(f"write-ahead log {self.path} is closed")
+                if self._fd is not None:
+                    self._write_out()
+                    os.fsync(self._fd)
+                    self.fsyncs += 1
+                    os.close(self._fd)
+                self._seq += 1
+                self._open_segment()
+                first_segment = self._seq
+
+            # the current checkpoint's snapshot stays in place until the new one is complete
+            snapshot = self.path / _snapshot_name(first_segment)
+            # left over by a checkpoint that crashed before switching to it
+            shutil.rmtree(snapshot, ignore_errors=True)
+            manifest = write_snapshot(self._store, self._reservations, snapshot)
+            fsync_path(self.path)
+
+            checkpoint = {"segment": first_segment, "snapshot": snapshot.name, **manifest}
+            staging = self.path / f"{CHECKPOINT_FILE}.tmp"
+            staging.write_text(json.dumps(checkpoint))
+            fsync_path(staging)
+            os.replace(staging, self.path / CHECKPOINT_FILE)
+            fsync_path(self.path)
+
+            for seq, file in self._segments():
+                if seq < first_segment:
+                    file.unlink()
+            # earlier snapshots, and any left half-written by a crash
+            for stale in self.path.glob("snapshot-*"):
+                if stale.name != snapshot.name:
+                    shutil.rmtree(stale, ignore_errors=True)
+            logger.info(
+                f"Compacted write-ahead log into {snapshot} in {time.perf_counter() - started:.3f}s, "
+                f"replaying from segment {first_segment}"
+            )
+            return checkpoint
+        finally:
+            self._compacting = False
+
+    def close(self):
+        """
+        Flush and fsync what is buffered; the log stops syncing in the background.
+
+        Records appended after this are not written: committing them raises
+        `WriteAheadLogClosed`, so the change is never confirmed.
+        """
+        self._closed.set()
+        with self._io_lock:
+            if self._fd is None:
+                return
+            end = self._write_out()
+            os.fsync(self._fd)
+            self.fsyncs += 1
+            os.close(self._fd)
+            self._fd = None
+        # group commits waiting on records this covered can return
+        with self._synced:
+            self._durable = max(self._durable, end)
+            self._synced.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "fsync_policy": self.fsync,
+            "segment": self._seq,
+            "segment_bytes": self._segment_bytes,
+            "buffered_bytes": len(self._buffer),
+            "commits": self.commits,
+            "fsyncs": self.fsyncs,
+        }